@@ -3,10 +3,16 @@ import time
 import os
 from datetime import datetime
 import threading
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 from utils.VideoDeviceDetection import VideoDeviceDetection
+from utils.RetentionManager import RetentionManager
+from utils.ArchiveMover import ArchiveMover
+from utils.RecordingVerifier import RecordingVerifier
+from recording.CaptureHub import CaptureHub
 from recording.VideoDeviceRecorder import VideoDeviceRecorder
-from recording.VideoDeviceRecordingController import VideoDeviceRecordingController
+from recording.PreRollRecorder import PreRollCapture
+from recording.DualRateRecorder import DualRateRecorder, DualRateAlert
+from recording.WarmRecorderPool import WarmRecorderPool, WarmAlert
 
 
 class SecuritySystem:
@@ -14,9 +20,20 @@ class SecuritySystem:
     Sistema integrado de grabación de video con sensores Arduino + FFmpeg.
     """
 
-    def __init__(self, arduino_port: str = "COM3", output_dir: str = "Videos"):
+    def __init__(self, arduino_port: str = "COM3", output_dir: str = "Videos",
+                 pre_roll_seconds: int = 0, retention_days: Optional[float] = None,
+                 min_free_gb: float = 5, analytics_resolution: Optional[str] = None,
+                 timelapse_fps: Optional[float] = None, staging_dir: Optional[str] = None,
+                 archive_max_mbps: Optional[float] = None, warm_standby: bool = False,
+                 staging_min_free_gb: float = 2):
         self.OUTPUT_DIR = output_dir
+        # Con staging_dir FFmpeg escribe en disco local rápido y las grabaciones terminadas
+        # se copian después a OUTPUT_DIR (p. ej. un NAS) sin frenar la captura
+        self.RECORDING_DIR = staging_dir or output_dir
+        self.pre_roll_seconds = pre_roll_seconds
+        self.timelapse_fps = timelapse_fps
         os.makedirs(self.OUTPUT_DIR, exist_ok=True)
+        os.makedirs(self.RECORDING_DIR, exist_ok=True)
 
         # Cada sensor se asigna a una cámara (índice de OpenCV)
         self.SENSOR_TO_CAMERA = {
@@ -32,7 +49,50 @@ class SecuritySystem:
         }
 
         # Controladores activos de grabación por SENSOR (no por cámara)
-        self.active_controllers: Dict[str, VideoDeviceRecordingController] = {}
+        self.active_controllers: Dict[str, Union[PreRollCapture, DualRateAlert, WarmAlert]] = {}
+
+        # Modo doble tasa (timelapse_fps): una grabación por cámara siempre activa
+        self.dual_rate_recorders: Dict[str, DualRateRecorder] = {}
+
+        # warm_standby: un FFmpeg por cámara ya abierto y con el encoder listo para la próxima alerta
+        self.warm_pool: Optional[WarmRecorderPool] = None
+
+        # Resultado de la última detención: sensor -> "clean" | "forced" | "failed"
+        self.last_shutdown: Dict[str, str] = {}
+
+        # Un único proceso FFmpeg por CÁMARA, compartido por todos sus sensores
+        # Con analytics_resolution (p. ej. "320x180") cada cámara publica frames en memoria
+        # compartida para análisis (FrameBusSubscriber) sin abrir el dispositivo otra vez
+        # Las alertas son playlists (.m3u8) con enlaces a los segmentos del anillo:
+        # el anillo va en el mismo disco que las grabaciones ("preroll" no se borra ni se archiva)
+        self.capture_hub = CaptureHub(pre_roll_seconds=pre_roll_seconds,
+                                      frame_bus_resolution=analytics_resolution,
+                                      ring_root=os.path.join(self.RECORDING_DIR, "preroll"))
+
+        # Borrado en segundo plano de las grabaciones más antiguas por espacio libre; por
+        # antigüedad solo si se pide retention_days (borrar evidencia debe ser explícito)
+        # Cada cámara graba en su carpeta (camara0/, ...): las cuotas por cámara se cuentan por carpeta
+        # El disco de staging tiene su propio mínimo libre (staging_min_free_gb): si el archivo
+        # se atrasa y se llena, se borra lo más antiguo antes de que FFmpeg falle al escribir
+        roots = [self.OUTPUT_DIR, "videos/cameras"] + ([staging_dir] if staging_dir else [])
+        self.retention = RetentionManager(
+            roots=roots,
+            max_age_days=retention_days,
+            min_free_bytes=int(min_free_gb * 1024 ** 3),
+            root_min_free_bytes={staging_dir: int(staging_min_free_gb * 1024 ** 3)} if staging_dir else None
+        )
+        self.retention.start()
+
+        # Copia en segundo plano staging → archivo (concurrencia y ancho de banda limitados)
+        self.archiver: Optional[ArchiveMover] = None
+        if staging_dir:
+            self.archiver = ArchiveMover(
+                staging_root=staging_dir,
+                archive_root=self.OUTPUT_DIR,
+                max_bytes_per_second=int(archive_max_mbps * 125_000) if archive_max_mbps else None,
+                on_archived=lambda staged, archived: self.retention.add_file(archived)
+            )
+            self.archiver.start()
 
         # Conexión al Arduino
         self.arduino = serial.Serial(arduino_port, 9600, timeout=1)
@@ -40,6 +100,12 @@ class SecuritySystem:
         print(f"✅ Arduino conectado en {arduino_port}")
 
         self._detect_cameras()
+        if self.timelapse_fps:
+            self._start_dual_rate()
+        elif self.pre_roll_seconds > 0:
+            self._start_pre_roll()
+        elif warm_standby:
+            self._start_warm_standby()
 
     def _detect_cameras(self):
         """Detecta cámaras disponibles usando VideoDeviceDetection."""
@@ -54,6 +120,82 @@ class SecuritySystem:
         else:
             print("⚠️ No se detectaron cámaras disponibles")
 
+    def _start_pre_roll(self):
+        """
+        Arranca una captura continua por cámara para que las alertas incluyan
+        los segundos previos al disparo.
+        """
+        for camera_index in sorted(set(self.SENSOR_TO_CAMERA.values())):
+            device_name = self._get_device_name_for_index(camera_index)
+            if not device_name:
+                print(f"❌ No se encontró dispositivo para índice {camera_index}")
+                continue
+
+            try:
+                self.capture_hub.keep_alive(device_name)
+                print(f"⏪ Pre-roll de {self.pre_roll_seconds}s activo en cámara {camera_index} ({device_name})")
+            except Exception as e:
+                print(f"❌ No se pudo iniciar el pre-roll en cámara {camera_index}: {e}")
+
+    def _start_warm_standby(self):
+        """
+        Deja por cámara un grabador en espera (WarmRecorderPool): la alerta no paga
+        el arranque de FFmpeg, la apertura del dispositivo ni la del encoder.
+        """
+        devices = []
+        for camera_index in sorted(set(self.SENSOR_TO_CAMERA.values())):
+            device_name = self._get_device_name_for_index(camera_index)
+            if device_name:
+                devices.append(device_name)
+            else:
+                print(f"❌ No se encontró dispositivo para índice {camera_index}")
+
+        # En espera en el mismo disco que las grabaciones ("standby" no se borra ni se archiva)
+        self.warm_pool = WarmRecorderPool(devices, standby_root=os.path.join(self.RECORDING_DIR, "standby"))
+        self.warm_pool.start()
+        for device_name in devices:
+            print(f"🔥 Grabador en espera listo en {device_name}: {self.warm_pool.idle_count(device_name)}")
+
+    def _warm_alert_on(self, device_name: str) -> Optional[str]:
+        """Sensor cuya alerta precalentada tiene abierta la cámara, si hay alguna."""
+        for sensor, controller in self.active_controllers.items():
+            if isinstance(controller, WarmAlert) and controller.video_device == device_name:
+                return sensor
+        return None
+
+    def _start_dual_rate(self):
+        """
+        Arranca por cámara un timelapse continuo a `timelapse_fps`; las alertas pasan
+        esa misma captura a tasa completa sin reabrir el dispositivo. En reposo solo se
+        codifica el timelapse y ~1 imagen por segundo a tamaño completo (el pre-roll).
+        """
+        for camera_index in sorted(set(self.SENSOR_TO_CAMERA.values())):
+            device_name = self._get_device_name_for_index(camera_index)
+            if not device_name:
+                print(f"❌ No se encontró dispositivo para índice {camera_index}")
+                continue
+
+            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            recorder = DualRateRecorder(
+                video_device=device_name,
+                output_file=os.path.join(self._camera_dir(camera_index), f"camara{camera_index}_{timestamp}.mp4"),
+                idle_fps=self.timelapse_fps,
+                pre_padding=max(self.pre_roll_seconds, 2)
+            )
+            # El timelapse se corta en archivos fechados de una hora: retención y archivo los tratan
+            # como grabaciones normales; el que se está escribiendo lo protege su mtime reciente
+            if recorder.start_recording():
+                self.dual_rate_recorders[device_name] = recorder
+                print(f"🐢 Timelapse a {self.timelapse_fps} fps activo en cámara {camera_index} ({device_name})")
+            else:
+                print(f"❌ No se pudo iniciar el timelapse en cámara {camera_index}")
+
+    def _camera_dir(self, camera_index: int) -> str:
+        """Carpeta de las grabaciones de una cámara (todos sus sensores)."""
+        directory = os.path.join(self.RECORDING_DIR, f"camara{camera_index}")
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
     def _get_device_name_for_index(self, camera_index: int) -> Optional[str]:
         """Obtiene el nombre físico de la cámara según su índice OpenCV."""
         device_map = VideoDeviceDetection.get_device_map()
@@ -97,21 +239,28 @@ class SecuritySystem:
         try:
             print(f"🎬 Intentando iniciar grabación para {sensor}...")
             
-            output_path = os.path.join(self.OUTPUT_DIR, filename)
-            recorder = VideoDeviceRecorder(
-            video_device=device_name,
-            output_file=output_path
-)
-
-
-            controller = VideoDeviceRecordingController(recorder)
-            controller.start()
+            output_path = os.path.join(self._camera_dir(camera_index), filename)
+            dual_rate = self.dual_rate_recorders.get(device_name)
+            if dual_rate:
+                # La cámara ya graba en timelapse: solo se sube a tasa completa
+                controller = DualRateAlert(dual_rate, output_path)
+            elif self.warm_pool:
+                # La cámara admite una sola apertura: mientras graba para otro sensor, esa grabación cubre la alerta
+                owner = self._warm_alert_on(device_name)
+                if owner:
+                    print(f"ℹ️ Cámara {camera_index} ya graba para {owner}; {sensor} queda en ese archivo")
+                    return
+                controller = WarmAlert(self.warm_pool, device_name, output_path)
+            else:
+                # Si la cámara ya está capturando (otro sensor o pre-roll) solo se agrega una salida
+                controller = self.capture_hub.open_output(device_name, output_path)
+            output_path = controller.output_file
+            self._protect_recording(output_path)
 
             # Guardamos el controlador por SENSOR, no por cámara
             self.active_controllers[sensor] = controller
             self.estado_sensores[sensor] = True
 
-            output_path = os.path.join(self.OUTPUT_DIR, filename)
             print(f"✅ {sensor} activó cámara {camera_index} ({device_name})")
             print(f"📁 Archivo: {output_path}")
 
@@ -120,30 +269,92 @@ class SecuritySystem:
             import traceback
             traceback.print_exc()
 
-    def stop_all_recordings(self):
+    def _protect_recording(self, path: str):
+        """Una grabación en curso no se borra (retención) ni se mueve (archivo)."""
+        self.retention.protect(path)
+        if self.archiver:
+            self.archiver.protect(path)
+
+    def _finish_recording(self, path: str):
+        """Grabación cerrada: se indexa para retención o se encola para el archivo."""
+        self.retention.unprotect(path)
+        if self.archiver:
+            # Se copia cuando termina la verificación (puede reescribir el archivo al repararlo)
+            # y se indexa al llegar al archivo (on_archived)
+            verification = RecordingVerifier.shared().pending(path)
+            if verification:
+                verification.add_done_callback(lambda _: self.archiver.enqueue(path))
+            else:
+                self.archiver.enqueue(path)
+        else:
+            self.retention.add_file(path)
+
+    def _release_recording(self, path: str):
+        """
+        Grabación que sigue cerrándose tras el plazo: solo se desprotege. La retención la
+        respeta mientras cambie (active_grace_seconds) y el archivo la toma en su escaneo
+        cuando deja de cambiar (settle_seconds).
+        """
+        self.retention.unprotect(path)
+        if self.archiver:
+            self.archiver.unprotect(path)
+
+    def stop_all_recordings(self, deadline_seconds: float = 10.0) -> Dict[str, str]:
         """
-        Detiene todas las grabaciones activas.
+        Detiene todas las grabaciones activas a la vez, en paralelo, con un único plazo global.
+
+        Devuelve el resultado por sensor:
+            "clean"  → archivo cerrado correctamente
+            "forced" → se agotó el plazo y FFmpeg fue terminado (el MP4 fragmentado conserva lo escrito)
+            "failed" → error, o no terminó ni siquiera forzado
         """
         if not self.active_controllers:
             print("ℹ️ No hay grabaciones activas para detener")
-            return
-            
+            return {}
+
         print("🛑 Deteniendo todas las grabaciones...")
-        
-        for sensor, controller in list(self.active_controllers.items()):
+        controllers = dict(self.active_controllers)
+        self.active_controllers.clear()
+        deadline = time.monotonic() + deadline_seconds
+        # Plazo final de los joins: incluye una sola vez el margen para terminate() tras el plazo
+        hard_deadline = deadline + VideoDeviceRecorder.STOP_GRACE_SECONDS
+        results: Dict[str, str] = {}
+
+        def stop_one(sensor: str, controller: Union[PreRollCapture, DualRateAlert]):
             try:
-              controller.stop()
-              self.estado_sensores[sensor] = False
-              print(f"🛑 Grabación de {sensor} detenida")
+                stopped = controller.stop(timeout=max(0.1, deadline - time.monotonic()))
+                results[sensor] = "clean" if stopped else ("forced" if controller.forced else "failed")
             except Exception as e:
-              print(f"❌ Error deteniendo {sensor}: {e}")
-            finally:
-        # Asegurar que se elimine sin duplicar
-              if sensor in self.active_controllers:
-                del self.active_controllers[sensor]
-
-
+                print(f"❌ Error deteniendo {sensor}: {e}")
+                results[sensor] = "failed"
+
+        threads = [threading.Thread(target=stop_one, args=(sensor, controller), daemon=True)
+                   for sensor, controller in controllers.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=max(0.0, hard_deadline - time.monotonic()))
+
+        # Copia: un hilo que siga vivo no cambia el resultado ya devuelto
+        final_results: Dict[str, str] = {}
+        for (sensor, controller), thread in zip(controllers.items(), threads):
+            result = final_results[sensor] = results.get(sensor, "failed")
+            self.estado_sensores[sensor] = False
+            # Una alerta precalentada puede haber seguido en otras partes (watchdog / calidad)
+            paths = getattr(controller, "parts", [controller.output_file])
+            if thread.is_alive():
+                # No terminó de cerrarse: no se encola a medio escribir
+                for path in paths:
+                    self._release_recording(path)
+                print(f"⚠️ Grabación de {sensor} sin cerrar al vencer el plazo ({result})")
+                continue
+            for path in paths:
+                self._finish_recording(path)
+            print(f"🛑 Grabación de {sensor} detenida ({result})")
+
+        self.last_shutdown = final_results
         print("✅ Todas las grabaciones detenidas")
+        return final_results
 
     def escuchar_arduino(self):
         """
@@ -207,13 +418,37 @@ class SecuritySystem:
             cam_idx = self.SENSOR_TO_CAMERA[sensor]
             status = "🔴 GRABANDO" if grabando else "⚪ INACTIVO"
             report += f"   {sensor} (cám {cam_idx}): {status}\n"
-
+            controller = self.active_controllers.get(sensor)
+            if controller:
+                stats = controller.get_progress()
+                speed = f"{stats['speed']:.2f}x" if stats["speed"] is not None else "N/A"
+                report += (f"      fps={stats['fps']:.1f} velocidad={speed} "
+                           f"descartados={stats['drop_frames']} duplicados={stats['dup_frames']} "
+                           f"tamaño={stats['total_size'] / 1_048_576:.1f} MB\n")
+
+        if self.last_shutdown:
+            report += "   Última detención: " + ", ".join(
+                f"{sensor}={result}" for sensor, result in self.last_shutdown.items()) + "\n"
         return report
 
     def close(self):
         """Detiene todas las grabaciones y cierra el Arduino."""
         print("🧹 Cerrando sistema...")
         self.stop_all_recordings()
+        for recorder in self.dual_rate_recorders.values():
+            recorder.stop_recording()
+            # Los anteriores ya los recoge el escaneo de retención / archivo
+            for path in recorder.timelapse_files()[-1:]:
+                self._finish_recording(path)
+        self.dual_rate_recorders.clear()
+        if self.warm_pool:
+            self.warm_pool.close()
+        self.capture_hub.close()
+        self.retention.stop()
+        # Las verificaciones pendientes encolan al archivo al terminar: primero esperarlas
+        RecordingVerifier.shared().close()
+        if self.archiver:
+            self.archiver.stop()
         if hasattr(self, 'arduino') and self.arduino.is_open:
             self.arduino.close()
             print("✅ Arduino desconectado")
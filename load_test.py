@@ -0,0 +1,65 @@
+import argparse
+import time
+from utils.CaptureBackend import CaptureBackend
+from utils.VideoDeviceDetection import VideoDeviceDetection
+from recording.VideoDeviceRecorder import VideoDeviceRecorder
+from recording.VideoDeviceRecordingController import VideoDeviceRecordingController
+from recording.RecordingManager import ManagedRecordingController
+
+
+def main():
+    """
+    Record N synthetic (lavfi) cameras at once and report per-camera encoder speed.
+    Runs on any OS with FFmpeg in PATH; no real cameras needed.
+    """
+    parser = argparse.ArgumentParser(description="Synthetic multi-camera recording load test")
+    parser.add_argument("--cameras", type=int, default=16)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--resolution", default="1280x720")
+    parser.add_argument("--framerate", type=int, default=30)
+    parser.add_argument("--output-dir", default="videos/loadtest")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="Drive all recorders from one event loop (RecordingManager)")
+    args = parser.parse_args()
+
+    backend = CaptureBackend.get("lavfi")
+    backend.sources = [f"testsrc2#{i}" for i in range(args.cameras)]
+    VideoDeviceDetection.set_backend(backend)
+
+    controller_class = ManagedRecordingController if args.asyncio else VideoDeviceRecordingController
+    controllers: list = []
+    for i, device in enumerate(VideoDeviceDetection.get_devices()):
+        recorder = VideoDeviceRecorder(
+            video_device=device,
+            output_file=f"{args.output_dir}/cam{i:02d}.mp4",
+            resolution=args.resolution,
+            framerate=args.framerate,
+            output_mode="fragmented",
+            capture_backend=backend
+        )
+        controller = controller_class(recorder)
+        controller.start()
+        controllers.append(controller)
+
+    print(f"Recording {len(controllers)} synthetic cameras for {args.seconds}s...")
+    deadline = time.time() + args.seconds
+    while time.time() < deadline:
+        time.sleep(5)
+        speeds = [ctrl.get_progress()["speed"] for ctrl in controllers]
+        valid = [s for s in speeds if s is not None]
+        behind = sum(1 for s in valid if s < 0.98)
+        if valid:
+            print(f"speed min={min(valid):.2f}x avg={sum(valid) / len(valid):.2f}x "
+                  f"cameras below realtime={behind}/{len(controllers)}")
+
+    for ctrl in controllers:
+        ctrl.stop()
+
+    for ctrl in controllers:
+        stats = ctrl.get_progress()
+        print(f"{stats['output_file']}: frames={stats['frame']} drop={stats['drop_frames']} "
+              f"dup={stats['dup_frames']} size={stats['total_size'] / 1_048_576:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import datetime
+import os
+import re
+import time
+from threading import Event, Lock, Thread
+from typing import Dict, Final, Optional, Set, Tuple
+from utils.VideoDeviceDetection import VideoDeviceDetection
+from utils.CaptureBackend import CaptureBackend
+from utils.FrameBus import FrameBus, FrameBusPublisher
+from .PreRollRecorder import PreRollRecorder, PreRollCapture
+
+
+class CaptureHub:
+    """
+    Opens each physical video device once and fans its encoded stream out to
+    any number of outputs.
+
+    Every device gets a single segmenting FFmpeg process (PreRollRecorder).
+    open_output() attaches a new PreRollCapture to it, so extra sensors mapped
+    to the same camera only add bookkeeping, not another decode/encode. The
+    device capture is stopped when its last output closes, unless it was
+    marked with keep_alive() (continuous pre-roll).
+
+    With frame_bus_resolution set, every device capture also publishes
+    downscaled frames to shared memory (FrameBus.name_for(device)) so
+    analytics processes can read the live feed without opening the camera.
+
+    Outputs are playlists of hard links to the ring's segments: keep
+    `ring_root` on the same volume as the outputs, or every segment is copied.
+
+    With watchdog=True (default) a background thread supervises every device
+    capture: if FFmpeg exits or its output stops growing for `stall_timeout`
+    seconds, the capture is restarted on a fresh ring and its open outputs
+    move to it, so they keep growing in the same playlist (marked as a
+    discontinuity). The outage is logged as an OUTAGE event. Restarts that
+    fail back off up to MAX_RESTART_DELAY.
+    """
+
+    MAX_RESTART_DELAY: Final[float] = 30.0
+
+    def __init__(
+        self,
+        pre_roll_seconds: int = 0,
+        segment_seconds: int = 1,
+        resolution: str = "1280x720",
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+        framerate: int = 30,
+        capture_backend: Optional[CaptureBackend] = None,
+        frame_bus_resolution: Optional[str] = None,
+        frame_bus_fps: float = 5,
+        frame_bus_pixel_format: str = "gray",
+        ring_root: Optional[str] = None,
+        watchdog: bool = True,
+        watchdog_interval: float = 1.0,
+        stall_timeout: float = 10.0
+    ):
+        self.pre_roll_seconds = pre_roll_seconds
+        self.segment_seconds = segment_seconds
+        self.resolution = resolution
+        self.ffmpeg_path = ffmpeg_path
+        self.framerate = framerate
+        self.capture_backend = capture_backend
+        self.frame_bus_resolution = frame_bus_resolution
+        self.frame_bus_fps = frame_bus_fps
+        self.frame_bus_pixel_format = frame_bus_pixel_format
+        self.ring_root = ring_root
+
+        self._recorders: Dict[str, PreRollRecorder] = {}
+        # One bus per device, kept across capture restarts so subscribers stay attached
+        self._frame_buses: Dict[str, FrameBusPublisher] = {}
+        self._keep_alive: Set[str] = set()
+        self._lock = Lock()
+
+        # Watchdog: device -> ((frame, total_size), last growth), device -> (retry delay, next try)
+        self.watchdog = watchdog
+        self.watchdog_interval = watchdog_interval
+        self.stall_timeout = stall_timeout
+        self.restarts = 0
+        self._last_output: Dict[str, Tuple[tuple, float]] = {}
+        self._retry: Dict[str, Tuple[float, float]] = {}
+        self._stop_event = Event()
+        self._watchdog_thread: Optional[Thread] = None
+
+    def _get_or_start(self, video_device: str) -> PreRollRecorder:
+        """Return the running capture for a device, starting it if needed. Caller holds the lock."""
+        recorder = self._recorders.get(video_device)
+        if recorder and recorder.is_recording_active():
+            return recorder
+        if recorder:
+            # FFmpeg died (device reset...): its open outputs continue on the new capture
+            recorder = self._replace(video_device, recorder)
+            if not recorder.is_recording_active():
+                raise RuntimeError(f"Could not open video device: {video_device}")
+            return recorder
+
+        recorder = self._new_recorder(video_device)
+        if not recorder.start_recording():
+            raise RuntimeError(f"Could not open video device: {video_device}")
+        self._recorders[video_device] = recorder
+        self._start_watchdog()
+        return recorder
+
+    def _new_recorder(self, video_device: str) -> PreRollRecorder:
+        return PreRollRecorder(
+            video_device=video_device,
+            pre_roll_seconds=self.pre_roll_seconds,
+            segment_seconds=self.segment_seconds,
+            ring_dir=self._ring_dir(video_device),
+            resolution=self.resolution,
+            ffmpeg_path=self.ffmpeg_path,
+            framerate=self.framerate,
+            capture_backend=self.capture_backend,
+            frame_bus=self._get_frame_bus(video_device)
+        )
+
+    def _replace(self, video_device: str, old: PreRollRecorder) -> PreRollRecorder:
+        """
+        Restart a failed device capture on a fresh ring and move its open outputs
+        to it. Returns the new capture, running or not (the watchdog retries it).
+        Caller holds the lock.
+        """
+        # A dead or hung process: no point in waiting long for a clean exit
+        if old.is_recording:
+            old.stop_recording(timeout=2.0)
+        # Everything the old process wrote goes to the outputs before the ring is reset
+        old.collect(include_current=True)
+        with old._lock:
+            captures, old._captures = old._captures, []
+
+        recorder = self._new_recorder(video_device)
+        with recorder._lock:
+            for capture in captures:
+                capture._move_to(recorder)
+            recorder._captures.extend(captures)
+        self._recorders[video_device] = recorder
+        self._last_output.pop(video_device, None)
+        recorder.start_recording()
+        return recorder
+
+    def _start_watchdog(self) -> None:
+        if not self.watchdog or (self._watchdog_thread and self._watchdog_thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._watchdog_thread = Thread(target=self._watch_loop, daemon=True)
+        self._watchdog_thread.start()
+
+    def _watch_loop(self) -> None:
+        while not self._stop_event.wait(self.watchdog_interval):
+            with self._lock:
+                for video_device, recorder in list(self._recorders.items()):
+                    reason = self._failure_of(video_device, recorder)
+                    if reason:
+                        self._recover(video_device, recorder, reason)
+
+    def _failure_of(self, video_device: str, recorder: PreRollRecorder) -> Optional[str]:
+        """Why a device capture needs a restart ("exited", "stalled", "not_started"), or None."""
+        if recorder.process is None:
+            return "not_started"
+        if recorder.process.poll() is not None:
+            return "exited"
+        stats = recorder.get_progress()
+        output = (stats["frame"], stats["total_size"])
+        now = time.monotonic()
+        last_output, last_growth = self._last_output.get(video_device, (None, now))
+        if output != last_output:
+            self._last_output[video_device] = (output, now)
+        elif now - last_growth >= self.stall_timeout:
+            return "stalled"
+        return None
+
+    def _recover(self, video_device: str, old: PreRollRecorder, reason: str) -> None:
+        """Restart one device capture, backing off while it keeps failing. Caller holds the lock."""
+        delay, next_try = self._retry.get(video_device, (0.0, 0.0))
+        if time.monotonic() < next_try:
+            return
+        stats = old.get_progress()
+        # The outage starts with the last progress report of the failed process
+        outage_start = (datetime.datetime.fromtimestamp(stats["updated_at"])
+                        if stats["updated_at"] else datetime.datetime.now())
+        stderr_tail = old.progress.stderr_tail()[-2000:] if old.progress else None
+
+        recorder = self._replace(video_device, old)
+        started = recorder.is_recording_active()
+        self.restarts += 1
+        if started:
+            self._retry.pop(video_device, None)
+        else:
+            delay = min(max(1.0, delay * 2), self.MAX_RESTART_DELAY)
+            self._retry[video_device] = (delay, time.monotonic() + delay)
+        recorder.video_logger.log_event(
+            source=video_device,
+            output_file=recorder.output_file,
+            codec=recorder.codec,
+            resolution=recorder.resolution,
+            event="OUTAGE",
+            timestamp=datetime.datetime.now(),
+            status="RECOVERED" if started else "RETRYING",
+            extra={"reason": reason, "outage_start": outage_start.isoformat(),
+                   "outputs": len(recorder._captures), "restarts": self.restarts,
+                   "ffmpeg_stderr": stderr_tail}
+        )
+
+    def _ring_dir(self, video_device: str) -> Optional[str]:
+        if self.ring_root is None:
+            return None  # PreRollRecorder default
+        return os.path.join(self.ring_root, re.sub(r'[^a-zA-Z0-9_-]', '_', video_device.strip().lower()))
+
+    def _get_frame_bus(self, video_device: str) -> Optional[FrameBusPublisher]:
+        if not self.frame_bus_resolution:
+            return None
+        if video_device not in self._frame_buses:
+            self._frame_buses[video_device] = FrameBusPublisher(
+                name=FrameBus.name_for(video_device),
+                resolution=self.frame_bus_resolution,
+                fps=self.frame_bus_fps,
+                pixel_format=self.frame_bus_pixel_format
+            )
+        return self._frame_buses[video_device]
+
+    def keep_alive(self, video_device: str) -> PreRollRecorder:
+        """Start a device capture that keeps running with no outputs attached."""
+        with self._lock:
+            self._keep_alive.add(video_device)
+            return self._get_or_start(video_device)
+
+    def open_output(self, video_device: str, output_file: str) -> PreRollCapture:
+        """
+        Attach a new output to the device capture.
+        The returned capture is stopped with stop(), like a VideoDeviceRecordingController.
+        """
+        with self._lock:
+            recorder = self._get_or_start(video_device)
+            return recorder.trigger(output_file, on_finished=self._on_output_finished)
+
+    def _on_output_finished(self, capture: PreRollCapture) -> None:
+        """Stop the device capture once no output needs it anymore."""
+        recorder = capture.ring
+        with self._lock:
+            if recorder.video_device in self._keep_alive or recorder.has_open_captures():
+                return
+            if self._recorders.get(recorder.video_device) is recorder:
+                del self._recorders[recorder.video_device]
+            # Under the lock: a new capture for this device must not start while it is still open
+            # (within what is left of the capture's stop deadline, if any)
+            recorder.stop_recording(capture.remaining_time() or 8.0)
+
+    def is_capturing(self, video_device: str) -> bool:
+        """Check if the device currently has a running capture."""
+        with self._lock:
+            recorder = self._recorders.get(video_device)
+            return recorder is not None and recorder.is_recording_active()
+
+    def close(self, timeout: float = 8.0) -> None:
+        """
+        Stop every device capture, including keep-alive ones, in parallel.
+        Returns within `timeout` plus the terminate() grace, however many devices there are.
+        """
+        self._stop_event.set()
+        if self._watchdog_thread:
+            self._watchdog_thread.join(timeout=5.0)
+        with self._lock:
+            recorders = list(self._recorders.values())
+            self._recorders.clear()
+            self._keep_alive.clear()
+            frame_buses = list(self._frame_buses.values())
+            self._frame_buses.clear()
+        threads = [Thread(target=recorder.stop_recording, args=(timeout,), daemon=True)
+                   for recorder in recorders]
+        # One deadline for all of them, grace included
+        hard_deadline = time.monotonic() + timeout + PreRollRecorder.STOP_GRACE_SECONDS
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=max(0.0, hard_deadline - time.monotonic()))
+        for frame_bus in frame_buses:
+            frame_bus.close()
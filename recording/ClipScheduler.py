@@ -0,0 +1,212 @@
+import bisect
+import itertools
+import os
+import queue
+import subprocess
+import time
+from concurrent.futures import Future
+from threading import Condition, Lock, Thread
+from typing import Any, Callable, Dict, Final, List, Optional, Tuple
+from utils.system_log import SystemLog
+
+
+class ClipJob(Future):
+    """
+    Future of one clip. result() returns a dict:
+        status:          "SUCCESS" | "FAILED" | "CANCELLED"
+        output_file:     path of the clip
+        queued_seconds:  time waiting for an encoder slot
+        run_seconds:     time FFmpeg ran
+        (plus whatever the job function returned, e.g. returncode, stderr)
+
+    cancel() removes a queued job; on a running job it kills FFmpeg and the
+    job finishes with status "CANCELLED".
+    """
+
+    def __init__(self, output_file: str, encoder: str, priority: int):
+        super().__init__()
+        self.output_file = output_file
+        self.encoder = encoder
+        self.priority = priority
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = False
+        self._process: Optional[subprocess.Popen] = None
+        self._process_lock = Lock()
+
+    def __str__(self) -> str:
+        return self.output_file
+
+    @property
+    def queued_seconds(self) -> Optional[float]:
+        end = self.started_at or self.finished_at
+        return end - self.submitted_at if end else None
+
+    @property
+    def run_seconds(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def attach(self, process: subprocess.Popen) -> None:
+        """Register the FFmpeg process of the job, so cancel() can stop it."""
+        with self._process_lock:
+            self._process = process
+            if self.cancel_requested:
+                process.kill()
+
+    def cancel(self) -> bool:
+        if super().cancel():
+            return True
+        if self.done():
+            return False
+        with self._process_lock:
+            self.cancel_requested = True
+            if self._process and self._process.poll() is None:
+                self._process.kill()
+        return True
+
+
+class ClipScheduler:
+    """
+    Bounded pool for clip jobs.
+
+    At most `limits[encoder]` jobs run at once per encoder family (NVENC has a
+    hard session limit, libx265 saturates the CPU), jobs start in priority
+    order (PRIORITY_LIVE before PRIORITY_BULK, FIFO within a priority) and at
+    most `max_queued` jobs wait; submit() blocks (or raises queue.Full) beyond
+    that. A waiting job never holds a slot, so a full NVENC queue does not
+    delay CPU or stream-copy jobs.
+
+    GPU session limits are per GPU and shared with the live recorders: a camera
+    encoding with h264_nvenc holds one NVENC session for as long as it records.
+    The "nvidia" limit must leave room for them (driver limit minus cameras on
+    NVENC), e.g. ClipScheduler.configure_shared({"nvidia": 1}) with 2 cameras on a
+    driver limited to 3 sessions; otherwise a clip can make a camera fail to start.
+    """
+
+    PRIORITY_LIVE: Final[int] = 0
+    PRIORITY_NORMAL: Final[int] = 5
+    PRIORITY_BULK: Final[int] = 10
+
+    # Encoder family (EncoderProfiles.vendor_of, or "copy") -> concurrent jobs
+    DEFAULT_LIMITS: Final[Dict[str, int]] = {
+        "nvidia": 3,  # Session limit of consumer NVENC drivers, live recorders included (see configure_shared)
+        "amd": 2,
+        "intel": 2,
+        "vaapi": 2,
+        "cpu": max(1, (os.cpu_count() or 2) // 4),  # libx265 already uses every core
+        "copy": 8,  # I/O bound
+    }
+    # Families whose limit counts encoder sessions (one per output of a multi-output job)
+    SESSION_LIMITED: Final[tuple[str, ...]] = ("nvidia", "amd", "intel", "vaapi")
+
+    log: Final[SystemLog] = SystemLog(__name__)
+
+    _shared: Optional["ClipScheduler"] = None
+    _shared_lock = Lock()
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, max_queued: int = 256):
+        self.limits = {**self.DEFAULT_LIMITS, **(limits or {})}
+        self.max_queued = max_queued
+        # Sorted by (priority, sequence)
+        self._queue: List[Tuple[int, int, ClipJob, Callable[[ClipJob], Dict[str, Any]], int]] = []
+        self._running: Dict[str, int] = {}
+        self._sequence = itertools.count()
+        self._condition = Condition()
+
+    @classmethod
+    def shared(cls) -> "ClipScheduler":
+        """Process-wide scheduler used by VideoFileRecorder by default."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @classmethod
+    def configure_shared(cls, limits: Optional[Dict[str, int]] = None,
+                         max_queued: int = 256) -> "ClipScheduler":
+        """
+        Replace the process-wide scheduler with one using `limits` (merged over
+        DEFAULT_LIMITS). Call it at startup, before clips are queued: jobs already
+        on the previous scheduler keep running there.
+        """
+        with cls._shared_lock:
+            cls._shared = cls(limits, max_queued)
+            return cls._shared
+
+    def submit(
+        self,
+        run: Callable[[ClipJob], Dict[str, Any]],
+        output_file: str,
+        encoder: str,
+        priority: int = PRIORITY_NORMAL,
+        block: bool = True,
+        timeout: Optional[float] = None,
+        slots: int = 1
+    ) -> ClipJob:
+        """
+        Queue `run(job)`; it must return a dict with at least "status".
+        `slots`: encoder slots the job takes (outputs of a multi-output FFmpeg, capped at the limit).
+
+        Raises:
+            queue.Full: If `max_queued` jobs are waiting and none left in time (or block=False)
+        """
+        job = ClipJob(output_file, encoder, priority)
+        with self._condition:
+            if not self._condition.wait_for(lambda: len(self._queue) < self.max_queued,
+                                            timeout if block else 0):
+                raise queue.Full(f"{len(self._queue)} clip jobs already waiting")
+            # (priority, sequence) is unique, so entries never compare further
+            slots = max(1, min(slots, self.limits.get(encoder, 1)))
+            bisect.insort(self._queue, (priority, next(self._sequence), job, run, slots))
+            self._dispatch()
+        return job
+
+    def _dispatch(self) -> None:
+        """Start every queued job that has a free slot for its encoder. Caller holds the condition."""
+        position = 0
+        while position < len(self._queue):
+            _, _, job, run, slots = self._queue[position]
+            if job.cancelled():
+                del self._queue[position]
+                self._condition.notify_all()
+                job.set_running_or_notify_cancel()  # Wakes up wait()/as_completed() callers
+                continue
+            if self._running.get(job.encoder, 0) + slots > self.limits.get(job.encoder, 1):
+                position += 1
+                continue
+            del self._queue[position]
+            self._condition.notify_all()
+            if not job.set_running_or_notify_cancel():
+                continue
+            self._running[job.encoder] = self._running.get(job.encoder, 0) + slots
+            job.started_at = time.time()
+            Thread(target=self._run, args=(job, run, slots), daemon=True).start()
+
+    def _run(self, job: ClipJob, run: Callable[[ClipJob], Dict[str, Any]], slots: int) -> None:
+        try:
+            result = run(job)
+        except Exception as e:
+            self.log.error(f"Clip job {job.output_file} failed: {e}")
+            result = {"status": "FAILED", "exception": str(e)}
+        finally:
+            job.finished_at = time.time()
+            with self._condition:
+                self._running[job.encoder] -= slots
+                self._dispatch()
+
+        if job.cancel_requested:
+            result["status"] = "CANCELLED"
+        job.set_result({
+            **result,
+            "output_file": job.output_file,
+            "queued_seconds": job.queued_seconds,
+            "run_seconds": job.run_seconds
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        """Queued jobs and running jobs per encoder family."""
+        with self._condition:
+            return {"queued": len(self._queue), "running": dict(self._running)}
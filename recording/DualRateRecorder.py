@@ -0,0 +1,255 @@
+import os
+import threading
+import time
+from threading import Event, Lock
+from typing import Any, Dict, List, Optional
+from utils.VideoDeviceDetection import VideoDeviceDetection
+from utils.CaptureBackend import CaptureBackend
+from .MotionGatedRecorder import MotionGatedRecorder
+from .PreRollRecorder import PreRollCapture
+
+
+class DualRateRecorder(MotionGatedRecorder):
+    """
+    Always-on camera recording at two rates from a single device capture.
+
+    FFmpeg writes a low-fps, reduced-resolution timelapse as an extra output of
+    the same decode: frames are dropped and scaled inside FFmpeg, nothing goes
+    through Python. The timelapse rolls into dated files every
+    `timelapse_segment_seconds` (`name_timelapse_2025-09-14_17-00-00.mp4`, ...),
+    so retention can age out old hours while the camera keeps running. alert() opens a full-rate capture on
+    the encoded segment ring (`name_alert_001.m3u8`, or the file given to
+    alert()) that includes the last `pre_padding` seconds; once every alert is
+    cleared it keeps going for `post_padding` seconds and closes. The timelapse
+    never stops, so there is continuous coverage. Switching rates starts or
+    ends a capture on the ring: the device is never reopened.
+
+    While idle the ring's encoder gets only `pre_padding_fps` frames per
+    second (see MotionGatedRecorder), so the idle encoding is the timelapse
+    plus about one full-size frame per second; alert() brings the ring to
+    full rate within about half a second. The pre-padding is at that low rate.
+    """
+
+    TRIGGER: str = "alert"
+
+    def __init__(
+        self,
+        video_device: str,
+        output_file: Optional[str] = None,
+        resolution: str = "1280x720",
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+        framerate: int = 30,
+        capture_backend: Optional[CaptureBackend] = None,
+        codec: Optional[str] = None,
+        idle_fps: float = 2,
+        idle_resolution: str = "640x360",
+        pre_padding: float = 2.0,
+        post_padding: float = 5.0,
+        timelapse_segment_seconds: Optional[int] = 3600,
+        pre_padding_fps: float = 1.0
+    ):
+        """
+        Args:
+            idle_fps: Frame rate of the timelapse
+            idle_resolution: Size of the timelapse
+            timelapse_segment_seconds: Length of each timelapse file (None: one file for the whole run)
+            pre_padding: Seconds before alert() included in the full-rate file
+            post_padding: Seconds recorded at full rate after the last alert is cleared
+            pre_padding_fps: Frame rate of the ring while idle (the pre-padding), at least
+                MotionGatedRecorder.MIN_IDLE_FPS
+        """
+        super().__init__(
+            video_device=video_device,
+            output_file=output_file,
+            resolution=resolution,
+            ffmpeg_path=ffmpeg_path,
+            framerate=framerate,
+            capture_backend=capture_backend,
+            codec=codec,
+            pre_padding=pre_padding,
+            post_padding=post_padding,
+            pre_padding_fps=pre_padding_fps
+        )
+        self.idle_fps = idle_fps
+        self.idle_resolution = idle_resolution
+        self.timelapse_segment_seconds = timelapse_segment_seconds
+        root, ext = os.path.splitext(self.base_output_file)
+        # Base name; with timelapse_segment_seconds the files carry their start time (timelapse_files())
+        self.timelapse_file = f"{root}_timelapse{ext or '.mp4'}"
+        self.extra_outputs = [self._normalize_extra_output({
+            "output_file": self.timelapse_file,
+            "resolution": idle_resolution,
+            "framerate": idle_fps,
+            "use_case": "archive",
+            "segment_seconds": timelapse_segment_seconds
+        })]
+
+        # Open alerts; the full-rate capture stays open while there is at least one
+        self._alerts = 0
+        self._post_timer: Optional[threading.Timer] = None
+        self._alert_lock = Lock()
+        self._event_closed = Event()
+        self._event_closed.set()
+        # Whether the last full-rate capture had to cut its final segment short
+        self.last_event_forced = False
+
+    def _continuation_args(
+        self,
+        resolution: Optional[str],
+        framerate: Optional[int],
+        fast_preset: Optional[bool]
+    ) -> Dict[str, Any]:
+        """Next part with the same rates and paddings (new timelapse file too)."""
+        args = super()._continuation_args(resolution, framerate, fast_preset)
+        for motion_only in ("motion_threshold", "pixel_threshold", "detect_fps"):
+            del args[motion_only]
+        args.update(idle_fps=self.idle_fps, idle_resolution=self.idle_resolution,
+                    timelapse_segment_seconds=self.timelapse_segment_seconds)
+        return args
+
+    def _raw_output_filters(self) -> Optional[str]:
+        """Alerts come from alert(): no frames are analyzed."""
+        return None
+
+    def alert(self, output_file: Optional[str] = None) -> Optional[str]:
+        """
+        Switch to full rate. `output_file` names the full-rate capture if none is open yet.
+        Every alert() that returns a playlist must be matched by a clear_alert().
+        Returns the playlist the incident is recorded to, or None if the capture could not
+        start (the alert is then not counted).
+        """
+        with self._alert_lock:
+            self._alerts += 1
+            if self._post_timer is not None:
+                self._post_timer.cancel()
+                self._post_timer = None
+            self._event_closed.clear()
+            if self._event is not None:
+                return self._event.output_file
+            if output_file:
+                os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+            event = self._open_event(output_file)
+            if event is None:
+                self._alerts -= 1
+                if self._alerts == 0:
+                    self._event_closed.set()
+                return None
+            return event.output_file
+
+    def clear_alert(self) -> bool:
+        """
+        End one alert; full rate continues for `post_padding` seconds after the last one.
+        Returns True if it was the last open alert.
+        """
+        with self._alert_lock:
+            self._alerts = max(0, self._alerts - 1)
+            if self._alerts == 0 and self._event is not None:
+                self._post_timer = threading.Timer(self.post_padding, self._end_post_padding)
+                self._post_timer.daemon = True
+                self._post_timer.start()
+            elif self._alerts == 0:
+                self._event_closed.set()
+            return self._alerts == 0
+
+    def _end_post_padding(self) -> None:
+        with self._alert_lock:
+            if self._alerts > 0:
+                return
+            self._post_timer = None
+        self._close_event()
+
+    def cut_post_padding(self) -> None:
+        """Close the full-rate capture now instead of after post_padding (if no alert is open)."""
+        with self._alert_lock:
+            if self._post_timer is not None:
+                self._post_timer.cancel()
+                self._post_timer = None
+        self._end_post_padding()
+
+    def wait_alert_closed(self, timeout: Optional[float] = None) -> bool:
+        """Block until the full-rate capture of the last incident is closed."""
+        return self._event_closed.wait(timeout)
+
+    def _on_event_finished(self, event: PreRollCapture) -> None:
+        with self._alert_lock:
+            self.last_event_forced = event.forced
+            if self._event is None:
+                self._event_closed.set()
+
+    def stop_recording(self, timeout: float = 8.0) -> bool:
+        """Stop the capture; open incidents are closed with what was recorded."""
+        with self._alert_lock:
+            if self._post_timer is not None:
+                self._post_timer.cancel()
+                self._post_timer = None
+        stopped = super().stop_recording(timeout)
+        self._event_closed.set()
+        return stopped
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Capture stats plus alert state (full rate on/off, incidents recorded)."""
+        stats = super().get_progress()
+        stats["alerts"] = self._alerts
+        stats["timelapse_files"] = len(self.timelapse_files())
+        return stats
+
+    def timelapse_files(self) -> List[str]:
+        """Timelapse files written so far, oldest first (the last one may still be growing)."""
+        return self.extra_output_files(self.extra_outputs[0])
+
+    def list_output_files(self) -> List[str]:
+        """Timelapse files followed by one playlist per incident."""
+        return self.timelapse_files() + super().list_output_files()
+
+
+class DualRateAlert:
+    """
+    One alert on a DualRateRecorder, with the stop()/is_recording()/get_progress()
+    methods of PreRollCapture so SecuritySystem can keep both in the same collection.
+    """
+
+    def __init__(self, recorder: DualRateRecorder, output_file: str):
+        """
+        Raises:
+            RuntimeError: If the full-rate capture could not start (logged as an ERROR event)
+        """
+        self.recorder = recorder
+        self.forced = False
+        # Another sensor may already have the camera at full rate: share its file
+        playlist = recorder.alert(output_file)
+        if playlist is None:
+            raise RuntimeError(f"Could not start the full-rate capture of {recorder.video_device}")
+        self.output_file = playlist
+        self._active = True
+
+    def is_recording(self) -> bool:
+        return self._active and self.recorder.is_recording_active()
+
+    def get_progress(self) -> Dict[str, Any]:
+        stats = self.recorder.get_progress()
+        stats["output_file"] = self.output_file
+        stats["recording"] = self.is_recording()
+        return stats
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Clear the alert and wait for the full-rate file to close (after post_padding,
+        if no other alert is open on the camera). If `timeout` runs out first, the
+        post-padding is cut short (`forced` = True). Returns True if it closed cleanly.
+        """
+        if not self._active:
+            return False
+        self._active = False
+        if not self.recorder.clear_alert():
+            return True  # Other alerts keep the file open
+        if timeout is None:
+            timeout = self.recorder.post_padding + 10
+        deadline = time.monotonic() + timeout
+        # Closing a capture waits for the segment being written
+        close_time = self.recorder.segment_seconds + 1
+        if not self.recorder.wait_alert_closed(max(0.0, timeout - close_time)):
+            self.forced = True
+            self.recorder.cut_post_padding()
+        closed = self.recorder.wait_alert_closed(max(0.0, deadline - time.monotonic()))
+        self.forced = self.forced or self.recorder.last_event_forced
+        return closed and not self.forced
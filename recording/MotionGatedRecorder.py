@@ -0,0 +1,293 @@
+import datetime
+import math
+import os
+import re
+import shutil
+import subprocess
+import time
+from threading import Lock, Thread
+from typing import Any, Dict, Final, List, Optional
+import cv2
+import numpy as np
+from utils.VideoDeviceDetection import VideoDeviceDetection
+from utils.CaptureBackend import CaptureBackend
+from .PreRollRecorder import PreRollRecorder, PreRollCapture
+
+
+class MotionGatedRecorder(PreRollRecorder):
+    """
+    Keeps a video device's footage only around motion.
+
+    One FFmpeg process captures the device and writes two outputs of the same
+    decode: an encoded MPEG-TS ring (see PreRollRecorder) and, on stdout, a
+    small grayscale copy (DETECT_WIDTH wide, `detect_fps`) that Python
+    compares frame to frame with OpenCV. Downscaling and frame dropping happen
+    inside FFmpeg, so only a few KB per analyzed frame cross the pipe. A
+    motion event is a capture on the ring (`name_motion_001.m3u8`, ...) that
+    starts `pre_padding` seconds before the first motion frame and is closed
+    `post_padding` seconds after the last one; ring segments outside events
+    are deleted.
+
+    The ring's encoder is gated: while the scene is static a filter in front
+    of it (GATE_FILTER) lets only `pre_padding_fps` frames per second through,
+    and an event switches it to full rate through FFmpeg's command interface
+    (stdin) within about half a second, without restarting the capture. The
+    pre-padding is therefore low-rate footage, and the idle cost is one
+    decode, the analysis and a few encoded frames per second. The gate never
+    closes completely (MIN_IDLE_FPS): FFmpeg keeps the outputs of a process
+    in step, so a main output without frames would hold back the analysis
+    frames too. With a camera that delivers H.264 the ring is a stream copy
+    at full rate (copying costs next to nothing), so nothing is gated.
+
+    Exposes the same start_recording()/stop_recording() API as
+    VideoDeviceRecorder, so it can be driven by VideoDeviceRecordingController.
+    """
+
+    DETECT_WIDTH: int = 160
+    # Timeline-enabled metadata filter: drops every frame while enabled (see _idle_gate_expression())
+    GATE_FILTER: Final[str] = "metadata@gate"
+    # Lowest pre_padding_fps that keeps the analysis output flowing
+    MIN_IDLE_FPS: Final[float] = 1.0
+    # Event files are named `<output>_<TRIGGER>_001.m3u8` and logged with extra.trigger
+    TRIGGER: str = "motion"
+    # Each part of a supervised recording gets its own ring (see continuation())
+    CAN_CONTINUE: bool = True
+
+    def __init__(
+        self,
+        video_device: str,
+        output_file: Optional[str] = None,
+        resolution: str = "1280x720",
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+        framerate: int = 30,
+        capture_backend: Optional[CaptureBackend] = None,
+        codec: Optional[str] = None,
+        pre_padding: float = 2.0,
+        post_padding: float = 5.0,
+        motion_threshold: float = 0.01,
+        pixel_threshold: int = 25,
+        detect_fps: int = 5,
+        pre_padding_fps: float = 2.0
+    ):
+        """
+        Args:
+            pre_padding: Seconds kept before the first motion frame of an event
+            post_padding: Seconds of no motion before an event is closed
+            motion_threshold: Fraction of changed pixels that counts as motion
+            pixel_threshold: Per-pixel luma difference (0-255) that counts as a change
+            detect_fps: How many frames per second are analyzed
+            pre_padding_fps: Frames per second encoded while there is no motion, which is
+                the footage the pre-padding is made of (at least MIN_IDLE_FPS)
+        """
+        if pre_padding_fps < self.MIN_IDLE_FPS:
+            raise ValueError(f"pre_padding_fps must be at least {self.MIN_IDLE_FPS}")
+        if output_file is None:
+            safe_device_name = re.sub(r'[^a-zA-Z0-9_-]', '_', video_device.strip().lower())
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_file = f"videos/cameras/{safe_device_name}_{timestamp}.mp4"
+        # The ring lives next to the events (hard links need the same volume)
+        root = os.path.splitext(os.path.basename(output_file))[0]
+        super().__init__(
+            video_device=video_device,
+            pre_roll_seconds=math.ceil(pre_padding),
+            segment_seconds=1,
+            ring_dir=os.path.join(os.path.dirname(output_file) or ".", "preroll", root),
+            resolution=resolution,
+            ffmpeg_path=ffmpeg_path,
+            framerate=framerate,
+            capture_backend=capture_backend,
+            codec=codec
+        )
+        self.base_output_file = output_file
+        self.pre_padding = pre_padding
+        self.post_padding = post_padding
+        self.motion_threshold = motion_threshold
+        self.pixel_threshold = pixel_threshold
+        self.detect_fps = detect_fps
+        self.pre_padding_fps = pre_padding_fps
+
+        width, height = (int(v) for v in resolution.lower().split("x"))
+        # Even height, as most pixel format conversions require
+        self._detect_height = max(2, height * self.DETECT_WIDTH // width // 2 * 2)
+        self._detect_size = self.DETECT_WIDTH * self._detect_height
+        self._previous_small: Optional[np.ndarray] = None
+        self._last_motion: float = 0.0
+
+        self._event: Optional[PreRollCapture] = None
+        self._event_lock = Lock()
+        # Whether the gate in front of the ring's encoder was last set to full rate
+        self._full_rate = False
+        # Events are closed off the reader thread: stop() waits for the last segment
+        self._closing: List[Thread] = []
+        self.events: List[str] = []
+        self.motion_frames = 0
+        self.analyzed_frames = 0
+
+    def _continuation_args(
+        self,
+        resolution: Optional[str],
+        framerate: Optional[int],
+        fast_preset: Optional[bool]
+    ) -> Dict[str, Any]:
+        """Next part with the same motion settings (the encoder preset is not configurable here)."""
+        return {
+            "video_device": self.video_device,
+            "output_file": self._next_part_name(self.base_output_file),
+            "resolution": resolution or self.resolution,
+            "ffmpeg_path": self.ffmpeg_path,
+            "framerate": framerate or self.framerate,
+            "capture_backend": self.capture_backend,
+            "codec": self.codec,
+            "pre_padding": self.pre_padding,
+            "post_padding": self.post_padding,
+            "motion_threshold": self.motion_threshold,
+            "pixel_threshold": self.pixel_threshold,
+            "detect_fps": self.detect_fps,
+            "pre_padding_fps": self.pre_padding_fps
+        }
+
+    def _idle_gate_expression(self) -> str:
+        """Gate `enable` expression while there is no motion: drop all frames but every n-th."""
+        return f"mod(n,{max(1, round(self.framerate / self.pre_padding_fps))})"
+
+    def _main_output_filters(self) -> List[str]:
+        """The ring's encoder is fed through the gate, at the idle rate until an event opens it."""
+        gate = f"{self.GATE_FILTER}=mode=select:key=gate:enable='{self._idle_gate_expression()}'"
+        # Commas inside a filter option must be escaped in the graph
+        return [gate.replace(",", "\\,")] + super()._main_output_filters()
+
+    def _ring_output_args(self) -> List[str]:
+        """Keep the gaps the gate leaves: a constant frame rate would duplicate frames to fill them."""
+        return [] if self.passthrough else ["-fps_mode", "vfr"]
+
+    def _set_full_rate(self, full: bool) -> None:
+        """
+        Switch the gate between full rate and the idle rate (FFmpeg applies it within ~0.5 s).
+        Caller holds _event_lock, so the last decision between open and close wins.
+        """
+        process = self.process
+        if self.passthrough or process is None or process.poll() is not None or not process.stdin:
+            return
+        expression = "0" if full else self._idle_gate_expression()
+        try:
+            # One write: the "c" key makes FFmpeg read the command from the same line
+            process.stdin.write(f"c{self.GATE_FILTER} -1 enable {expression}\n")
+            process.stdin.flush()
+            self._full_rate = full
+        except (OSError, ValueError):
+            pass
+
+    def _raw_output_filters(self) -> Optional[str]:
+        """Small grayscale frames for the motion analysis, at `detect_fps`."""
+        return f"fps={self.detect_fps},scale={self.DETECT_WIDTH}:{self._detect_height},format=gray"
+
+    def _read_raw_output(self, process: subprocess.Popen) -> None:
+        """Read the analysis frames, detect motion and open/close events on the ring."""
+        stream = process.stdout.buffer  # Binary side of the text-mode pipe
+        while True:
+            try:
+                frame = stream.read(self._detect_size)
+            except (ValueError, OSError):
+                break
+            if not frame or len(frame) < self._detect_size:
+                break
+
+            self.analyzed_frames += 1
+            now = time.monotonic()
+            if self._detect_motion(frame):
+                self._last_motion = now
+                self.motion_frames += 1
+
+            in_event = self._last_motion > 0 and now - self._last_motion <= self.post_padding
+            if in_event and self._event is None:
+                self._open_event()
+            elif not in_event and self._event is not None:
+                self._close_event()
+
+    def _detect_motion(self, frame: bytes) -> bool:
+        """Frame difference on the small grayscale frame."""
+        small = np.frombuffer(frame, dtype=np.uint8).reshape(self._detect_height, self.DETECT_WIDTH)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+
+        previous, self._previous_small = self._previous_small, small
+        if previous is None:
+            return False
+        diff = cv2.absdiff(small, previous)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(mask) / mask.size >= self.motion_threshold
+
+    def _next_event_file(self) -> str:
+        root, ext = os.path.splitext(self.base_output_file)
+        return f"{root}_{self.TRIGGER}_{len(self.events) + 1:03d}{ext or '.mp4'}"
+
+    def _open_event(self, output_file: Optional[str] = None) -> Optional[PreRollCapture]:
+        """Start a capture on the ring that includes the pre-padding."""
+        try:
+            event = self.trigger(
+                output_file or self._next_event_file(),
+                on_finished=self._on_event_finished,
+                extra={"trigger": self.TRIGGER, "pre_padding": self.pre_padding}
+            )
+        except (OSError, RuntimeError) as e:
+            self.video_logger.log_event(
+                source=self.video_device,
+                output_file=output_file or self._next_event_file(),
+                codec=self.codec,
+                event="ERROR",
+                status="FAILED",
+                extra={"exception": str(e)}
+            )
+            return None
+        with self._event_lock:
+            self._event = event
+            self._set_full_rate(True)
+        self.events.append(event.output_file)
+        return event
+
+    def _close_event(self) -> None:
+        """Close the open event in the background; the capture thread keeps analyzing."""
+        with self._event_lock:
+            event, self._event = self._event, None
+        if event is None:
+            return
+        closer = Thread(target=self._finish_event, args=(event,), daemon=True)
+        self._closing = [thread for thread in self._closing if thread.is_alive()] + [closer]
+        closer.start()
+
+    def _finish_event(self, event: PreRollCapture) -> None:
+        """Close the capture (its last segment is written at full rate), then lower the gate."""
+        event.stop()
+        with self._event_lock:
+            if self._event is None:
+                self._set_full_rate(False)
+
+    def _on_event_finished(self, event: PreRollCapture) -> None:
+        """Called by the capture once its playlist is closed."""
+        pass
+
+    def stop_recording(self, timeout: float = 8.0) -> bool:
+        """Stop capturing; an open event is closed with whatever was recorded."""
+        deadline = time.monotonic() + timeout
+        stopped = super().stop_recording(timeout)
+        self._close_event()
+        for closer in self._closing:
+            closer.join(timeout=max(0.1, deadline - time.monotonic()))
+        if not any(closer.is_alive() for closer in self._closing):
+            # Events hold their own links to the segments: the ring can go
+            shutil.rmtree(self.ring_dir, ignore_errors=True)
+        self._closing = []
+        return stopped
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Capture stats plus motion counters (events, share of analyzed frames with motion)."""
+        stats = super().get_progress()
+        stats["full_rate"] = self.passthrough or self._full_rate
+        stats["motion_events"] = len(self.events)
+        stats["in_event"] = self._event is not None
+        stats["analyzed_frames"] = self.analyzed_frames
+        stats["motion_frames"] = self.motion_frames
+        return stats
+
+    def list_output_files(self) -> List[str]:
+        """One playlist per motion event."""
+        return [path for path in self.events if os.path.exists(path)]
@@ -0,0 +1,408 @@
+import datetime
+import glob
+import os
+import re
+import subprocess
+import time
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Final, List, Optional
+from utils.VideoDeviceDetection import VideoDeviceDetection
+from utils.CaptureBackend import CaptureBackend
+from utils.FrameBus import FrameBusPublisher
+from utils.RecordingVerifier import RecordingVerifier
+from utils.SegmentPlaylist import SegmentPlaylist
+from .VideoDeviceRecorder import VideoDeviceRecorder
+
+
+class PreRollRecorder(VideoDeviceRecorder):
+    """
+    Always-on recorder that keeps the last N seconds of a video device on disk.
+
+    FFmpeg writes short MPEG-TS segments into a ring directory and a background
+    thread deletes the ones older than the pre-roll window. A call to trigger()
+    returns a PreRollCapture whose recording starts `pre_roll_seconds` before
+    the event, without starting FFmpeg on the alert path. Every segment_seconds
+    the same thread hands the segments closed since the last pass to each open
+    capture (collect()), so a capture never waits for a copy when it stops.
+    """
+
+    SEGMENT_PATTERN: Final[str] = "seg_%08d.ts"
+    # The ring is not a recording of its own: there is no next part to continue into
+    CAN_CONTINUE: bool = False
+    # The ring needs the pruner thread started by start_recording()
+    CAN_BE_MANAGED: bool = False
+    _SEGMENT_RE: Final[re.Pattern] = re.compile(r"seg_(\d+)\.ts$")
+
+    def __init__(
+        self,
+        video_device: str,
+        pre_roll_seconds: int = 5,
+        segment_seconds: int = 1,
+        ring_dir: Optional[str] = None,
+        resolution: str = "1280x720",
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+        framerate: int = 30,
+        capture_backend: Optional[CaptureBackend] = None,
+        frame_bus: Optional[FrameBusPublisher] = None,
+        codec: Optional[str] = None
+    ):
+        if pre_roll_seconds < 0 or segment_seconds <= 0:
+            raise ValueError("pre_roll_seconds must be >= 0 and segment_seconds positive")
+
+        if ring_dir is None:
+            safe_device_name = re.sub(r'[^a-zA-Z0-9_-]', '_', video_device.strip().lower())
+            ring_dir = os.path.join("videos", "preroll", safe_device_name)
+
+        # Empezar con el anillo vacío: segmentos viejos no pertenecen a esta sesión
+        for old_segment in glob.glob(os.path.join(ring_dir, "seg_*.ts")):
+            try:
+                os.remove(old_segment)
+            except OSError:
+                pass
+
+        super().__init__(
+            video_device=video_device,
+            output_file=os.path.join(ring_dir, self.SEGMENT_PATTERN),
+            resolution=resolution,
+            ffmpeg_path=ffmpeg_path,
+            framerate=framerate,
+            capture_backend=capture_backend,
+            codec=codec,
+            frame_bus=frame_bus
+        )
+        self.ring_dir = ring_dir
+        self.pre_roll_seconds = pre_roll_seconds
+        self.segment_seconds = segment_seconds
+
+        # Open captures: segments they have not taken yet are never pruned
+        self._captures: List["PreRollCapture"] = []
+        self._lock = Lock()
+        self._stop_event = Event()
+        self._pruner_thread: Optional[Thread] = None
+
+    def _build_ffmpeg_command(self) -> List[str]:
+        """
+        Build the FFmpeg command writing fixed-length segments into the ring directory.
+        A keyframe is forced at every segment boundary so each segment starts decodable.
+        """
+        # Passthrough (camera H.264) is cut at the camera's own keyframes
+        force_key_frames = [] if self.passthrough else [
+            "-force_key_frames", f"expr:gte(t,n_forced*{self.segment_seconds})"]
+        return self._build_capture_args() + force_key_frames + self._ring_output_args() + [
+            "-f", "segment",
+            "-segment_time", str(self.segment_seconds),
+            "-segment_format", "mpegts",
+            self.output_file
+        ] + self._build_extra_output_args()
+
+    def _ring_output_args(self) -> List[str]:
+        """Extra options for the ring output, before the muxer (none by default)."""
+        return []
+
+    def start_recording(self) -> bool:
+        """Start the always-on capture and the ring pruner."""
+        if not super().start_recording():
+            return False
+
+        self._stop_event.clear()
+        self._pruner_thread = Thread(target=self._prune_loop, daemon=True)
+        self._pruner_thread.start()
+        return True
+
+    def stop_recording(self, timeout: float = 8.0) -> bool:
+        """Stop the always-on capture. Segments open captures have not taken yet are kept."""
+        self._stop_event.set()
+        if self._pruner_thread:
+            self._pruner_thread.join(timeout=2.0)
+        return super().stop_recording(timeout)
+
+    def _finalize_output(self) -> None:
+        """Segments are already valid MPEG-TS, there is nothing to repair."""
+        pass
+
+    def list_segments(self) -> List[tuple[int, str, float]]:
+        """
+        List the segments currently in the ring as (index, path, mtime), oldest first.
+        The mtime of a segment is the moment its last frame was written.
+        """
+        segments: List[tuple[int, str, float]] = []
+        for path in glob.glob(os.path.join(self.ring_dir, "seg_*.ts")):
+            match = self._SEGMENT_RE.search(path)
+            if not match:
+                continue
+            try:
+                segments.append((int(match.group(1)), path, os.path.getmtime(path)))
+            except OSError:
+                continue
+        segments.sort()
+        return segments
+
+    def _prune_loop(self) -> None:
+        """Hand new segments to the open captures, then drop the ones nobody needs."""
+        while not self._stop_event.wait(self.segment_seconds):
+            self.collect()
+            self._prune()
+
+    def collect(self, include_current: bool = False) -> None:
+        """
+        Give every open capture the segments it has not taken yet. The newest
+        segment is still being written while FFmpeg runs: it is only included
+        with include_current=True (or once the process has exited).
+        """
+        segments = self.list_segments()
+        if self.is_recording_active() and not include_current:
+            segments = segments[:-1]
+        with self._lock:
+            for capture in self._captures:
+                capture._take(segments)
+
+    def _prune(self) -> None:
+        segments = self.list_segments()
+        if len(segments) <= 1:
+            return
+
+        cutoff = time.time() - self.pre_roll_seconds - self.segment_seconds
+        with self._lock:
+            oldest_needed = min(capture.next_index for capture in self._captures) if self._captures else None
+            # The newest segment is still being written: never touch it
+            for index, path, mtime in segments[:-1]:
+                if mtime >= cutoff:
+                    break
+                if oldest_needed is not None and index >= oldest_needed:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def trigger(
+        self,
+        output_file: str,
+        on_finished: Optional[Callable[["PreRollCapture"], None]] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ) -> "PreRollCapture":
+        """
+        Start a capture that includes the last `pre_roll_seconds` of footage.
+        Only bookkeeping happens here; segments are linked into the capture's
+        playlist as they close (see PreRollCapture). Any number of captures can
+        be open at once on the same ring. `extra` is added to the capture's
+        START/STOP events.
+        """
+        if not self.is_recording_active():
+            raise RuntimeError(f"Pre-roll capture is not running for {self.video_device}")
+
+        trigger_time = time.time()
+        window_start = trigger_time - self.pre_roll_seconds
+        segments = self.list_segments()
+        first_index = segments[-1][0] if segments else 0
+        for index, _, mtime in segments:
+            if mtime >= window_start:
+                first_index = index
+                break
+
+        capture = PreRollCapture(self, output_file, first_index, trigger_time, on_finished, extra)
+        with self._lock:
+            self._captures.append(capture)
+        return capture
+
+    def has_open_captures(self) -> bool:
+        """Check if any capture still needs segments from this ring."""
+        with self._lock:
+            return bool(self._captures)
+
+    def _forget(self, capture: "PreRollCapture") -> None:
+        with self._lock:
+            if capture in self._captures:
+                self._captures.remove(capture)
+
+
+class PreRollCapture:
+    """
+    A single triggered recording taken from a PreRollRecorder ring.
+
+    The recording is an HLS playlist (SegmentPlaylist): the ring's MPEG-TS
+    segments are hard-linked into `name.segments/` as they close and listed in
+    `name.m3u8`, so the footage is never rewritten. stop() only waits for the
+    segment being written to close (at most ~segment_seconds) and ends the
+    playlist: O(1) in the length of the recording.
+
+    Exposes the same stop()/is_recording() methods as VideoDeviceRecordingController
+    so callers can keep both in the same collection.
+    """
+
+    def __init__(
+        self,
+        ring: PreRollRecorder,
+        output_file: str,
+        first_index: int,
+        trigger_time: float,
+        on_finished: Optional[Callable[["PreRollCapture"], None]] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ):
+        self.ring = ring
+        # Always a playlist, whatever extension was asked for
+        self.output_file = os.path.splitext(output_file)[0] + SegmentPlaylist.EXTENSION
+        self.first_index = first_index
+        # Next ring segment to link into the playlist
+        self.next_index = first_index
+        self.trigger_time = trigger_time
+        self.last_error: Optional[Exception] = None
+        # Set by stop(timeout=...): monotonic deadline, and whether it had to cut the last segment short
+        self.deadline: Optional[float] = None
+        self.forced = False
+        self._on_finished = on_finished
+        self._extra = {"pre_roll_seconds": ring.pre_roll_seconds, **(extra or {})}
+        self._active = True
+        self._last_mtime: Optional[float] = None
+        # The next segment comes from a restarted capture (see _move_to()) or follows a lost one
+        self._discontinuity = False
+        # Ring segments that could not be linked nor copied into the playlist
+        self.lost_segments = 0
+
+        os.makedirs(os.path.dirname(self.output_file) or ".", exist_ok=True)
+        # Passthrough segments are cut at the camera's keyframes: allow a long GOP
+        target_duration = max(ring.segment_seconds, 10) if ring.passthrough else ring.segment_seconds
+        self.playlist = SegmentPlaylist(self.output_file, target_duration)
+        self.playlist.open()
+        self.ring.video_logger.log_event(
+            source=self.ring.video_device,
+            output_file=self.output_file,
+            codec=self.ring.codec,
+            resolution=self.ring.resolution,
+            event="START",
+            timestamp=datetime.datetime.fromtimestamp(trigger_time),
+            status="IN_PROGRESS",
+            extra=self._extra
+        )
+
+    def _take(self, segments: List[tuple[int, str, float]]) -> None:
+        """Link the segments from next_index on into the playlist. Caller holds the ring lock."""
+        for index, path, mtime in segments:
+            if index < self.next_index:
+                continue
+            # mtime is when the segment's last frame was written: the gap to the previous one is its length
+            duration = mtime - self._last_mtime if self._last_mtime is not None else self.ring.segment_seconds
+            self.next_index = index + 1
+            self._last_mtime = mtime
+            if self.playlist.add(path, max(0.001, duration), discontinuity=self._discontinuity):
+                self._discontinuity = False
+                continue
+            # Skipped, not retried (the ring could not be pruned past it): players must not
+            # join the next segment's timestamps to the previous one
+            self.lost_segments += 1
+            self._discontinuity = True
+            self.ring.video_logger.log_event(
+                source=self.ring.video_device,
+                output_file=self.output_file,
+                codec=self.ring.codec,
+                event="WARNING",
+                status="SEGMENT_LOST",
+                extra={"segment": path, "lost_segments": self.lost_segments}
+            )
+
+    def _move_to(self, ring: PreRollRecorder) -> None:
+        """
+        Continue on a new ring after the device capture was restarted (its
+        segments are numbered from 0 again). The old ring's segments must have
+        been taken already; the first new one is marked as a discontinuity.
+        Caller holds the new ring's lock.
+        """
+        self.ring = ring
+        self.next_index = 0
+        self._last_mtime = None
+        self._discontinuity = self.playlist.segments > 0
+
+    def is_recording(self) -> bool:
+        """Check if the capture is still collecting segments."""
+        return self._active and self.ring.is_recording_active()
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Live FFmpeg stats of the shared device capture feeding this output."""
+        stats = self.ring.get_progress()
+        stats["output_file"] = self.output_file
+        stats["recording"] = self.is_recording()
+        return stats
+
+    def remaining_time(self) -> Optional[float]:
+        """Seconds left before the stop() deadline (None if stop() has no timeout)."""
+        if self.deadline is None:
+            return None
+        return max(0.1, self.deadline - time.monotonic())
+
+    def _wait_segment_closed(self, index: int) -> bool:
+        """Wait (bounded by the deadline) until the ring moves past segment `index`."""
+        limit = time.monotonic() + 2 * self.ring.segment_seconds + 1
+        if self.deadline is not None:
+            limit = min(limit, self.deadline)
+        while time.monotonic() < limit:
+            segments = self.ring.list_segments()
+            if not self.ring.is_recording_active() or (segments and segments[-1][0] > index):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Close the capture: link the remaining segments and end the playlist.
+        No video data is copied or remuxed. With `timeout`, a segment still
+        being written when it runs out is linked as is (`forced` = True).
+        Returns True if the recording was closed cleanly.
+        """
+        if not self._active:
+            return False
+        self._active = False
+        if timeout is not None:
+            self.deadline = time.monotonic() + timeout
+
+        try:
+            segments = self.ring.list_segments()
+            if not segments and self.playlist.segments == 0:
+                raise RuntimeError("No segments available in the pre-roll ring")
+            # The segment being written right now holds the last frames before stop()
+            current = segments[-1][0] if segments else -1
+            closed = self._wait_segment_closed(current)
+            self.forced = not closed
+            with self.ring._lock:
+                self._take([segment for segment in self.ring.list_segments() if segment[0] <= current])
+            self.playlist.close()
+
+            status = "FORCED" if self.forced else "SUCCESS"
+            self.ring.video_logger.log_event(
+                source=self.ring.video_device,
+                output_file=self.output_file,
+                codec="copy" if self.ring.passthrough else self.ring.codec,
+                resolution=self.ring.resolution,
+                event="STOP",
+                timestamp=datetime.datetime.now(),
+                duration=self.playlist.duration,
+                status=status,
+                extra={**self._extra,
+                       "segments": self.playlist.segments,
+                       "lost_segments": self.lost_segments,
+                       "segment_dir": self.playlist.directory}
+            )
+            # What was linked (segment mtimes), not the wall clock since the trigger: the pre-roll
+            # is shorter right after the ring starts, and passthrough segments follow the camera's GOP
+            RecordingVerifier.shared().submit(
+                self.output_file,
+                source=self.ring.video_device,
+                expected_duration=self.playlist.duration,
+                duration_tolerance=self.playlist.target_duration + RecordingVerifier.DURATION_TOLERANCE
+            )
+            return not self.forced
+        except Exception as e:
+            self.last_error = e
+            self.playlist.close()
+            self.ring.video_logger.log_event(
+                source=self.ring.video_device,
+                output_file=self.output_file,
+                codec=self.ring.codec,
+                event="ERROR",
+                status="FAILED",
+                extra={"exception": str(e)}
+            )
+            return False
+        finally:
+            self.ring._forget(self)
+            if self._on_finished:
+                self._on_finished(self)
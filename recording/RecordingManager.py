@@ -0,0 +1,324 @@
+import asyncio
+import concurrent.futures
+import datetime
+import time
+from threading import Lock, Thread
+from typing import Any, Coroutine, Dict, List, Optional
+from utils.FFmpegProgress import FFmpegProgress
+from .ClipScheduler import ClipJob
+from .VideoDeviceRecorder import VideoDeviceRecorder
+from .VideoFileRecorder import VideoFileRecorder
+
+
+class _Session:
+    """FFmpeg process of one managed recorder plus the tasks reading its pipes."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.readers: List[asyncio.Task] = []
+        self.watcher: Optional[asyncio.Task] = None
+        self.stopping = False
+
+
+class _ProcessHandle:
+    """Popen-like view (poll(), pid) of a managed FFmpeg, set as the recorder's process."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self._process = process
+
+    @property
+    def pid(self) -> int:
+        return self._process.pid
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self._process.returncode
+
+    def poll(self) -> Optional[int]:
+        return self._process.returncode
+
+
+class RecordingManager:
+    """
+    Drives many recorders from a single asyncio event loop.
+
+    FFmpeg runs as an asyncio subprocess and its -progress / stderr pipes are
+    read by coroutines, so hundreds of recordings cost one thread (the loop)
+    instead of one or more threads each. The recorders only provide the
+    FFmpeg command, logging and post-processing; the manager owns the processes.
+    Recorders whose start_recording() does more than launch FFmpeg
+    (CAN_BE_MANAGED = False: pre-roll rings, motion and dual-rate recorders)
+    or that read raw frames from stdout are rejected.
+
+    Every public method is thread-safe: it schedules a coroutine on the loop
+    and waits for its result. ManagedRecordingController wraps a recorder in
+    the start()/stop()/is_recording() API of VideoDeviceRecordingController.
+    """
+
+    STOP_TIMEOUT: float = 8.0
+
+    _shared: Optional["RecordingManager"] = None
+    _shared_lock = Lock()
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, name="RecordingManager", daemon=True)
+        self._thread.start()
+        self._sessions: Dict[VideoDeviceRecorder, _Session] = {}
+
+    @classmethod
+    def shared(cls) -> "RecordingManager":
+        """Process-wide manager used by ManagedRecordingController by default."""
+        with cls._shared_lock:
+            if cls._shared is None or not cls._shared._thread.is_alive():
+                cls._shared = cls()
+            return cls._shared
+
+    def _submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _call(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        return self._submit(coro).result(timeout)
+
+    # ---------------- Recorders ----------------
+
+    def start(self, recorder: VideoDeviceRecorder) -> bool:
+        return self._call(self.start_async(recorder))
+
+    def stop(self, recorder: VideoDeviceRecorder, timeout: float = STOP_TIMEOUT) -> bool:
+        return self._call(self.stop_async(recorder, timeout))
+
+    def restart(self, recorder: VideoDeviceRecorder) -> Optional[VideoDeviceRecorder]:
+        return self._call(self.restart_async(recorder))
+
+    def stop_all(self, timeout: float = STOP_TIMEOUT) -> Dict[str, bool]:
+        """Stop every managed recorder at once; output_file -> stopped."""
+        return self._call(self.stop_all_async(timeout))
+
+    def is_recording(self, recorder: VideoDeviceRecorder) -> bool:
+        return self._call(self.is_recording_async(recorder))
+
+    def recorders(self) -> List[VideoDeviceRecorder]:
+        return self._call(self.recorders_async())
+
+    async def is_recording_async(self, recorder: VideoDeviceRecorder) -> bool:
+        # Sessions are only read and changed on the loop
+        session = self._sessions.get(recorder)
+        return session is not None and session.process.returncode is None
+
+    async def recorders_async(self) -> List[VideoDeviceRecorder]:
+        return list(self._sessions)
+
+    async def start_async(self, recorder: VideoDeviceRecorder) -> bool:
+        """Launch the recorder's FFmpeg command as an asyncio subprocess."""
+        if await self.is_recording_async(recorder):
+            recorder.video_logger.log_event(
+                source=recorder.video_device,
+                output_file=recorder.output_file,
+                codec=recorder.codec,
+                event="WARNING",
+                status="ALREADY_RECORDING",
+                extra={"message": "Recording already in progress"}
+            )
+            return False
+
+        try:
+            if not recorder.CAN_BE_MANAGED:
+                raise ValueError(f"{type(recorder).__name__} must be started with start_recording()")
+            if recorder._raw_output_filters():
+                # Frames are read with blocking readinto() on a Popen pipe
+                raise ValueError("Recorders with raw frames on stdout must be started with start_recording()")
+            cmd = recorder._build_ffmpeg_command()
+            if recorder.trigger_time is None:
+                recorder.trigger_time = time.time()
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except Exception as e:
+            recorder.video_logger.log_event(
+                source=recorder.video_device,
+                output_file=recorder.output_file,
+                codec=recorder.codec,
+                event="ERROR",
+                status="FAILED",
+                extra={"exception": str(e)}
+            )
+            return False
+
+        session = _Session(process)
+        # is_recording_active() / wait_first_frame_latency() poll it like a Popen
+        recorder.process = _ProcessHandle(process)
+        recorder.progress = FFmpegProgress(None)
+        recorder.is_recording = True
+        recorder._start_time = datetime.datetime.now()
+        session.readers = [
+            asyncio.create_task(self._read_progress(process.stdout, recorder.progress)),
+            asyncio.create_task(self._read_stderr(process.stderr, recorder.progress)),
+        ]
+        self._sessions[recorder] = session
+        session.watcher = asyncio.create_task(self._watch_exit(recorder, session))
+        recorder._log_recording_event("START")
+        return True
+
+    @staticmethod
+    async def _read_progress(stream: asyncio.StreamReader, progress: FFmpegProgress) -> None:
+        async for line in stream:
+            progress.feed_line(line.decode("utf-8", errors="ignore"))
+        progress.mark_exited()
+
+    @staticmethod
+    async def _read_stderr(stream: asyncio.StreamReader, progress: FFmpegProgress) -> None:
+        async for line in stream:
+            progress.feed_stderr_line(line.decode("utf-8", errors="ignore"))
+
+    async def _watch_exit(self, recorder: VideoDeviceRecorder, session: _Session) -> None:
+        """Log FFmpeg exits that nobody asked for (device unplugged, encoder crash...)."""
+        await session.process.wait()
+        if session.stopping:
+            return
+        await asyncio.gather(*session.readers, return_exceptions=True)
+        if self._sessions.get(recorder) is session:
+            del self._sessions[recorder]
+        recorder.is_recording = False
+        recorder.video_logger.log_event(
+            source=recorder.video_device,
+            output_file=recorder.output_file,
+            codec=recorder.codec,
+            event="ERROR",
+            timestamp=datetime.datetime.now(),
+            status="EXITED",
+            extra={"returncode": session.process.returncode,
+                   "ffmpeg_stderr": recorder.progress.stderr_tail()[-2000:]}
+        )
+
+    async def stop_async(self, recorder: VideoDeviceRecorder, timeout: float = STOP_TIMEOUT) -> bool:
+        """Ask FFmpeg to quit ('q'), escalate to terminate/kill after `timeout`, then finalize."""
+        session = self._sessions.pop(recorder, None)
+        if session is None:
+            recorder.video_logger.log_event(
+                source=recorder.video_device,
+                output_file=recorder.output_file,
+                codec=recorder.codec,
+                event="WARNING",
+                status="NOT_RECORDING",
+                extra={"message": "No recording in progress"}
+            )
+            return False
+
+        session.stopping = True
+        process = session.process
+        try:
+            if process.returncode is None:
+                process.stdin.write(b"q\n")
+                await process.stdin.drain()
+        except (ConnectionError, OSError):
+            pass
+
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), 5)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+
+        await asyncio.gather(*session.readers, return_exceptions=True)
+        recorder.is_recording = False
+        recorder.trigger_time = None
+        recorder._log_recording_event("STOP")
+        recorder.process = None
+        # Only queues the files for background verification
+        recorder._finalize_output()
+        return True
+
+    async def restart_async(self, recorder: VideoDeviceRecorder) -> Optional[VideoDeviceRecorder]:
+        """
+        Stop the recorder (if running) and continue into its next part (see continuation()),
+        so the previous file is never overwritten. Returns the new recorder, or None.
+        """
+        if recorder in self._sessions:
+            await self.stop_async(recorder)
+        next_recorder = recorder.continuation()
+        return next_recorder if await self.start_async(next_recorder) else None
+
+    async def stop_all_async(self, timeout: float = STOP_TIMEOUT) -> Dict[str, bool]:
+        recorders = list(self._sessions)
+        results = await asyncio.gather(*(self.stop_async(r, timeout) for r in recorders),
+                                       return_exceptions=True)
+        return {r.output_file: result is True for r, result in zip(recorders, results)}
+
+    # ---------------- Clips ----------------
+
+    def create_clip(self, file_recorder: VideoFileRecorder, start_time: float,
+                    end_time: float, **options: Any) -> ClipJob:
+        """
+        Cut a clip on the recorder's ClipScheduler (ClipScheduler.shared() by default),
+        so clips queued here share the per-encoder limits with every other clip.
+        `options` are those of VideoFileRecorder.submit_clip (mode, priority, ...).
+        Returns the ClipJob; job.output_file is the clip being written.
+        """
+        return file_recorder.submit_clip(start_time, end_time, **options)
+
+    def close(self, timeout: float = STOP_TIMEOUT) -> None:
+        """Stop every recorder and the event loop."""
+        if not self._thread.is_alive():
+            return
+        self.stop_all(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+class ManagedRecordingController:
+    """
+    Drop-in replacement for VideoDeviceRecordingController (without adaptive
+    quality) backed by a RecordingManager: no thread per recorder.
+    """
+
+    def __init__(self, recorder: VideoDeviceRecorder, manager: Optional[RecordingManager] = None):
+        self.recorder = recorder
+        self.manager = manager or RecordingManager.shared()
+        self.last_error: Optional[Exception] = None
+
+    def start(self):
+        """Start recording (returns once FFmpeg has been launched)."""
+        if self.manager.is_recording(self.recorder):
+            print("[RecordingController] Recording already in progress")
+            return
+        self.last_error = None
+        try:
+            self.manager.start(self.recorder)
+        except Exception as e:
+            self.last_error = e
+            print(f"[RecordingController] Recording error: {e}")
+
+    def stop(self):
+        """Stop recording and wait for FFmpeg to finish the file."""
+        try:
+            if self.recorder in self.manager.recorders():
+                self.manager.stop(self.recorder)
+        except Exception as e:
+            self.last_error = e
+            print(f"[RecordingController] Recording error: {e}")
+
+    def restart(self) -> bool:
+        """Stop and continue recording into the next part."""
+        next_recorder = self.manager.restart(self.recorder)
+        if next_recorder is None:
+            return False
+        self.recorder = next_recorder
+        return True
+
+    def is_recording(self) -> bool:
+        """Check if recording is active."""
+        return self.manager.is_recording(self.recorder)
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Live FFmpeg stats of the controlled recorder (see VideoDeviceRecorder.get_progress)."""
+        stats = self.recorder.get_progress()
+        stats["recording"] = self.is_recording()
+        return stats
@@ -2,10 +2,21 @@ import subprocess
 import datetime
 import os
 import re
-from typing import Final, List, Optional
+import glob
+import time
+from threading import Thread
+from typing import Any, Dict, Final, List, Optional
 from utils.VideoDeviceDetection import VideoDeviceDetection
 from utils.DetectGPU import DetectGPU
 from utils.VideoLogger import VideoLogger
+from utils.FFmpegProgress import FFmpegProgress
+from utils.CaptureBackend import CaptureBackend
+from utils.EncoderProfiles import EncoderProfiles
+from utils.EncoderBenchmark import EncoderBenchmark
+from utils.FrameBus import FrameBusPublisher
+from utils.RecordingVerifier import RecordingVerifier
+from .ClipScheduler import ClipJob, ClipScheduler
+from .VideoFileRecorder import VideoFileRecorder
 
 
 class VideoDeviceRecorder:
@@ -15,22 +26,67 @@ class VideoDeviceRecorder:
     Use RecordingController to run multiple instances concurrently.
     """
 
-    CODECS: Final[dict[str, str]] = {
-     "nvidia": "h264_nvenc",  # NVIDIA H.264
-     "amd": "h264_amf",       # AMD H.264
-     "cpu": "libx264"         # CPU H.264 (más estable)
-}
+    # Encoder settings profile used for camera recording (see EncoderProfiles)
+    USE_CASE: Final[str] = "live"
 
+    # vendor -> codec: h264_nvenc / h264_amf / h264_qsv / h264_vaapi / libx264
+    CODECS: Final[dict[str, str]] = EncoderProfiles.vendor_codecs(USE_CASE)
+
+    # Output modes:
+    #   "fragmented" -> single fragmented MP4, playable while/after writing, no post-stop pass (default)
+    #   "mp4"        -> single MP4 with +faststart: the moov is rewritten at stop, O(length) (legacy)
+    #   "segmented"  -> fixed-length fragmented MP4 segments (name_00000.mp4, name_00001.mp4, ...)
+    OUTPUT_MODES: Final[tuple[str, ...]] = ("mp4", "fragmented", "segmented")
+    FRAGMENTED_MOVFLAGS: Final[str] = "+frag_keyframe+empty_moov+default_base_moof"
+
+    # Whether continuation() can build the next part (VideoDeviceRecordingController supervision)
+    CAN_CONTINUE: bool = True
+    # Whether RecordingManager can run it: the manager only launches the FFmpeg command, so
+    # recorders whose start_recording()/stop_recording() do more (ring pruning, events) cannot
+    CAN_BE_MANAGED: bool = True
+
+    # Past the stop timeout FFmpeg gets terminate() and 5 more seconds: callers
+    # waiting on a stop add this once to their deadline
+    STOP_GRACE_SECONDS: Final[float] = 6.0
 
     def __init__(
         self,
         video_device: str,
         output_file: Optional[str] = None,
         resolution: str = "1280x720",
-        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+        output_mode: str = "fragmented",
+        segment_seconds: int = 60,
+        framerate: int = 30,
+        capture_backend: Optional[CaptureBackend] = None,
+        codec: Optional[str] = None,
+        fast_preset: bool = False,
+        extra_outputs: Optional[List[Dict[str, Any]]] = None,
+        frame_bus: Optional[FrameBusPublisher] = None,
+        input_format: Optional[str] = "auto"
     ):
+        """
+        extra_outputs: additional encodes of the same capture (e.g. a low-res preview),
+        each a dict with "output_file" and optional "resolution", "framerate", "codec",
+        "use_case", "fast_preset" and "segment_seconds". The device is opened and decoded
+        once; a split filter graph feeds every encoder. Extra outputs are always fragmented
+        MP4; with "segment_seconds" the output rolls into dated files
+        (`name_2025-09-14_17-25-19.mp4`, see extra_output_files()).
+
+        frame_bus: publish downscaled raw frames of the same decode to shared memory
+        for analytics processes (see FrameBus). The caller owns and closes it.
+
+        input_format: format requested from the device. "auto" picks the cheapest one
+        the device supports at this resolution/fps (VideoDeviceDetection.select_input_format):
+        native H.264 is stream-copied to the main output (no decode, no encode), MJPEG is
+        decoded instead of raw. None keeps the device default; "h264"/"mjpeg"/... force one.
+        """
         if not video_device:
             raise ValueError("Video device is required for recording")
+        if output_mode not in self.OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode: {output_mode}")
+        if segment_seconds <= 0:
+            raise ValueError("segment_seconds must be positive")
 
         safe_device_name = re.sub(r'[^a-zA-Z0-9_-]', '_', video_device.strip().lower())
 
@@ -42,88 +98,215 @@ class VideoDeviceRecorder:
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             output_file = f"videos/cameras/{safe_device_name}_{timestamp}.mp4"
 
+        # Output as requested, before the segment pattern is applied (see continuation())
+        self.base_output_file = output_file
+        if output_mode == "segmented":
+            root, ext = os.path.splitext(output_file)
+            output_file = f"{root}_%05d{ext or '.mp4'}"
 
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         self.video_device = video_device
         self.output_file = output_file
         self.resolution = resolution
         self.ffmpeg_path = ffmpeg_path
+        self.output_mode = output_mode
+        self.segment_seconds = segment_seconds
+        self.framerate = framerate
+        self.fast_preset = fast_preset
+        # dshow on Windows, v4l2 elsewhere, unless a backend (rtsp, file, lavfi...) is given
+        self.capture_backend = capture_backend or VideoDeviceDetection.get_backend()
 
         # State
         self.is_recording: bool = False
         self.process: Optional[subprocess.Popen] = None
+        self.progress: Optional[FFmpegProgress] = None
+        # Trigger bookkeeping for trigger-to-first-frame latency (time.time() based)
+        self.trigger_time: Optional[float] = None
+        self._frames_at_trigger: int = 0
         self._start_time: Optional[datetime.datetime] = None
-
-        # Detect GPU and pick codec
-        gpu_vendor = DetectGPU.detect_gpu_vendor()
-        self.codec = self.CODECS.get(gpu_vendor, "libx264")
+        # Wall-clock duration written to the STOP event (device opening included)
+        self.logged_duration: Optional[float] = None
+
+        # Pick codec: forced > calibrated (EncoderBenchmark cache) > detected GPU
+        if codec is None:
+            codec = EncoderBenchmark.cached_codec(self.USE_CASE)
+        if codec is None:
+            gpu_vendor = DetectGPU.detect_gpu_vendor()
+            codec = self.CODECS.get(gpu_vendor, "libx264")
+        EncoderProfiles.get(codec, self.USE_CASE)  # Fail early on codecs without a profile
+        self.codec = codec
+
+        self.extra_outputs: List[Dict[str, Any]] = [
+            self._normalize_extra_output(spec) for spec in extra_outputs or []
+        ]
+        self.frame_bus = frame_bus
+        # Reads the raw frames on stdout (frame bus, or a subclass's own analysis)
+        self._raw_thread: Optional[Thread] = None
+
+        self.requested_input_format = input_format
+        if input_format == "auto":
+            input_format = VideoDeviceDetection.select_input_format(
+                video_device, resolution, framerate, self.capture_backend)
+        self.input_format = input_format
+        # Native H.264: the main output is a stream copy (extra outputs/frame bus still decode)
+        self.passthrough = input_format == "h264"
 
         # Logger
         self.video_logger = VideoLogger()
 
+    def _normalize_extra_output(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill the defaults of one extra output and validate its encoder profile."""
+        if not spec.get("output_file"):
+            raise ValueError("Each extra output needs an output_file")
+        output = {
+            "output_file": spec["output_file"],
+            "resolution": spec.get("resolution") or self.resolution,
+            "framerate": spec.get("framerate") or self.framerate,
+            "codec": spec.get("codec") or self.codec,
+            "use_case": spec.get("use_case", self.USE_CASE),
+            "fast_preset": spec.get("fast_preset", False),
+            "segment_seconds": spec.get("segment_seconds"),
+        }
+        EncoderProfiles.get(output["codec"], output["use_case"])
+        os.makedirs(os.path.dirname(output["output_file"]) or ".", exist_ok=True)
+        return output
+
     def _build_ffmpeg_command(self) -> List[str]:
         """
         Build the FFmpeg command for this recorder.
         """
-        base_cmd = [
+        output_params: List[str] = []
+        if self.output_mode == "fragmented":
+            # Flush a fragment at least every second: a crash loses at most ~1 s
+            output_params = [
+                "-movflags", self.FRAGMENTED_MOVFLAGS,
+                "-frag_duration", "1000000"
+            ]
+        elif self.output_mode == "segmented":
+            # With passthrough, segments are cut at the camera's own keyframes
+            output_params = [] if self.passthrough else [
+                "-force_key_frames", f"expr:gte(t,n_forced*{self.segment_seconds})"]
+            output_params += [
+                "-f", "segment",
+                "-segment_time", str(self.segment_seconds),
+                "-segment_format", "mp4",
+                "-segment_format_options", f"movflags={self.FRAGMENTED_MOVFLAGS}",
+                "-reset_timestamps", "1"
+            ]
+        else:
+            output_params = ["-movflags", "+faststart"]
+        return (self._build_capture_args() + output_params + [self.output_file]
+                + self._build_extra_output_args())
+
+    def _build_capture_args(self) -> List[str]:
+        """
+        Build the capture + encode part of the FFmpeg command (everything except the output).
+        Subclasses reuse it to write to a different kind of output.
+        Encoder settings come from EncoderProfiles (use case "live").
+        """
+        global_args = [] if self.passthrough else EncoderProfiles.global_args(self.codec, self.USE_CASE)
+        for output in self.extra_outputs:
+            extra_global = EncoderProfiles.global_args(output["codec"], output["use_case"])
+            if extra_global and extra_global[0] not in global_args:
+                global_args = global_args + extra_global
+
+        if self.passthrough:
+            # Camera H.264 as is; only extra outputs / frame bus go through the (decoded) graph
+            graph = (["-filter_complex", self._build_filter_graph()]
+                     if self.extra_outputs or self._raw_output_filters() else [])
+            video_args = graph + ["-map", "0:v"]
+            encoder_args = ["-c:v", "copy"]
+        elif self.extra_outputs or self._raw_output_filters():
+            # One decode, split into every encoder: the main output reads [v0]
+            video_args = ["-filter_complex", self._build_filter_graph(), "-map", "[v0]"]
+        else:
+            video_args = ["-vf", ",".join(self._main_output_filters())]
+        if not self.passthrough:
+            encoder_args = EncoderProfiles.encoder_args(self.codec, self.USE_CASE, self.framerate, self.fast_preset)
+
+        return [
             self.ffmpeg_path,
-            "-f", "dshow",
-            "-video_size", self.resolution,
-            "-framerate", "30",
-            "-i", f"video={self.video_device}",
-            "-c:v", self.codec,
-            "-s", self.resolution,
+            # Live stats, read by FFmpegProgress (on stderr when stdout carries raw frames)
+            "-progress", "pipe:2" if self._raw_output_filters() else "pipe:1",
+            "-nostats",
+            "-stats_period", "0.1",
+            *global_args,
+            *self.capture_backend.input_args(self.video_device, self.resolution, self.framerate,
+                                             self.input_format),
+            *video_args,
+            *encoder_args,
             "-an",  # Disable audio
             "-y"    # Overwrite
         ]
 
-        common_params = [
-            "-tune", "zerolatency",
-            "-movflags", "+faststart",
-            "-pix_fmt", "yuv420p"
-        ]
-
-        input_optimizations = [            # cambie los imput 
-           "-fflags", "+genpts",
-           "-rtbufsize", "200M",
-           "-use_wallclock_as_timestamps", "1",
-           "-thread_queue_size", "512"
-]
-
-
-        # GPU-specific parameters
-        gpu_params: List[str] = []
-        if self.codec == "hevc_nvenc":
-            gpu_params = [
-                "-preset", "p5",
-                "-tune", "ll",
-                "-rc", "constqp",
-                "-qp", "23",
-                "-gpu", "0",
-                "-delay", "0",
-                "-no-scenecut", "1"
-            ]
-        elif self.codec == "hevc_amf":
-            gpu_params = [
-                "-usage", "ultralowlatency",
-                "-quality", "speed",
-                "-preanalysis", "0",
-                "-vbaq", "0",
-                "-enforce_hrd", "0",
-                "-filler_data", "0"
-            ]
-        elif self.codec == "libx265":
-            gpu_params = [
-                "-preset", "veryfast",
-                "-tune", "zerolatency",
-                "-x265-params", "no-scenecut=1:keyint=30:min-keyint=30"
+    def _build_filter_graph(self) -> str:
+        """
+        Split filter graph for the main output ([v0], unless it is a passthrough copy)
+        plus every extra output ([v1], ...) and the raw frames on stdout ([bus]).
+        Each branch gets its own fps, scale and pixel format.
+        """
+        branches: List[tuple[str, List[str]]] = []
+        if not self.passthrough:
+            branches.append(("v0", self._main_output_filters()))
+        for i, output in enumerate(self.extra_outputs, start=1):
+            filters = EncoderProfiles.output_filters(output["codec"], output["use_case"], output["resolution"])
+            if output["framerate"] != self.framerate:
+                filters.insert(0, f"fps={output['framerate']}")
+            branches.append((f"v{i}", filters))
+        if self._raw_output_filters():
+            branches.append(("bus", [self._raw_output_filters()]))
+
+        graph = ["[0:v]split=" + str(len(branches)) + "".join(f"[s{i}]" for i in range(len(branches)))]
+        for i, (label, filters) in enumerate(branches):
+            graph.append(f"[s{i}]{','.join(filters)}[{label}]")
+        return ";".join(graph)
+
+    def _main_output_filters(self) -> List[str]:
+        """Filter chain in front of the main output's encoder (not used with passthrough)."""
+        return EncoderProfiles.output_filters(self.codec, self.USE_CASE, self.resolution)
+
+    def _build_extra_output_args(self) -> List[str]:
+        """
+        Encoder and muxer options for every extra output, appended after the main output.
+        The raw frames branch (frame bus) goes last, on stdout.
+        """
+        args: List[str] = []
+        for i, output in enumerate(self.extra_outputs, start=1):
+            args += [
+                "-map", f"[v{i}]",
+                *EncoderProfiles.encoder_args(output["codec"], output["use_case"],
+                                              output["framerate"], output["fast_preset"]),
+                "-an"
             ]
-
-        # Final command
-        if self.codec == "hevc_amf":
-            return base_cmd + input_optimizations + gpu_params + [self.output_file]
-        else:
-            return base_cmd + input_optimizations + common_params + gpu_params + [self.output_file]
+            if output["segment_seconds"]:
+                root, ext = os.path.splitext(output["output_file"])
+                args += [
+                    "-f", "segment",
+                    "-segment_time", str(output["segment_seconds"]),
+                    "-segment_format", "mp4",
+                    "-segment_format_options", f"movflags={self.FRAGMENTED_MOVFLAGS}:frag_duration=1000000",
+                    "-reset_timestamps", "1",
+                    # Each file is named after the time it starts
+                    "-strftime", "1",
+                    "-y", f"{root}_%Y-%m-%d_%H-%M-%S{ext or '.mp4'}"
+                ]
+            else:
+                args += [
+                    "-movflags", self.FRAGMENTED_MOVFLAGS,
+                    "-frag_duration", "1000000",
+                    "-y", output["output_file"]
+                ]
+        if self._raw_output_filters():
+            args += ["-map", "[bus]", "-f", "rawvideo", "pipe:1"]
+        return args
+
+    def _raw_output_filters(self) -> Optional[str]:
+        """
+        Filter chain of the raw frames FFmpeg writes to stdout (the frame bus), or None.
+        Subclasses that analyze frames themselves return their own chain and
+        override _read_raw_output().
+        """
+        return self.frame_bus.filter_chain() if self.frame_bus else None
 
     def start_recording(self) -> bool:
         """
@@ -143,6 +326,11 @@ class VideoDeviceRecorder:
 
         try:
             cmd = self._build_ffmpeg_command()
+            # The trigger may have happened earlier (e.g. set by WarmRecorderPool.acquire)
+            if self.trigger_time is None:
+                self.trigger_time = time.time()
+            if self.frame_bus:
+                self.frame_bus.open()
             self.process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
@@ -150,6 +338,14 @@ class VideoDeviceRecorder:
                 stdin=subprocess.PIPE,
                 text=True
             )
+            # Keep stdout/stderr drained so a long recording never blocks on a full pipe
+            if self._raw_output_filters():
+                self.progress = FFmpegProgress(self.process.stderr)
+                self._raw_thread = Thread(target=self._read_raw_output, args=(self.process,), daemon=True)
+                self._raw_thread.start()
+            else:
+                self.progress = FFmpegProgress(self.process.stdout, self.process.stderr)
+            self.progress.start()
             self.is_recording = True
             self._start_time = datetime.datetime.now()
             self._log_recording_event("START")
@@ -166,10 +362,11 @@ class VideoDeviceRecorder:
 
             return False
 
-    def stop_recording(self) -> bool:
+    def stop_recording(self, timeout: float = 8.0) -> bool:
         
       """
     Detiene la grabación de forma segura asegurando que el archivo MP4 quede reproducible.
+    timeout: segundos de espera a FFmpeg antes de forzar el cierre.
     """
       if not self.is_recording or not self.process:
         self.video_logger.log_event(
@@ -191,8 +388,8 @@ class VideoDeviceRecorder:
             except Exception:
                 pass
 
-        # Esperar que FFmpeg cierre correctamente
-        self.process.communicate(timeout=8)
+        # Esperar que FFmpeg cierre correctamente (los pipes los vacía FFmpegProgress)
+        self.process.wait(timeout=timeout)
 
       except subprocess.TimeoutExpired:
         # Si no responde, forzar cierre
@@ -211,46 +408,239 @@ class VideoDeviceRecorder:
       finally:
         # Liberar proceso y marcar finalización
         self.is_recording = False
+        self.trigger_time = None
+        if self.progress:
+            self.progress.join()
+        if self._raw_thread:
+            self._raw_thread.join(timeout=2.0)
         self._log_recording_event("STOP")
         self.process = None
 
-    # 🔧 Reparar encabezado MP4 si quedó corrupto
-      try:
-        repaired_file = self.output_file.replace(".mp4", "_fixed.mp4")
-        repair_cmd = [
-            self.ffmpeg_path, "-i", self.output_file,
-            "-c", "copy", "-movflags", "+faststart", repaired_file, "-y"
-        ]
-        subprocess.run(repair_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        os.replace(repaired_file, self.output_file)
-      except Exception:
-        pass
-
+      self._finalize_output()
       return True
 
+    def _read_raw_output(self, process: subprocess.Popen) -> None:
+        """Copy raw frames from FFmpeg's stdout straight into the frame bus ring."""
+        stream = process.stdout.buffer  # Binary side of the text-mode pipe
+        try:
+            while self.frame_bus.publish_from(stream):
+                pass
+        except (ValueError, OSError, TypeError):
+            # Pipe or shared memory closed under us
+            pass
+
+    def _finalize_output(self) -> None:
+        """
+        Queue the finished files for background verification (RecordingVerifier):
+        only files that fail the checks are remuxed, healthy ones are never rewritten.
+        Subclasses that do not produce recordings of their own override this.
+        """
+        verifier = RecordingVerifier.shared()
+        if self.output_mode == "segmented":
+            # Segments: container check only, durations are per segment
+            for path in self.list_output_files():
+                verifier.submit(path, source=self.video_device)
+            return
+
+        # FFmpeg's own output time: the wall clock since start also counts opening the device
+        stats = self.progress.snapshot() if self.progress else None
+        encoded_duration = (stats["out_time_seconds"] or None) if stats else None
+        if os.path.exists(self.output_file):
+            verifier.submit(
+                self.output_file,
+                source=self.video_device,
+                expected_duration=encoded_duration,
+                expected_frames=None if self.passthrough or not stats else stats["frame"]
+            )
+        for output in self.extra_outputs:
+            if output["segment_seconds"]:
+                for path in self.extra_output_files(output):
+                    verifier.submit(path, source=self.video_device)
+            elif os.path.exists(output["output_file"]):
+                verifier.submit(output["output_file"], source=self.video_device,
+                                expected_duration=encoded_duration)
+
+
+    def continuation(
+        self,
+        resolution: Optional[str] = None,
+        framerate: Optional[int] = None,
+        fast_preset: Optional[bool] = None
+    ) -> "VideoDeviceRecorder":
+        """
+        Create (not start) a recorder of the same class for the same device that
+        writes the next part of this recording (`name_part02.mp4`, ...), optionally
+        with other settings. Subclasses with other constructor arguments extend
+        _continuation_args(); CAN_CONTINUE = False marks those that cannot continue.
+        """
+        if not self.CAN_CONTINUE:
+            raise NotImplementedError(f"{type(self).__name__} cannot continue into a new part")
+        return type(self)(**self._continuation_args(resolution, framerate, fast_preset))
+
+    def _continuation_args(
+        self,
+        resolution: Optional[str],
+        framerate: Optional[int],
+        fast_preset: Optional[bool]
+    ) -> Dict[str, Any]:
+        """Constructor arguments of the next part (see continuation())."""
+        return {
+            "video_device": self.video_device,
+            "output_file": self._next_part_name(self.base_output_file),
+            "resolution": resolution or self.resolution,
+            "ffmpeg_path": self.ffmpeg_path,
+            "output_mode": self.output_mode,
+            "segment_seconds": self.segment_seconds,
+            "framerate": framerate or self.framerate,
+            "capture_backend": self.capture_backend,
+            "codec": self.codec,
+            "fast_preset": self.fast_preset if fast_preset is None else fast_preset,
+            "frame_bus": self.frame_bus,
+            "input_format": self.requested_input_format if resolution or framerate else self.input_format,
+            "extra_outputs": [
+                {**output, "output_file": self._next_part_name(output["output_file"])}
+                for output in self.extra_outputs
+            ]
+        }
+
+    @staticmethod
+    def _next_part_name(path: str) -> str:
+        """`name.mp4` -> `name_part02.mp4`, `name_part02.mp4` -> `name_part03.mp4`."""
+        root, ext = os.path.splitext(path)
+        match = re.search(r"_part(\d+)$", root)
+        part = int(match.group(1)) + 1 if match else 2
+        if match:
+            root = root[:match.start()]
+        return f"{root}_part{part:02d}{ext}"
+
+    def list_output_files(self) -> List[str]:
+        """
+        List the files written by this recorder (one file, or every segment in "segmented" mode),
+        followed by the extra outputs.
+        """
+        if self.output_mode == "segmented":
+            files = sorted(glob.glob(re.sub(r"%0\d+d", "*", self.output_file)))
+        else:
+            files = [self.output_file] if os.path.exists(self.output_file) else []
+        for output in self.extra_outputs:
+            files += self.extra_output_files(output)
+        return files
+
+    @staticmethod
+    def extra_output_files(output: Dict[str, Any]) -> List[str]:
+        """Files written so far for one extra output: the file, or its dated segments (oldest first)."""
+        if not output["segment_seconds"]:
+            return [output["output_file"]] if os.path.exists(output["output_file"]) else []
+        root, ext = os.path.splitext(output["output_file"])
+        return sorted(glob.glob(f"{glob.escape(root)}_????-??-??_??-??-??{ext or '.mp4'}"))
+
+    def create_thumbnails(self, interval: float = 10.0, width: int = 320, columns: int = 5,
+                          priority: int = ClipScheduler.PRIORITY_BULK) -> List[ClipJob]:
+        """
+        Thumbnails and contact sheet of every finished output file (see VideoFileRecorder.thumbnails_for).
+        While recording, the file (or segment) still being written is skipped.
+        """
+        files = self.list_output_files()
+        if self.is_recording_active():
+            active = {output["output_file"] for output in self.extra_outputs}
+            segments = [path for path in files if path not in active]
+            active |= set(segments[-1:]) if self.output_mode == "segmented" else {self.output_file}
+            files = [path for path in files if path not in active]
+        return [VideoFileRecorder.thumbnails_for(path, interval, width, columns, priority, self.ffmpeg_path)
+                for path in files]
+
+    def get_progress(self) -> Dict[str, Any]:
+        """
+        Live FFmpeg stats for this recorder: fps, bitrate_kbps, speed, dup/drop frames,
+        total_size (bytes) and out_time_seconds. speed < 1.0 means the encoder is
+        falling behind realtime.
+        """
+        stats = self.progress.snapshot() if self.progress else FFmpegProgress.empty_snapshot()
+        stats["video_device"] = self.video_device
+        stats["output_file"] = self.output_file
+        stats["recording"] = self.is_recording_active()
+        stats["elapsed_seconds"] = (
+            (datetime.datetime.now() - self._start_time).total_seconds()
+            if self._start_time else 0.0
+        )
+        return stats
+
+    def output_wall_time(self, output_seconds: float = 0.0) -> Optional[float]:
+        """
+        Wall-clock time at which the frame at `output_seconds` of the output was
+        captured (None before the first frame is written). The capture runs in
+        realtime, so the latest progress report (written at `updated_at` for
+        output time `out_time_seconds`) dates every other output timestamp.
+        """
+        stats = self.progress.snapshot() if self.progress else None
+        if not stats or stats["updated_at"] is None or not stats["frame"]:
+            return None
+        return stats["updated_at"] - (stats["out_time_seconds"] - output_seconds)
+
+    def first_frame_time(self) -> Optional[float]:
+        """Wall-clock time of the first frame of this recording's output."""
+        return self.output_wall_time(0.0)
+
+    def wait_first_frame_latency(self, timeout: float = 10.0) -> Optional[float]:
+        """
+        Block until FFmpeg reports a frame written after `trigger_time` and return
+        the trigger-to-first-frame latency in seconds (None on timeout), dated from
+        the output timestamps (first_frame_time), not from when the report arrived.
+        """
+        if self.trigger_time is None:
+            return None
+        trigger_time = self.trigger_time
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            stats = self.progress.snapshot() if self.progress else None
+            if (stats and stats["updated_at"] is not None
+                    and stats["updated_at"] >= trigger_time
+                    and stats["frame"] > self._frames_at_trigger):
+                first_frame = self.first_frame_time()
+                if first_frame is not None:
+                    return max(0.0, first_frame - trigger_time)
+            if self.process is not None and self.process.poll() is not None:
+                return None
+            time.sleep(0.01)
+        return None
 
     def is_recording_active(self) -> bool:
         """
-        Check if recording is currently active.
+        Check if recording is currently active (False as soon as FFmpeg has exited,
+        even if stop_recording() was not called yet).
         """
-        return self.is_recording and self.process is not None
+        return self.is_recording and self.process is not None and self.process.poll() is None
 
     def _log_recording_event(self, event_type: str):
         """
         Logs START or STOP events with structured information.
         """
         duration = None
+        extra = None
         status = "IN_PROGRESS" if event_type == "START" else "SUCCESS"
         if event_type == "STOP" and self._start_time:
             duration = (datetime.datetime.now() - self._start_time).total_seconds()
+            self.logged_duration = duration
+        if event_type == "STOP" and self.progress:
+            extra = {"progress": self.progress.snapshot()}
+        if event_type == "START" and self.input_format:
+            extra = {"input_format": self.input_format, "passthrough": self.passthrough}
+        if self.extra_outputs:
+            extra = extra or {}
+            extra["extra_outputs"] = [
+                {key: output[key] for key in ("output_file", "resolution", "framerate", "codec")}
+                for output in self.extra_outputs
+            ]
 
         self.video_logger.log_event(
             source=self.video_device,
             output_file=self.output_file,
-            codec=self.codec,
+            codec="copy" if self.passthrough else self.codec,
             resolution=self.resolution,
             event=event_type,
             timestamp=datetime.datetime.now(),
             duration=duration,
-            status=status
+            status=status,
+            extra=extra
         )
@@ -1,5 +1,7 @@
+import datetime
+import time
 from threading import Event, Thread
-from typing import Optional
+from typing import Any, Dict, Final, List, Optional
 from .VideoDeviceRecorder import VideoDeviceRecorder
 
 
@@ -7,25 +9,313 @@ class VideoDeviceRecordingController:
     """
     Controls the lifecycle of a single VideoDeviceRecorder in a separate thread.
     Allows starting and stopping recording safely, without blocking the main thread.
+
+    With adaptive=True the thread watches encoder speed and dropped frames. When
+    the recorder falls behind realtime it rolls to a new part with cheaper settings
+    (QUALITY_LADDER), and probes back up after `recover_after` seconds at realtime.
+    A failed probe doubles the wait before the next one.
+
+    With watchdog=True (default) the thread also supervises FFmpeg: if the
+    process exits or its output stops growing for `stall_timeout` seconds, the
+    recording continues into a new part and the outage window is logged
+    (event OUTAGE). Restarts that fail right away back off up to MAX_RESTART_DELAY,
+    and a part that cannot even start is retried with the same backoff until it
+    starts or stop() is called.
     """
 
-    def __init__(self, recorder: VideoDeviceRecorder):
+    # Each level is relative to the first recorder: resolution scale, fps divisor, fastest preset
+    QUALITY_LADDER: Final[List[Dict[str, Any]]] = [
+        {"scale": 1.0, "fps_divisor": 1, "fast_preset": False},
+        {"scale": 1.0, "fps_divisor": 1, "fast_preset": True},
+        {"scale": 0.75, "fps_divisor": 1, "fast_preset": True},
+        {"scale": 0.5, "fps_divisor": 2, "fast_preset": True},
+    ]
+
+    MAX_RESTART_DELAY: Final[float] = 30.0
+
+    def __init__(
+        self,
+        recorder: VideoDeviceRecorder,
+        adaptive: bool = False,
+        check_interval: float = 2.0,
+        lag_threshold: float = 0.95,
+        lag_checks: int = 3,
+        recover_after: float = 60.0,
+        watchdog: bool = True,
+        watchdog_interval: float = 1.0,
+        stall_timeout: float = 10.0
+    ):
         self.recorder = recorder
         self.stop_event = Event()
+        self.stop_timeout: Optional[float] = None
         self.recording_thread: Optional[Thread] = None
         self.last_error: Optional[Exception] = None
 
+        # Both restart into a new part: recorders without one run unsupervised
+        if not recorder.CAN_CONTINUE and (adaptive or watchdog):
+            print(f"[RecordingController] {type(recorder).__name__} cannot continue into a new part: "
+                  f"adaptive quality and watchdog disabled")
+            adaptive = watchdog = False
+
+        # Adaptive quality
+        self.adaptive = adaptive
+        self.check_interval = check_interval
+        self.lag_threshold = lag_threshold
+        self.lag_checks = lag_checks
+        self.recover_after = recover_after
+        self.quality_level = 0
+        self.parts: List[str] = [recorder.output_file]
+        self._base_resolution = recorder.resolution
+        self._base_framerate = recorder.framerate
+
+        # Watchdog
+        self.watchdog = watchdog
+        self.watchdog_interval = watchdog_interval
+        self.stall_timeout = stall_timeout
+        self.restarts = 0
+        self._last_output: tuple = (0, 0)
+        self._last_growth = time.monotonic()
+        self._restart_delay = 0.0
+        # Outage still open while the next part fails to start: (reason, start, previous part)
+        self._pending_outage: Optional[tuple] = None
+
     def _run(self):
         """Internal method executed inside the recording thread."""
         try:
-            if self.recorder.start_recording():
+            # A recorder handed over by WarmRecorderPool is already running
+            if self.recorder.is_recording_active() or self.recorder.start_recording():
                 # Wait until stop() is called
-                self.stop_event.wait()
-                self.recorder.stop_recording()
+                self._last_growth = time.monotonic()
+                if self.adaptive:
+                    self._adaptive_loop()
+                elif self.watchdog:
+                    while not self.stop_event.wait(self.watchdog_interval):
+                        self._recover_if_failed()
+                else:
+                    self.stop_event.wait()
+                if self.stop_timeout is None:
+                    self.recorder.stop_recording()
+                else:
+                    self.recorder.stop_recording(timeout=self.stop_timeout)
         except Exception as e:
             self.last_error = e
             print(f"[RecordingController] Recording error: {e}")
 
+    def _adaptive_loop(self):
+        """Poll encoder stats until stop() and move along the quality ladder."""
+        recover_after = self.recover_after
+        lagging_checks = 0
+        last_drops = 0
+        stable_since = time.monotonic()
+        probing = False
+        # Startup of a fresh process reports low speed for a moment: ignore it
+        warmup_until = time.monotonic() + 2 * self.check_interval
+
+        while not self.stop_event.wait(self.check_interval):
+            if self.watchdog and self._recover_if_failed():
+                # Fresh process: start over the lag detection
+                lagging_checks, last_drops = 0, 0
+                warmup_until = time.monotonic() + 2 * self.check_interval
+                continue
+            now = time.monotonic()
+            stats = self.recorder.get_progress()
+            speed, drops = stats["speed"], stats["drop_frames"]
+            if now < warmup_until or speed is None:
+                last_drops = drops
+                continue
+
+            lagging = speed < self.lag_threshold or drops > last_drops
+            last_drops = drops
+            if lagging:
+                lagging_checks += 1
+                if lagging_checks >= self.lag_checks and self.quality_level < len(self.QUALITY_LADDER) - 1:
+                    if probing:
+                        # The step up did not hold: wait longer before the next one
+                        recover_after = recover_after * 2
+                    self._roll(self.quality_level + 1, stats)
+                    probing = False
+                    lagging_checks, last_drops = 0, 0
+                    stable_since = time.monotonic()
+                    warmup_until = stable_since + 2 * self.check_interval
+            else:
+                lagging_checks = 0
+                if probing and now - stable_since >= recover_after:
+                    probing = False
+                    recover_after = self.recover_after
+                if self.quality_level > 0 and now - stable_since >= recover_after:
+                    self._roll(self.quality_level - 1, stats)
+                    probing = True
+                    last_drops = 0
+                    stable_since = time.monotonic()
+                    warmup_until = stable_since + 2 * self.check_interval
+
+    def _roll(self, level: int, stats: Dict[str, Any]):
+        """
+        Continue into a new part with the settings of `level`. The new part starts
+        first and the current one stops once the new one has written its first
+        frame, so the switch leaves no gap. Devices that allow a single open (the
+        new part cannot start while the old one runs) switch with a short gap.
+        """
+        settings = self.QUALITY_LADDER[level]
+        width, height = (int(v) for v in self._base_resolution.lower().split("x"))
+        # Encoders need even dimensions
+        resolution = f"{int(width * settings['scale']) // 2 * 2}x{int(height * settings['scale']) // 2 * 2}"
+        framerate = max(1, self._base_framerate // settings["fps_divisor"])
+
+        previous = self.recorder
+        next_recorder = previous.continuation(
+            resolution=resolution,
+            framerate=framerate,
+            fast_preset=settings["fast_preset"]
+        )
+        # Two processes must not publish to the same frame bus at once
+        overlapped = (previous.frame_bus is None and next_recorder.start_recording()
+                      and next_recorder.wait_first_frame_latency(timeout=self.stall_timeout) is not None)
+        if not overlapped and next_recorder.is_recording:
+            next_recorder.stop_recording(timeout=2.0)
+        previous.stop_recording()
+        if not overlapped:
+            # Same part name: overwrites what the failed overlap attempt wrote
+            next_recorder = previous.continuation(
+                resolution=resolution,
+                framerate=framerate,
+                fast_preset=settings["fast_preset"]
+            )
+            if not next_recorder.start_recording():
+                # Keep going with the old settings (in a new part) rather than stop recording
+                fallback = next_recorder.continuation(
+                    resolution=previous.resolution,
+                    framerate=previous.framerate,
+                    fast_preset=previous.fast_preset
+                )
+                # If it fails too, the watchdog keeps retrying it (_retry_start)
+                self.recorder = fallback
+                if fallback.start_recording():
+                    self.parts.append(fallback.output_file)
+                return
+
+        self.recorder = next_recorder
+        self.parts.append(next_recorder.output_file)
+        previous.video_logger.log_event(
+            source=previous.video_device,
+            output_file=next_recorder.output_file,
+            codec=next_recorder.codec,
+            resolution=resolution,
+            event="QUALITY",
+            timestamp=datetime.datetime.now(),
+            status="DOWNSHIFT" if level > self.quality_level else "UPSHIFT",
+            extra={"level": level, "framerate": framerate, "fast_preset": settings["fast_preset"],
+                   "speed": stats["speed"], "drop_frames": stats["drop_frames"],
+                   "previous_part": previous.output_file, "overlapped": overlapped}
+        )
+        self.quality_level = level
+
+    def _recover_if_failed(self) -> bool:
+        """Restart into a new part if FFmpeg exited or stalled. Returns True if it restarted."""
+        process = self.recorder.process
+        if process is None:
+            # The current part never started (restart or quality switch failed)
+            return not self.recorder.is_recording and self._retry_start()
+
+        reason = None
+        if process.poll() is not None:
+            reason = "exited"
+        else:
+            stats = self.recorder.get_progress()
+            output = (stats["frame"], stats["total_size"])
+            now = time.monotonic()
+            if output != self._last_output:
+                self._last_output, self._last_growth = output, now
+            elif now - self._last_growth >= self.stall_timeout:
+                reason = "stalled"
+        if reason is None:
+            return False
+
+        self._restart(reason)
+        return True
+
+    def _restart(self, reason: str):
+        """Close the failed part and continue recording into the next one."""
+        previous = self.recorder
+        stats = previous.get_progress()
+        # The outage starts with the last progress report of the failed process
+        outage_start = (datetime.datetime.fromtimestamp(stats["updated_at"])
+                        if stats["updated_at"] else datetime.datetime.now())
+        returncode = previous.process.poll() if previous.process else None
+        # A dead or hung process: no point in waiting long for a clean exit
+        previous.stop_recording(timeout=2.0)
+
+        # Parts that die without writing a frame (device gone) back off before the next try
+        if stats["frame"] == 0:
+            self._restart_delay = min(max(1.0, self._restart_delay * 2), self.MAX_RESTART_DELAY)
+        else:
+            self._restart_delay = 0.0
+        if self._restart_delay and self.stop_event.wait(self._restart_delay):
+            return
+
+        next_recorder = previous.continuation()
+        started = next_recorder.start_recording()
+        self.recorder = next_recorder
+        if started:
+            self.parts.append(next_recorder.output_file)
+        self.restarts += 1
+        self._last_output, self._last_growth = (0, 0), time.monotonic()
+        self._pending_outage = None if started else (reason, outage_start, previous.output_file)
+        self._log_outage(reason, outage_start, previous.output_file, started, extra={
+            "returncode": returncode,
+            "ffmpeg_stderr": previous.progress.stderr_tail()[-2000:] if previous.progress else None
+        })
+
+    def _retry_start(self) -> bool:
+        """
+        Start the current part again after the backoff (its last start failed).
+        Returns True once it is running.
+        """
+        self._restart_delay = min(max(1.0, self._restart_delay * 2), self.MAX_RESTART_DELAY)
+        if self.stop_event.wait(self._restart_delay):
+            return False
+        # Latency of the retry, not of the failed attempt
+        self.recorder.trigger_time = None
+        if not self.recorder.start_recording():
+            return False
+
+        self.parts.append(self.recorder.output_file)
+        self._last_output, self._last_growth = (0, 0), time.monotonic()
+        if self._pending_outage:
+            reason, outage_start, previous_part = self._pending_outage
+            self._log_outage(reason, outage_start, previous_part, True)
+        self._pending_outage = None
+        return True
+
+    def _log_outage(
+        self,
+        reason: str,
+        outage_start: datetime.datetime,
+        previous_part: str,
+        started: bool,
+        extra: Optional[Dict[str, Any]] = None
+    ):
+        """OUTAGE event for the current part: RECOVERED once it writes its first frame, else RETRYING."""
+        recorder = self.recorder
+        latency = recorder.wait_first_frame_latency(timeout=self.stall_timeout) if started else None
+        outage_end = (datetime.datetime.fromtimestamp(recorder.trigger_time + latency)
+                      if latency is not None else None)
+        recorder.video_logger.log_event(
+            source=recorder.video_device,
+            output_file=recorder.output_file,
+            codec=recorder.codec,
+            resolution=recorder.resolution,
+            event="OUTAGE",
+            timestamp=datetime.datetime.now(),
+            duration=(outage_end - outage_start).total_seconds() if outage_end else None,
+            status="RECOVERED" if outage_end else "RETRYING",
+            extra={"reason": reason,
+                   "outage_start": outage_start.isoformat(),
+                   "outage_end": outage_end.isoformat() if outage_end else None,
+                   "previous_part": previous_part, "restarts": self.restarts,
+                   **(extra or {})}
+        )
+
     def start(self):
         """Start recording in a separate thread."""
         if self.recording_thread and self.recording_thread.is_alive():
@@ -37,11 +327,19 @@ class VideoDeviceRecordingController:
         self.recording_thread = Thread(target=self._run, daemon=True)
         self.recording_thread.start()
 
-    def stop(self):
-        """Stop recording and wait for thread to finish."""
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop recording and wait for thread to finish. `timeout` is what FFmpeg
+        gets to finalize the file (recorder default if None).
+        Returns True if the thread finished in time.
+        """
+        self.stop_timeout = timeout
         self.stop_event.set()
         if self.recording_thread:
-            self.recording_thread.join(timeout=5.0)
+            self.recording_thread.join(
+                timeout=5.0 if timeout is None else timeout + VideoDeviceRecorder.STOP_GRACE_SECONDS)
+            return not self.recording_thread.is_alive()
+        return True
 
     def is_recording(self) -> bool:
         """Check if recording is active."""
@@ -50,3 +348,9 @@ class VideoDeviceRecordingController:
             and self.recording_thread.is_alive()
             and self.recorder.is_recording_active()
         )
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Live FFmpeg stats of the controlled recorder (see VideoDeviceRecorder.get_progress)."""
+        stats = self.recorder.get_progress()
+        stats["quality_level"] = self.quality_level
+        return stats
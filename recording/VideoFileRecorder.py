@@ -1,27 +1,48 @@
 import subprocess
-import threading
 import datetime
 import os
-from typing import Final, List
+import shutil
+import time
+from concurrent.futures import wait
+from typing import Any, Dict, Final, List, Optional, Tuple
 from utils.DetectGPU import DetectGPU
+from utils.EncoderProfiles import EncoderProfiles
+from utils.EncoderBenchmark import EncoderBenchmark
 from utils.VideoDeviceDetection import VideoDeviceDetection
 from utils.VideoLogger import VideoLogger
+from utils.KeyframeIndex import KeyframeIndex
+from utils.ContactSheet import ContactSheet
+from .ClipScheduler import ClipJob, ClipScheduler
 
 class VideoFileRecorder:
     """
     Handles creation of video clips from a video file concurrently.
-    Each clip runs independently in its own thread, using GPU if available.
+    Clips run on a ClipScheduler (bounded per encoder, by priority), using GPU if available.
     Logs all events with VideoLogger.
     """
 
-    CODECS: Final[dict[str, str]] = {
-        "nvidia": "hevc_nvenc",
-        "amd": "hevc_amf",
-        "cpu": "libx265"
-    }
+    # Encoder settings profile used for clips (see EncoderProfiles)
+    USE_CASE: Final[str] = "clip"
+
+    # vendor -> codec: hevc_nvenc / hevc_amf / hevc_qsv / hevc_vaapi / libx265
+    CODECS: Final[dict[str, str]] = EncoderProfiles.vendor_codecs(USE_CASE)
+
+    # "encode": frame-accurate re-encode; "copy": stream copy from the keyframe at or before start;
+    # "smart": frame accurate, re-encodes only the partial GOPs at both ends
+    CLIP_MODES: Final[tuple[str, ...]] = ("encode", "copy", "smart")
+
+    # create_clips(): ranges closer than this are cut in the same pass (the gap is decoded and dropped)
+    BATCH_MAX_GAP: Final[float] = 30.0
+    # Outputs of one batch pass on the CPU (GPU passes are capped by the encoder session limit)
+    BATCH_MAX_OUTPUTS: Final[int] = 16
+
+    # Source codec -> encoder for the edges of a smart cut (same codec as the copied middle)
+    SMART_CUT_ENCODERS: Final[dict[str, str]] = {"h264": "libx264", "hevc": "libx265"}
 
     def __init__(self, input_file: str, output_dir: str = "clips",
-                 ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH) -> None:
+                 ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+                 codec: Optional[str] = None,
+                 scheduler: Optional[ClipScheduler] = None) -> None:
         if not os.path.exists(input_file):
             raise FileNotFoundError(f"Input video not found: {input_file}")
 
@@ -30,90 +51,521 @@ class VideoFileRecorder:
         self.ffmpeg_path = ffmpeg_path
         os.makedirs(self.output_dir, exist_ok=True)
 
-        gpu_vendor = DetectGPU.detect_gpu_vendor()
-        self.codec = self.CODECS.get(gpu_vendor, "libx265")
+        # Pick codec: forced > calibrated (EncoderBenchmark cache) > detected GPU
+        if codec is None:
+            codec = EncoderBenchmark.cached_codec(self.USE_CASE)
+        if codec is None:
+            gpu_vendor = DetectGPU.detect_gpu_vendor()
+            codec = self.CODECS.get(gpu_vendor, "libx265")
+        EncoderProfiles.get(codec, self.USE_CASE)  # Fail early on codecs without a profile
+        self.codec = codec
 
         # Initialize logger
         self.video_logger = VideoLogger()
 
-        # Guardar hilos activos de clips
-        self._active_threads: List[threading.Thread] = []
+        # Cola compartida de clips (límite por encoder) y trabajos pendientes de este archivo
+        self.scheduler = scheduler or ClipScheduler.shared()
+        self._jobs: List[ClipJob] = []
 
     def _build_ffmpeg_command(self, start_time: float, end_time: float, output_file: str) -> List[str]:
         duration = end_time - start_time
         if duration <= 0:
             raise ValueError("End time must be greater than start time")
 
-        cmd = [
+        filters = EncoderProfiles.output_filters(self.codec, self.USE_CASE)
+        return [
             self.ffmpeg_path,
+            *EncoderProfiles.global_args(self.codec, self.USE_CASE),
             "-ss", str(start_time),
             "-i", self.input_file,
             "-t", str(duration),
-            "-c:v", self.codec,
+            "-vf", ",".join(filters),
+            *EncoderProfiles.encoder_args(self.codec, self.USE_CASE),
             "-an",
             "-y",
             output_file
         ]
 
-        if self.codec == "hevc_nvenc":
-            cmd += ["-preset", "p5", "-rc", "constqp", "-qp", "0"]
-        elif self.codec == "hevc_amf":
-            cmd += ["-quality", "high", "-usage", "transcoding"]
-        elif self.codec == "libx265":
-            cmd += ["-preset", "veryfast", "-tune", "zerolatency", "-crf", "18"]
+    def keyframe_index(self) -> KeyframeIndex:
+        """Keyframe index of the input (cached in a sidecar next to it, built on first use)."""
+        return KeyframeIndex.load(self.input_file, self.ffmpeg_path)
 
-        return cmd
+    def _build_copy_command(self, start_time: float, end_time: float, output_file: str) -> List[str]:
+        """Stream copy (no decode/encode): starts at the keyframe at or before start_time."""
+        if end_time <= start_time:
+            raise ValueError("End time must be greater than start time")
 
-    def _run_clip(self, start_time: float, end_time: float, output_file: str) -> None:
-        self.video_logger.log_event(
-            source=self.input_file,
-            output_file=output_file,
-            codec=self.codec,
-            event="START",
-            timestamp=datetime.datetime.now(),
-            status="IN_PROGRESS",
-            extra={"clip_start": start_time, "clip_end": end_time}
-        )
+        return [
+            self.ffmpeg_path,
+            "-hide_banner", "-loglevel", "error",
+            "-ss", str(start_time),
+            "-i", self.input_file,
+            "-t", str(end_time - start_time),
+            "-map", "0:v:0",
+            "-c", "copy",
+            "-avoid_negative_ts", "make_zero",
+            "-movflags", "+faststart",
+            "-y",
+            output_file
+        ]
+
+    def _smart_cut_plan(self, start_time: float, end_time: float) -> List[Tuple[str, float, float]]:
+        """
+        Pieces of a smart cut as ("encode" | "copy", start, end): the partial GOP before the
+        first keyframe and the one after the last keyframe are re-encoded, the rest is copied.
+        """
+        if end_time <= start_time:
+            raise ValueError("End time must be greater than start time")
+
+        index = self.keyframe_index()
+        first_keyframe = index.keyframe_after(start_time)
+        if first_keyframe is None or first_keyframe >= end_time:
+            return [("encode", start_time, end_time)]  # No keyframe inside the range
+        last_keyframe = index.keyframe_before(end_time)
 
+        plan: List[Tuple[str, float, float]] = []
+        if first_keyframe - start_time > 1e-3:
+            plan.append(("encode", start_time, first_keyframe))
+        if last_keyframe > first_keyframe:
+            plan.append(("copy", first_keyframe, last_keyframe))
+        if end_time - last_keyframe > 1e-3:
+            plan.append(("encode", last_keyframe, end_time))
+        return plan
+
+    def _build_edge_command(self, start_time: float, end_time: float, output_file: str,
+                            stream: Dict[str, Any]) -> List[str]:
+        """Re-encode one edge of a smart cut with the source's codec and format, so it joins the copied part."""
+        encoder = self.SMART_CUT_ENCODERS[stream["codec_name"]]
+        profile = str(stream.get("profile", "")).lower()
+        return [
+            self.ffmpeg_path,
+            "-hide_banner", "-loglevel", "error",
+            "-ss", str(start_time),
+            "-i", self.input_file,
+            "-t", str(end_time - start_time),
+            "-map", "0:v:0",
+            "-c:v", encoder, "-preset", "veryfast", "-crf", "18",
+            *(["-profile:v", profile] if encoder == "libx264" and profile in ("baseline", "main", "high") else []),
+            *(["-pix_fmt", stream["pix_fmt"]] if stream.get("pix_fmt") else []),
+            "-an",
+            "-f", "mpegts",
+            "-y", output_file
+        ]
+
+    def _build_piece_copy_command(self, start_time: float, end_time: float, output_file: str) -> List[str]:
+        """Keyframe-aligned middle of a smart cut, as MPEG-TS (parameter sets in band)."""
+        return [
+            self.ffmpeg_path,
+            "-hide_banner", "-loglevel", "error",
+            "-ss", str(start_time),
+            "-i", self.input_file,
+            "-t", str(end_time - start_time),
+            "-map", "0:v:0",
+            "-c", "copy",
+            "-f", "mpegts",
+            "-y", output_file
+        ]
+
+    @staticmethod
+    def _run_process(cmd: List[str], job: Optional[ClipJob] = None) -> Tuple[int, str]:
+        """Run FFmpeg to completion (killed if the job is cancelled). Returns (returncode, stderr)."""
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if job:
+            job.attach(process)
+        _, stderr = process.communicate()
+        return process.returncode, stderr
+
+    def _smart_cut(self, plan: List[Tuple[str, float, float]], output_file: str,
+                   job: Optional[ClipJob] = None) -> Tuple[int, str]:
+        """Write the pieces of `plan` and concatenate them into `output_file` (stream copy)."""
+        stream = self.keyframe_index().stream
+        parts_dir = f"{output_file}.parts"
+        os.makedirs(parts_dir, exist_ok=True)
+        try:
+            pieces: List[str] = []
+            for number, (kind, start, end) in enumerate(plan):
+                piece = os.path.join(parts_dir, f"piece_{number:02d}.ts")
+                if kind == "encode":
+                    cmd = self._build_edge_command(start, end, piece, stream)
+                else:
+                    cmd = self._build_piece_copy_command(start, end, piece)
+                returncode, stderr = self._run_process(cmd, job)
+                if returncode != 0:
+                    return returncode, stderr
+                pieces.append(piece)
+
+            list_file = os.path.join(parts_dir, "pieces.txt")
+            with open(list_file, "w", encoding="utf-8") as f:
+                for piece in pieces:
+                    safe_path = os.path.abspath(piece).replace("\\", "/").replace("'", "'\\''")
+                    f.write(f"file '{safe_path}'\n")
+            return self._run_process([
+                self.ffmpeg_path,
+                "-hide_banner", "-loglevel", "error",
+                "-f", "concat", "-safe", "0",
+                "-i", list_file,
+                "-c", "copy",
+                "-movflags", "+faststart",
+                "-y", output_file
+            ], job)
+        finally:
+            shutil.rmtree(parts_dir, ignore_errors=True)
+
+    def _run_clip(self, start_time: float, end_time: float, output_file: str,
+                  mode: str = "encode", job: Optional[ClipJob] = None) -> Dict[str, Any]:
+        extra: Dict[str, Any] = {"clip_start": start_time, "clip_end": end_time}
+        codec = "copy" if mode == "copy" else self.codec
         try:
-            cmd = self._build_ffmpeg_command(start_time, end_time, output_file)
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            stdout, stderr = process.communicate()
+            plan: List[Tuple[str, float, float]] = []
+            if mode == "copy":
+                # Snap to a keyframe so the clip starts with a decodable frame
+                requested_start = start_time
+                start_time = self.keyframe_index().keyframe_before(start_time)
+                extra.update({"mode": mode, "snapped_start": start_time,
+                              "snapped_by": round(requested_start - start_time, 3)})
+            elif mode == "smart":
+                source_codec = self.keyframe_index().stream.get("codec_name")
+                if source_codec in self.SMART_CUT_ENCODERS:
+                    plan = self._smart_cut_plan(start_time, end_time)
+                    codec = f"{self.SMART_CUT_ENCODERS[source_codec]}+copy"
+                    extra.update({"mode": mode, "pieces": plan, "reencoded_seconds": round(
+                        sum(end - start for kind, start, end in plan if kind == "encode"), 3)})
+                else:
+                    # Edges must match the copied part: without an encoder for the source codec, re-encode it all
+                    extra.update({"mode": "encode", "requested_mode": mode, "source_codec": source_codec})
 
-            status = "SUCCESS" if process.returncode == 0 else "FAILED"
             self.video_logger.log_event(
                 source=self.input_file,
                 output_file=output_file,
-                codec=self.codec,
+                codec=codec,
+                event="START",
+                timestamp=datetime.datetime.now(),
+                status="IN_PROGRESS",
+                extra=extra
+            )
+
+            if plan:
+                returncode, stderr = self._smart_cut(plan, output_file, job)
+            else:
+                if mode == "copy":
+                    cmd = self._build_copy_command(start_time, end_time, output_file)
+                else:
+                    cmd = self._build_ffmpeg_command(start_time, end_time, output_file)
+                returncode, stderr = self._run_process(cmd, job)
+
+            status = "SUCCESS" if returncode == 0 else "FAILED"
+            if job and job.cancel_requested:
+                status = "CANCELLED"
+                try:
+                    os.remove(output_file)  # Incomplete
+                except OSError:
+                    pass
+            self.video_logger.log_event(
+                source=self.input_file,
+                output_file=output_file,
+                codec=codec,
                 event="STOP",
                 timestamp=datetime.datetime.now(),
                 duration=end_time - start_time,
                 status=status,
                 extra={"ffmpeg_stderr": stderr}
             )
+            return {"status": status, "returncode": returncode, "stderr": stderr}
         except Exception as e:
             self.video_logger.log_event(
                 source=self.input_file,
                 output_file=output_file,
-                codec=self.codec,
+                codec=codec,
                 event="ERROR",
                 timestamp=datetime.datetime.now(),
                 status="FAILED",
                 extra={"exception": str(e)}
             )
+            return {"status": "FAILED", "exception": str(e)}
+
+    def _encoder_family(self, mode: str) -> str:
+        """ClipScheduler slot a clip uses: stream copy, CPU (smart-cut edges) or the clip codec's vendor."""
+        if mode == "copy":
+            return "copy"
+        if mode == "smart":
+            return "cpu"
+        return EncoderProfiles.vendor_of(self.codec)
+
+    def create_clip(self, start_time: float, end_time: float, mode: str = "encode",
+                    priority: int = ClipScheduler.PRIORITY_NORMAL) -> str:
+        """
+        Queue a cut of [start_time, end_time] (seconds) and return the path of the clip.
+        The clip is being written in the background: it is ready once
+        wait_for_all_clips() returns. See submit_clip() for the ClipJob (status, cancel()).
+        """
+        return self.submit_clip(start_time, end_time, mode, priority).output_file
 
-    def create_clip(self, start_time: float, end_time: float) -> str:
+    def submit_clip(self, start_time: float, end_time: float, mode: str = "encode",
+                    priority: int = ClipScheduler.PRIORITY_NORMAL, block: bool = True,
+                    timeout: Optional[float] = None) -> ClipJob:
+        """
+        Queue a cut of [start_time, end_time] (seconds) into a new file in output_dir.
+
+        Args:
+            mode: "encode" (frame accurate, re-encoded with the clip profile),
+                  "copy" (no re-encode, starts at the previous keyframe; see keyframe_index()) or
+                  "smart" (frame accurate; only the partial GOPs at the start and end are re-encoded)
+            priority: ClipScheduler.PRIORITY_LIVE for incidents, PRIORITY_BULK for exports
+            block, timeout: Wait for room when the scheduler queue is full (see ClipScheduler.submit)
+
+        Returns:
+            ClipJob: Future of the clip; job.output_file is the path being written,
+            job.result() the status and timings. job.cancel() stops it.
+        """
+        if mode not in self.CLIP_MODES:
+            raise ValueError(f"Unknown clip mode: {mode} (expected one of {self.CLIP_MODES})")
+        if end_time <= start_time:
+            raise ValueError("End time must be greater than start time")
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         output_file = os.path.join(self.output_dir, f"clip_{timestamp}.mp4")
-        thread = threading.Thread(target=self._run_clip, args=(start_time, end_time, output_file), daemon=True)
-        thread.start()
-        self._active_threads.append(thread)
-        return output_file
+        job = self.scheduler.submit(
+            lambda clip_job: self._run_clip(start_time, end_time, output_file, mode, clip_job),
+            output_file=output_file,
+            encoder=self._encoder_family(mode),
+            priority=priority,
+            block=block,
+            timeout=timeout
+        )
+        self._jobs.append(job)
+        return job
+
+    def _build_batch_command(self, pass_start: float, pass_end: float,
+                             clips: List[Tuple[float, float, str]]) -> List[str]:
+        """
+        One FFmpeg for several clips: the source is read and decoded once from pass_start
+        to pass_end, split, and each branch trimmed to its clip and encoded to its own file.
+        """
+        filters = ",".join(EncoderProfiles.output_filters(self.codec, self.USE_CASE))
+        labels = "".join(f"[s{number}]" for number in range(len(clips)))
+        graph = [f"[0:v]split={len(clips)}{labels}" if len(clips) > 1 else "[0:v]null[s0]"]
+        outputs: List[str] = []
+        for number, (start, end, output_file) in enumerate(clips):
+            graph.append(f"[s{number}]trim=start={start - pass_start:.6f}:end={end - pass_start:.6f},"
+                         f"setpts=PTS-STARTPTS,{filters}[c{number}]")
+            outputs += [
+                "-map", f"[c{number}]",
+                *EncoderProfiles.encoder_args(self.codec, self.USE_CASE),
+                "-an",
+                "-y", output_file
+            ]
+        return [
+            self.ffmpeg_path,
+            "-hide_banner", "-loglevel", "error",
+            *EncoderProfiles.global_args(self.codec, self.USE_CASE),
+            # Input options: only the pass is read and decoded
+            "-ss", str(pass_start),
+            "-t", str(pass_end - pass_start),
+            "-i", self.input_file,
+            "-filter_complex", ";".join(graph),
+            *outputs
+        ]
+
+    def _plan_batch(self, ranges: List[Tuple[float, float]], max_gap: float,
+                    max_outputs: int) -> List[List[int]]:
+        """Group range indexes (sorted by start) into passes: close ranges, at most max_outputs each."""
+        order = sorted(range(len(ranges)), key=lambda number: ranges[number])
+        passes: List[List[int]] = []
+        pass_end = None
+        for number in order:
+            start, end = ranges[number]
+            if passes and len(passes[-1]) < max_outputs and start <= pass_end + max_gap:
+                passes[-1].append(number)
+                pass_end = max(pass_end, end)
+            else:
+                passes.append([number])
+                pass_end = end
+        return passes
+
+    def _run_batch(self, clips: List[Tuple[float, float, ClipJob]], job: ClipJob) -> Dict[str, Any]:
+        """Run one pass of create_clips() and resolve the jobs of its clips."""
+        # Clips cancelled while queued are left out of the pass
+        active = [(start, end, clip_job) for start, end, clip_job in clips
+                  if clip_job.set_running_or_notify_cancel()]
+        if not active:
+            return {"status": "CANCELLED"}
+        pass_start = min(start for start, _, _ in active)
+        pass_end = max(end for _, end, _ in active)
+        extra_batch = {"pass_start": pass_start, "pass_end": pass_end, "pass_clips": len(active)}
+
+        for start, end, clip_job in active:
+            clip_job.started_at = time.time()
+            self.video_logger.log_event(
+                source=self.input_file,
+                output_file=clip_job.output_file,
+                codec=self.codec,
+                event="START",
+                timestamp=datetime.datetime.now(),
+                status="IN_PROGRESS",
+                extra={"clip_start": start, "clip_end": end, "mode": "batch", **extra_batch}
+            )
+
+        returncode, stderr = -1, ""
+        try:
+            cmd = self._build_batch_command(
+                pass_start, pass_end, [(start, end, clip_job.output_file) for start, end, clip_job in active])
+            returncode, stderr = self._run_process(cmd, job)
+        except Exception as e:
+            stderr = str(e)
+        finally:
+            for start, end, clip_job in active:
+                status = "SUCCESS" if returncode == 0 else "FAILED"
+                if clip_job.cancel_requested or job.cancel_requested:
+                    status = "CANCELLED"
+                    try:
+                        os.remove(clip_job.output_file)
+                    except OSError:
+                        pass
+                clip_job.finished_at = time.time()
+                self.video_logger.log_event(
+                    source=self.input_file,
+                    output_file=clip_job.output_file,
+                    codec=self.codec,
+                    event="STOP",
+                    timestamp=datetime.datetime.now(),
+                    duration=end - start,
+                    status=status,
+                    extra={"ffmpeg_stderr": stderr, **extra_batch}
+                )
+                clip_job.set_result({
+                    "status": status,
+                    "returncode": returncode,
+                    "stderr": stderr,
+                    "output_file": clip_job.output_file,
+                    "queued_seconds": clip_job.queued_seconds,
+                    "run_seconds": clip_job.run_seconds
+                })
+        return {"status": "SUCCESS" if returncode == 0 else "FAILED", "returncode": returncode}
+
+    def create_clips(self, ranges: List[Tuple[float, float]],
+                     priority: int = ClipScheduler.PRIORITY_BULK,
+                     max_gap: float = BATCH_MAX_GAP) -> List[ClipJob]:
+        """
+        Cut many clips with as few reads of the source as possible (bulk export).
+
+        Ranges are sorted and grouped into passes (ranges less than `max_gap`
+        seconds apart); each pass is a single FFmpeg process that decodes its part
+        of the source once, overlapping ranges included, and encodes every clip
+        of the group. Clips are re-encoded (mode "encode").
+
+        Returns:
+            List[ClipJob]: One job per range, in the order given. Cancelling a clip
+            before its pass starts leaves it out of the pass; once running, the
+            pass finishes and the clip is discarded.
+        """
+        for start, end in ranges:
+            if end <= start:
+                raise ValueError("End time must be greater than start time")
+
+        family = self._encoder_family("encode")
+        session_limited = family in ClipScheduler.SESSION_LIMITED
+        max_outputs = self.scheduler.limits.get(family, 1) if session_limited else self.BATCH_MAX_OUTPUTS
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        jobs = [ClipJob(os.path.join(self.output_dir, f"clip_{timestamp}_{number:03d}.mp4"), family, priority)
+                for number in range(len(ranges))]
+
+        for numbers in self._plan_batch(ranges, max_gap, max_outputs):
+            clips = [(ranges[number][0], ranges[number][1], jobs[number]) for number in numbers]
+            self.scheduler.submit(
+                lambda pass_job, clips=clips: self._run_batch(clips, pass_job),
+                output_file=jobs[numbers[0]].output_file,
+                encoder=family,
+                priority=priority,
+                # One encoder per clip, GPU session or CPU encoder alike (capped at the family limit)
+                slots=len(clips)
+            )
+        self._jobs += jobs
+        return jobs
+
+    @staticmethod
+    def _run_thumbnails(path: str, interval: float, width: int, columns: int,
+                        ffmpeg_path: str) -> Dict[str, Any]:
+        video_logger = VideoLogger()
+        try:
+            sheet = ContactSheet.generate(path, interval, width, columns, ffmpeg_path)
+        except (OSError, RuntimeError) as e:
+            video_logger.log_event(
+                source=path,
+                output_file=ContactSheet.cache_dir(path),
+                codec=None,
+                event="THUMBNAILS",
+                timestamp=datetime.datetime.now(),
+                status="FAILED",
+                extra={"exception": str(e)}
+            )
+            return {"status": "FAILED", "exception": str(e)}
+
+        video_logger.log_event(
+            source=path,
+            output_file=sheet["sheet"],
+            codec="mjpeg",
+            event="THUMBNAILS",
+            timestamp=datetime.datetime.now(),
+            status="SUCCESS",
+            extra={
+                "thumbnails": len(sheet["thumbnails"]),
+                "interval": interval,
+                "sheet_interval": sheet["sheet_interval"],
+                "generate_seconds": sheet["seconds"]
+            }
+        )
+        return {"status": "SUCCESS", **sheet}
+
+    @classmethod
+    def thumbnails_for(
+        cls,
+        path: str,
+        interval: float = 10.0,
+        width: int = 320,
+        columns: int = 5,
+        priority: int = ClipScheduler.PRIORITY_NORMAL,
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+        scheduler: Optional[ClipScheduler] = None
+    ) -> ClipJob:
+        """
+        Thumbnails every `interval` seconds and a contact sheet of any recording (see ContactSheet).
+
+        Only keyframes are decoded, in a single pass, and the result is cached
+        next to the recording (`<file>.thumbs/`): when it is already there, the
+        returned job is done immediately and nothing is queued.
+
+        Returns:
+            ClipJob: result() has status, sheet and thumbnails ([{file, time}] with time
+            in seconds from the start of the file)
+        """
+        cached = ContactSheet.load(path, interval, width, columns)
+        if cached:
+            job = ClipJob(cached["sheet"], "cpu", priority)
+            job.set_result({"status": "SUCCESS", "cached": True, **cached, "output_file": cached["sheet"]})
+            return job
+        return (scheduler or ClipScheduler.shared()).submit(
+            lambda _: cls._run_thumbnails(path, interval, width, columns, ffmpeg_path),
+            output_file=os.path.join(ContactSheet.cache_dir(path), ContactSheet.SHEET_FILE),
+            encoder="cpu",  # Keyframe decode + JPEG encode
+            priority=priority
+        )
+
+    def create_thumbnails(self, interval: float = 10.0, width: int = 320, columns: int = 5,
+                          priority: int = ClipScheduler.PRIORITY_NORMAL) -> ClipJob:
+        """Thumbnails and contact sheet of the input file (see thumbnails_for)."""
+        job = self.thumbnails_for(self.input_file, interval, width, columns, priority,
+                                  self.ffmpeg_path, self.scheduler)
+        if not job.done():
+            self._jobs.append(job)
+        return job
 
-    def wait_for_all_clips(self) -> None:
+    def wait_for_all_clips(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
         """
         Espera a que todos los clips que se iniciaron terminen su procesamiento.
+        Devuelve el resultado de cada clip (status, output_file, tiempos).
         """
-        for thread in self._active_threads:
-            thread.join()
-        self._active_threads.clear()
+        jobs = list(self._jobs)
+        wait(jobs, timeout)
+        self._jobs = [job for job in self._jobs if not job.done()]
+        return [job.result() if job.done() and not job.cancelled()
+                else {"status": "CANCELLED" if job.cancelled() else "PENDING", "output_file": job.output_file}
+                for job in jobs]
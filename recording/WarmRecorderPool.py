@@ -0,0 +1,318 @@
+import datetime
+import itertools
+import os
+import re
+import shutil
+import time
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional
+from utils.VideoDeviceDetection import VideoDeviceDetection
+from utils.CaptureBackend import CaptureBackend
+from .PreRollRecorder import PreRollRecorder, PreRollCapture
+from .VideoDeviceRecorder import VideoDeviceRecorder
+from .VideoDeviceRecordingController import VideoDeviceRecordingController
+
+
+class WarmRecorder(PreRollRecorder):
+    """
+    Recorder whose FFmpeg process is already running with the device open and
+    the encoder initialized. While idle its segments are discarded; activate()
+    turns it into a real recording without touching the process.
+
+    The recording starts with the segment that contains the trigger, so it
+    holds up to `segment_seconds` of footage from before it (lead_in_seconds()).
+    """
+
+    # An activated recorder continues as a plain recording (see continuation())
+    CAN_CONTINUE: bool = True
+
+    def __init__(
+        self,
+        video_device: str,
+        standby_dir: str,
+        resolution: str = "1280x720",
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+        framerate: int = 30,
+        capture_backend: Optional[CaptureBackend] = None
+    ):
+        super().__init__(
+            video_device=video_device,
+            pre_roll_seconds=0,
+            segment_seconds=1,
+            ring_dir=standby_dir,
+            resolution=resolution,
+            ffmpeg_path=ffmpeg_path,
+            framerate=framerate,
+            capture_backend=capture_backend
+        )
+        self.final_output: Optional[str] = None
+        self.forced = False
+        self._capture: Optional[PreRollCapture] = None
+
+    def activate(self, output_file: str, trigger_time: Optional[float] = None) -> None:
+        """Start keeping segments from now on; they end up in a playlist named after `output_file` (final_output)."""
+        if self._capture is not None:
+            raise RuntimeError("Warm recorder was already activated")
+
+        self._frames_at_trigger = self.get_progress()["frame"]
+        self._capture = self.trigger(output_file)
+        self.trigger_time = trigger_time or self._capture.trigger_time
+        self.final_output = self._capture.output_file
+
+    def continuation(
+        self,
+        resolution: Optional[str] = None,
+        framerate: Optional[int] = None,
+        fast_preset: Optional[bool] = None
+    ) -> VideoDeviceRecorder:
+        """
+        Next part of the activated recording: a fragmented VideoDeviceRecorder
+        (`name_part02.mp4`), since the standby ring goes away with this process.
+        """
+        if self.final_output is None:
+            raise RuntimeError("Warm recorder was not activated")
+        return VideoDeviceRecorder(
+            video_device=self.video_device,
+            output_file=self._next_part_name(os.path.splitext(self.final_output)[0] + ".mp4"),
+            resolution=resolution or self.resolution,
+            ffmpeg_path=self.ffmpeg_path,
+            output_mode="fragmented",
+            framerate=framerate or self.framerate,
+            capture_backend=self.capture_backend,
+            codec=self.codec,
+            fast_preset=self.fast_preset if fast_preset is None else fast_preset,
+            input_format=self.requested_input_format if resolution or framerate else self.input_format
+        )
+
+    def first_frame_time(self) -> Optional[float]:
+        """Wall-clock time of the first frame of the activated recording (start of its first segment)."""
+        if self._capture is None:
+            return super().first_frame_time()
+        if self.passthrough:
+            # Cut at the camera's keyframes: the previous segment closed when the first one started
+            for index, _, mtime in self.list_segments():
+                if index == self._capture.first_index - 1:
+                    return mtime
+        # Segments start on the keyframes forced every segment_seconds of output time
+        return self.output_wall_time(self._capture.first_index * self.segment_seconds)
+
+    def lead_in_seconds(self) -> Optional[float]:
+        """Footage from before the trigger at the start of the activated recording."""
+        first_frame = self.first_frame_time()
+        if self.trigger_time is None or first_frame is None:
+            return None
+        return max(0.0, self.trigger_time - first_frame)
+
+    def stop_recording(self, timeout: float = 8.0) -> bool:
+        """Stop FFmpeg, close the activated recording and drop the standby segments."""
+        stopped = bool(super().stop_recording(timeout))
+        if self._capture is not None:
+            stopped = self._capture.stop() and stopped
+            self.forced = self._capture.forced
+            self._capture = None
+        shutil.rmtree(self.ring_dir, ignore_errors=True)
+        return stopped
+
+
+class WarmRecorderPool:
+    """
+    Keeps pre-spawned, device-opened recorders per camera so an alert does not
+    pay for building the command, spawning FFmpeg, opening the device and
+    initializing the encoder.
+
+    acquire() returns a recorder that can be passed straight to
+    VideoDeviceRecordingController (WarmAlert does both). Each acquisition logs
+    a LATENCY event with the trigger-to-first-frame time, whether the recorder
+    was warm and, for warm ones, the lead-in from before the trigger, so both
+    paths can be compared.
+
+    With single_open=True (default; dshow cameras allow one open at a time) a
+    device is refilled only after release(), once the handed-out recorder has
+    closed it, and holds one warm recorder at most. With single_open=False the
+    pool refills right after every acquire(), while the handed-out recorder
+    still has the device open.
+    """
+
+    LATENCY_TIMEOUT: float = 15.0
+
+    def __init__(
+        self,
+        video_devices: List[str],
+        size_per_device: int = 1,
+        standby_root: str = os.path.join("videos", "standby"),
+        resolution: str = "1280x720",
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+        framerate: int = 30,
+        capture_backend: Optional[CaptureBackend] = None,
+        single_open: bool = True
+    ):
+        if size_per_device <= 0:
+            raise ValueError("size_per_device must be positive")
+        if single_open and size_per_device > 1:
+            raise ValueError("Single-open devices can only keep one warm recorder")
+
+        self.video_devices = list(video_devices)
+        self.size_per_device = size_per_device
+        self.standby_root = standby_root
+        self.resolution = resolution
+        self.ffmpeg_path = ffmpeg_path
+        self.framerate = framerate
+        self.capture_backend = capture_backend
+        self.single_open = single_open
+
+        self._idle: Dict[str, List[WarmRecorder]] = {device: [] for device in self.video_devices}
+        self._lock = Lock()
+        self._closed = False
+        self._counter = itertools.count()
+
+    def start(self) -> None:
+        """Fill the pool for every device (blocks until the processes are spawned)."""
+        for device in self.video_devices:
+            self._refill(device)
+
+    def _spawn(self, video_device: str) -> Optional[WarmRecorder]:
+        safe_device_name = re.sub(r'[^a-zA-Z0-9_-]', '_', video_device.strip().lower())
+        standby_dir = os.path.join(self.standby_root, f"{safe_device_name}_{next(self._counter)}")
+        recorder = WarmRecorder(
+            video_device=video_device,
+            standby_dir=standby_dir,
+            resolution=self.resolution,
+            ffmpeg_path=self.ffmpeg_path,
+            framerate=self.framerate,
+            capture_backend=self.capture_backend
+        )
+        return recorder if recorder.start_recording() else None
+
+    def _refill(self, video_device: str) -> None:
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle.setdefault(video_device, [])) >= self.size_per_device:
+                    return
+            recorder = self._spawn(video_device)
+            if recorder is None:
+                return
+            with self._lock:
+                if not self._closed:
+                    self._idle[video_device].append(recorder)
+                    continue
+            # Pool closed while the process was starting
+            recorder.stop_recording()
+            return
+
+    def acquire(self, video_device: str, output_file: str) -> VideoDeviceRecorder:
+        """
+        Return a recorder for `output_file`: a warm one already capturing, or a cold
+        VideoDeviceRecorder (fragmented output) when none is ready.
+        """
+        trigger_time = time.time()
+        warm: Optional[WarmRecorder] = None
+        with self._lock:
+            idle = self._idle.setdefault(video_device, [])
+            while idle:
+                candidate = idle.pop(0)
+                if candidate.process is not None and candidate.process.poll() is None:
+                    warm = candidate
+                    break
+                # Process died while idle (device unplugged, ...)
+                Thread(target=candidate.stop_recording, daemon=True).start()
+
+        recorder: VideoDeviceRecorder
+        if warm is not None:
+            warm.activate(output_file, trigger_time)
+            recorder = warm
+        else:
+            recorder = VideoDeviceRecorder(
+                video_device=video_device,
+                output_file=output_file,
+                resolution=self.resolution,
+                ffmpeg_path=self.ffmpeg_path,
+                output_mode="fragmented",
+                framerate=self.framerate,
+                capture_backend=self.capture_backend
+            )
+            recorder.trigger_time = trigger_time
+
+        if not self.single_open:
+            Thread(target=self._refill, args=(video_device,), daemon=True).start()
+        Thread(target=self._log_latency, args=(recorder, output_file, warm is not None), daemon=True).start()
+        return recorder
+
+    def release(self, video_device: str) -> None:
+        """The recorder handed out for `video_device` has closed it: refill in the background."""
+        Thread(target=self._refill, args=(video_device,), daemon=True).start()
+
+    def _log_latency(self, recorder: VideoDeviceRecorder, output_file: str, warm: bool) -> None:
+        latency = recorder.wait_first_frame_latency(timeout=self.LATENCY_TIMEOUT)
+        extra: Dict[str, Any] = {"first_frame_latency": latency, "warm": warm}
+        if isinstance(recorder, WarmRecorder):
+            extra["lead_in_seconds"] = recorder.lead_in_seconds()
+        recorder.video_logger.log_event(
+            source=recorder.video_device,
+            output_file=output_file,
+            codec=recorder.codec,
+            resolution=recorder.resolution,
+            event="LATENCY",
+            timestamp=datetime.datetime.now(),
+            status="SUCCESS" if latency is not None else "TIMEOUT",
+            extra=extra
+        )
+
+    def idle_count(self, video_device: str) -> int:
+        """Number of warm recorders ready for a device."""
+        with self._lock:
+            return len(self._idle.get(video_device, []))
+
+    def close(self) -> None:
+        """Stop every idle recorder. Recorders already handed out are not affected."""
+        with self._lock:
+            self._closed = True
+            idle = [recorder for recorders in self._idle.values() for recorder in recorders]
+            self._idle = {device: [] for device in self.video_devices}
+        for recorder in idle:
+            recorder.stop_recording()
+
+
+class WarmAlert:
+    """
+    One alert recorded by a recorder from a WarmRecorderPool under a
+    VideoDeviceRecordingController, with the stop()/is_recording()/get_progress()
+    methods of PreRollCapture so SecuritySystem can keep both in the same
+    collection. Stopping it hands the device back to the pool.
+    """
+
+    def __init__(self, pool: WarmRecorderPool, video_device: str, output_file: str):
+        self.pool = pool
+        self.video_device = video_device
+        self.forced = False
+        self._active = True
+        self.recorder = pool.acquire(video_device, output_file)
+        # A warm recorder writes a playlist named after output_file
+        self.output_file = getattr(self.recorder, "final_output", None) or self.recorder.output_file
+        self.controller = VideoDeviceRecordingController(self.recorder)
+        self.controller.start()
+
+    @property
+    def parts(self) -> List[str]:
+        """Files of this alert: the first one plus the parts the controller continued into."""
+        return [self.output_file] + self.controller.parts[1:]
+
+    def is_recording(self) -> bool:
+        return self._active and self.controller.is_recording()
+
+    def get_progress(self) -> Dict[str, Any]:
+        stats = self.controller.get_progress()
+        stats["output_file"] = self.output_file
+        stats["recording"] = self.is_recording()
+        return stats
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """Stop the recording and release the device to the pool. Returns True if it closed cleanly."""
+        if not self._active:
+            return False
+        self._active = False
+        try:
+            finished = self.controller.stop(timeout)
+            self.forced = getattr(self.recorder, "forced", False)
+            return finished and self.controller.last_error is None and not self.forced
+        finally:
+            self.pool.release(self.video_device)
@@ -0,0 +1,327 @@
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Final, List, Optional, Set, Tuple
+
+try:
+    from utils.ContactSheet import ContactSheet
+    from utils.SegmentPlaylist import SegmentPlaylist
+    from utils.VideoLogger import VideoLogger
+    from utils.system_log import SystemLog
+except ModuleNotFoundError:
+    from ContactSheet import ContactSheet
+    from SegmentPlaylist import SegmentPlaylist
+    from VideoLogger import VideoLogger
+    from system_log import SystemLog
+
+
+class ArchiveMover:
+    """
+    Moves finished recordings from a fast local staging directory to the archive tier.
+
+    Recorders write to `staging_root`, so a slow or network-mounted archive
+    never stalls FFmpeg. A background pass picks up files that are finished
+    (enqueued explicitly, or not modified for `settle_seconds` and not
+    protected, e.g. closed segments) and copies them to the same relative path
+    under `archive_root`:
+
+        1. copy to `<dest>.part` with at most `max_workers` copies at a time and
+           an overall `max_bytes_per_second` budget
+        2. verify: size, and SHA-256 of the archived copy read back
+        3. rename to the final name, log an ARCHIVE event whose output_file is
+           the new location, delete the staging file
+
+    A failed copy leaves the staging file in place and is retried after
+    `retry_seconds`. A playlist recording (SegmentPlaylist) moves as one: its
+    segments first, the playlist last.
+    """
+
+    EXTENSIONS: Final[tuple[str, ...]] = (".mp4", ".mkv", ".ts", SegmentPlaylist.EXTENSION)
+    # Internal working directories of the recorders (ring buffers), never archived
+    SKIP_DIRS: Final[tuple[str, ...]] = ("preroll", "standby")
+    CHUNK_SIZE: Final[int] = 1024 * 1024
+
+    log: Final[SystemLog] = SystemLog(__name__)
+
+    def __init__(
+        self,
+        staging_root: str,
+        archive_root: str,
+        max_workers: int = 2,
+        max_bytes_per_second: Optional[int] = None,
+        settle_seconds: float = 30.0,
+        check_interval: float = 10.0,
+        retry_seconds: float = 60.0,
+        verify_hash: bool = True,
+        on_archived: Optional[Callable[[str, str], None]] = None
+    ):
+        """
+        Args:
+            staging_root: Local directory the recorders write to
+            archive_root: Final (slow/remote) directory
+            max_workers: Files copied at the same time
+            max_bytes_per_second: Total copy bandwidth, shared by all workers (None = unlimited)
+            settle_seconds: A file not modified for this long is considered finished
+            check_interval: Seconds between scans of the staging directory
+            retry_seconds: Wait before retrying a failed copy
+            verify_hash: Also compare SHA-256 (reads the archived copy back); otherwise size only
+            on_archived: Called with (staging_path, archive_path) after each move
+        """
+        if os.path.abspath(staging_root) == os.path.abspath(archive_root):
+            raise ValueError("Staging and archive directories must be different")
+        self.staging_root = os.path.abspath(staging_root)
+        self.archive_root = os.path.abspath(archive_root)
+        self.max_bytes_per_second = max_bytes_per_second
+        self.settle_seconds = settle_seconds
+        self.check_interval = check_interval
+        self.retry_seconds = retry_seconds
+        self.verify_hash = verify_hash
+        self.on_archived = on_archived
+        os.makedirs(self.staging_root, exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                            thread_name_prefix="archive")
+        self._pending: Dict[str, Future] = {}
+        self._failed: Dict[str, float] = {}  # path -> time of the last failure
+        self._protected: Set[str] = set()
+        self._lock = Lock()
+        # Bandwidth budget: monotonic time at which the next chunk may be sent
+        self._throttle_lock = Lock()
+        self._next_send = 0.0
+        self._stop_event = Event()
+        self._thread: Optional[Thread] = None
+        self.video_logger = VideoLogger()
+
+    # ---------------- Paths ----------------
+
+    def archive_path(self, staging_path: str) -> str:
+        """Where a staging file ends up (same relative path under archive_root)."""
+        relative = os.path.relpath(os.path.abspath(staging_path), self.staging_root)
+        return os.path.join(self.archive_root, relative)
+
+    def _is_staged(self, path: str) -> bool:
+        return path.startswith(self.staging_root + os.sep)
+
+    # ---------------- Protection ----------------
+
+    def protect(self, path: str) -> None:
+        """Never move `path` until unprotect() (a recording still being written)."""
+        with self._lock:
+            self._protected.add(os.path.abspath(path))
+
+    def unprotect(self, path: str) -> None:
+        with self._lock:
+            self._protected.discard(os.path.abspath(path))
+
+    # ---------------- Queue ----------------
+
+    def enqueue(self, path: str) -> Optional[Future]:
+        """
+        Archive one finished file now (also unprotects it).
+
+        Returns:
+            Optional[Future]: Resolves to the archive path (None if it failed);
+            None if the file is not under staging_root
+        """
+        path = os.path.abspath(path)
+        if not self._is_staged(path) or not os.path.exists(path):
+            return None
+        with self._lock:
+            self._protected.discard(path)
+            self._failed.pop(path, None)
+            return self._submit(path)
+
+    def _submit(self, path: str) -> Future:
+        """Caller holds the lock."""
+        future = self._pending.get(path)
+        if future is None:
+            future = self._executor.submit(self._archive, path)
+            self._pending[path] = future
+        return future
+
+    def scan(self) -> int:
+        """Queue every settled, unprotected file in staging. Returns how many were queued."""
+        now = time.time()
+        queued = 0
+        pending = [self.staging_root]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            # A playlist's segments move with the playlist
+                            if entry.name not in self.SKIP_DIRS and not SegmentPlaylist.is_segment_dir(entry.path):
+                                pending.append(entry.path)
+                        elif entry.name.lower().endswith(self.EXTENSIONS):
+                            if entry.stat(follow_symlinks=False).st_mtime <= now - self.settle_seconds:
+                                queued += self._queue_settled(entry.path, now)
+            except OSError as e:
+                self.log.warning(f"Could not list {directory}: {e}")
+        return queued
+
+    def _queue_settled(self, path: str, now: float) -> int:
+        with self._lock:
+            if path in self._protected or path in self._pending:
+                return 0
+            if now - self._failed.get(path, 0.0) < self.retry_seconds:
+                return 0
+            self._submit(path)
+            return 1
+
+    # ---------------- Copy ----------------
+
+    def _throttle(self, size: int) -> None:
+        """Reserve `size` bytes of the shared bandwidth budget, sleeping if it is spent."""
+        if not self.max_bytes_per_second:
+            return
+        with self._throttle_lock:
+            now = time.monotonic()
+            start = max(now, self._next_send)
+            self._next_send = start + size / self.max_bytes_per_second
+        if start > now:
+            time.sleep(start - now)
+
+    def _copy(self, source: str, destination: str) -> str:
+        """Throttled copy; returns the SHA-256 of the data read."""
+        digest = hashlib.sha256()
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            while True:
+                chunk = src.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._throttle(len(chunk))
+                digest.update(chunk)
+                dst.write(chunk)
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copystat(source, destination)  # Keep mtime: retention ages by it
+        return digest.hexdigest()
+
+    def _hash(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._throttle(len(chunk))
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _move_file(self, source: str, destination: str) -> Tuple[int, str]:
+        """Copy one file to `destination` through `<dest>.part` and verify it. Returns (size, sha256)."""
+        partial = destination + ".part"
+        try:
+            size = os.path.getsize(source)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            source_hash = self._copy(source, partial)
+
+            archived_size = os.path.getsize(partial)
+            if archived_size != size or os.path.getsize(source) != size:
+                raise OSError(f"size mismatch ({size} staged, {archived_size} archived)")
+            if self.verify_hash and self._hash(partial) != source_hash:
+                raise OSError("checksum mismatch")
+            os.replace(partial, destination)
+        except OSError:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            raise
+        return size, source_hash
+
+    def _archive(self, path: str) -> Optional[str]:
+        destination = self.archive_path(path)
+        playlist = SegmentPlaylist.is_playlist(path)
+        # Playlist last: the archived copy only lists segments that are already there
+        files = SegmentPlaylist.files(path) if playlist else [path]
+        started = time.monotonic()
+        try:
+            size = 0
+            # Archived path and hash of each file, playlist segments in order
+            hashes: List[Dict[str, str]] = []
+            for source in files:
+                file_size, source_hash = self._move_file(source, self.archive_path(source))
+                size += file_size
+                hashes.append({"file": self.archive_path(source), "sha256": source_hash})
+            if playlist:
+                SegmentPlaylist.remove(path)
+            else:
+                os.remove(path)
+            # Keyed by the staging path: rebuilt on demand at the new location
+            ContactSheet.remove_sidecars(path)
+        except OSError as e:
+            with self._lock:
+                self._pending.pop(path, None)
+                self._failed[path] = time.time()
+            self.log.error(f"Could not archive {path}: {e}")
+            self._log_archive_event(path, destination, "FAILED", {"exception": str(e)})
+            return None
+
+        with self._lock:
+            self._pending.pop(path, None)
+        elapsed = time.monotonic() - started
+        self.log.info(f"Archived {path} -> {destination} ({size / 1_048_576:.1f} MB, {elapsed:.1f}s)")
+        details: Dict[str, Any] = {
+            "size": size,
+            "verified": "sha256" if self.verify_hash else "size",
+            "transfer_seconds": round(elapsed, 3),
+            "files": hashes
+        }
+        if not playlist:
+            # A playlist has no single hash: each segment's is in files
+            details["sha256"] = hashes[0]["sha256"]
+        self._log_archive_event(path, destination, "SUCCESS", details)
+        if self.on_archived:
+            try:
+                self.on_archived(path, destination)
+            except Exception as e:
+                self.log.error(f"on_archived callback failed for {destination}: {e}")
+        return destination
+
+    def _log_archive_event(self, path: str, destination: str, status: str, extra: Dict) -> None:
+        self.video_logger.log_event(
+            source=path,
+            output_file=destination if status == "SUCCESS" else path,
+            codec=None,
+            event="ARCHIVE",
+            timestamp=datetime.now(),
+            status=status,
+            extra={"staging_file": path, "archive_file": destination, **extra}
+        )
+
+    # ---------------- Background service ----------------
+
+    def start(self) -> None:
+        """Run scan() every `check_interval` seconds in a background thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.scan()
+            except Exception as e:
+                self.log.error(f"Archive scan failed: {e}")
+            if self._stop_event.wait(self.check_interval):
+                break
+
+    def pending(self) -> List[str]:
+        """Staging files queued or being copied."""
+        with self._lock:
+            return list(self._pending)
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop scanning; with wait=True, let queued copies finish (otherwise they are retried next run)."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
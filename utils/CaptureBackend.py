@@ -0,0 +1,292 @@
+import glob
+import re
+import sys
+from typing import Any, Dict, Final, List, Optional, Type
+
+
+class CaptureBackend:
+    """
+    Describes how FFmpeg reads from one kind of video source.
+
+    A backend builds the input part of an FFmpeg command for a device and knows
+    how to enumerate its devices. VideoDeviceRecorder and VideoDeviceDetection
+    only talk to this interface, so the same recording stack runs on DirectShow
+    (Windows), V4L2 (Linux), RTSP cameras, looping files and lavfi test sources.
+
+    Class Constants:
+        name: Identifier used by CaptureBackend.get()
+        is_live: True when the source is a real-time device (wallclock timestamps, buffering)
+        supports_opencv_probe: True when device N can be opened as cv2.VideoCapture(N)
+        fixed_resolution: True when the source decides its own size (the requested one is ignored)
+
+    Capabilities (list_capabilities_command / parse_capabilities) are a list of
+    modes: {"codec": "h264" | "mjpeg" | None, "pixel_format": raw format or None,
+    "width", "height", "min_fps", "max_fps" (None when unknown)}.
+    """
+
+    name: str = "base"
+    is_live: bool = True
+    supports_opencv_probe: bool = False
+    fixed_resolution: bool = False
+
+    # Input formats that arrive compressed from the device (the rest are raw pixel formats)
+    COMPRESSED_FORMATS: Final[tuple[str, ...]] = ("h264", "hevc", "mjpeg")
+
+    # "Stream #0:0: Video: h264 (Main), yuvj420p(pc), 1920x1080 [SAR 1:1], 25 fps, ..."
+    _STREAM_PATTERN: Final[re.Pattern] = re.compile(
+        r"Stream #\d+:\d+.*?: Video: (\w+)[^,]*(?:, ([\w()]+))?.*?, (\d{2,5})x(\d{2,5})(?:.*?, ([\d.]+) fps)?")
+
+    _REGISTRY: Dict[str, Type["CaptureBackend"]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        CaptureBackend._REGISTRY[cls.name] = cls
+
+    def __init__(self, sources: Optional[List[str]] = None):
+        """
+        Args:
+            sources (Optional[List[str]]): Fixed device list for backends that cannot
+                enumerate hardware (RTSP URLs, file paths, lavfi sources)
+        """
+        self.sources: List[str] = list(sources or [])
+
+    def input_args(self, device: str, resolution: str, framerate: int,
+                   input_format: Optional[str] = None) -> List[str]:
+        """
+        Build the FFmpeg input options, ending with `-i <input>`.
+
+        Args:
+            device (str): Device name, URL, path or lavfi source
+            resolution (str): Requested capture size, e.g. "1280x720"
+            framerate (int): Requested capture frame rate
+            input_format (Optional[str]): Format to request from the device
+                ("h264", "mjpeg", "yuyv422"...), None for the device default
+
+        Returns:
+            List[str]: FFmpeg arguments to place before the output options
+        """
+        raise NotImplementedError
+
+    def list_capabilities_command(self, ffmpeg_path: str, device: str) -> Optional[List[str]]:
+        """
+        Command whose stderr lists the formats/resolutions/frame rates of a device,
+        or None if the backend cannot be probed.
+        """
+        return None
+
+    def parse_capabilities(self, output: str) -> List[Dict[str, Any]]:
+        """
+        Extract capture modes from the output of list_capabilities_command().
+        The default reads the stream line FFmpeg prints when it opens an input.
+        """
+        modes: List[Dict[str, Any]] = []
+        for codec, pixel_format, width, height, fps in self._STREAM_PATTERN.findall(output):
+            compressed = codec in self.COMPRESSED_FORMATS
+            modes.append({
+                "codec": codec if compressed else None,
+                "pixel_format": None if compressed else (pixel_format or codec),
+                "width": int(width), "height": int(height),
+                "min_fps": float(fps) if fps else None,
+                "max_fps": float(fps) if fps else None,
+            })
+        return modes
+
+    def list_devices_command(self, ffmpeg_path: str) -> Optional[List[str]]:
+        """
+        Command whose stderr lists the devices, or None if the backend
+        enumerates without running FFmpeg.
+        """
+        return None
+
+    def parse_device_list(self, output: str) -> List[str]:
+        """Extract device names from the output of list_devices_command()."""
+        return []
+
+    def list_devices(self) -> List[str]:
+        """Enumerate devices without FFmpeg (used when list_devices_command() is None)."""
+        return list(self.sources)
+
+    @staticmethod
+    def get(name: str, sources: Optional[List[str]] = None) -> "CaptureBackend":
+        """
+        Create a backend by name ('dshow', 'v4l2', 'rtsp', 'file', 'lavfi').
+
+        Raises:
+            ValueError: If the backend name is unknown
+        """
+        backend_cls = CaptureBackend._REGISTRY.get(name)
+        if backend_cls is None:
+            raise ValueError(f"Unknown capture backend: {name}")
+        return backend_cls(sources)
+
+    @staticmethod
+    def default() -> "CaptureBackend":
+        """Return the local camera backend for the current platform."""
+        if sys.platform.startswith("win"):
+            return DShowBackend()
+        return V4L2Backend()
+
+
+class DShowBackend(CaptureBackend):
+    """DirectShow cameras (Windows)."""
+
+    name = "dshow"
+    supports_opencv_probe = True
+
+    # Regex pattern for extracting device names from FFmpeg output
+    _DEVICE_PATTERN: Final[re.Pattern] = re.compile(r'\"(.+?)\".*\(video\)')
+    # "vcodec=mjpeg  min s=1280x720 fps=5 max s=1280x720 fps=30" / "pixel_format=yuyv422 ..."
+    _OPTION_PATTERN: Final[re.Pattern] = re.compile(
+        r"(vcodec|pixel_format)=(\w+)\s+min s=(\d+)x(\d+) fps=([\d.]+)\s+max s=(\d+)x(\d+) fps=([\d.]+)")
+
+    def input_args(self, device: str, resolution: str, framerate: int,
+                   input_format: Optional[str] = None) -> List[str]:
+        format_args: List[str] = []
+        if input_format:
+            option = "-vcodec" if input_format in self.COMPRESSED_FORMATS else "-pixel_format"
+            format_args = [option, input_format]
+        return [
+            "-f", "dshow",
+            *format_args,
+            "-video_size", resolution,
+            "-framerate", str(framerate),
+            "-rtbufsize", "200M",
+            "-fflags", "+genpts",
+            "-use_wallclock_as_timestamps", "1",
+            "-thread_queue_size", "512",
+            "-i", f"video={device}"
+        ]
+
+    def list_devices_command(self, ffmpeg_path: str) -> Optional[List[str]]:
+        return [ffmpeg_path, "-list_devices", "true", "-f", "dshow", "-i", "dummy"]
+
+    def parse_device_list(self, output: str) -> List[str]:
+        if not output:
+            return []
+        return self._DEVICE_PATTERN.findall(output)
+
+    def list_capabilities_command(self, ffmpeg_path: str, device: str) -> Optional[List[str]]:
+        return [ffmpeg_path, "-hide_banner", "-list_options", "true", "-f", "dshow", "-i", f"video={device}"]
+
+    def parse_capabilities(self, output: str) -> List[Dict[str, Any]]:
+        modes: List[Dict[str, Any]] = []
+        for kind, fmt, min_w, min_h, min_fps, max_w, max_h, max_fps in self._OPTION_PATTERN.findall(output):
+            # Discrete sizes are reported with min s == max s
+            for width, height in {(int(min_w), int(min_h)), (int(max_w), int(max_h))}:
+                modes.append({
+                    "codec": fmt if kind == "vcodec" else None,
+                    "pixel_format": fmt if kind == "pixel_format" else None,
+                    "width": width, "height": height,
+                    "min_fps": float(min_fps), "max_fps": float(max_fps),
+                })
+        return modes
+
+
+class V4L2Backend(CaptureBackend):
+    """Video4Linux2 cameras (/dev/videoN)."""
+
+    name = "v4l2"
+    supports_opencv_probe = True
+
+    # "Compressed:       mjpeg :          Motion-JPEG : 640x480 1280x720"
+    _FORMAT_PATTERN: Final[re.Pattern] = re.compile(r"(Raw|Compressed)\s*:\s*(\w+)\s*:[^:]*:\s*(.*)$",
+                                                    re.MULTILINE)
+    _SIZE_PATTERN: Final[re.Pattern] = re.compile(r"\b(\d+)x(\d+)\b")
+
+    def input_args(self, device: str, resolution: str, framerate: int,
+                   input_format: Optional[str] = None) -> List[str]:
+        return [
+            "-f", "v4l2",
+            *(["-input_format", input_format] if input_format else []),
+            "-video_size", resolution,
+            "-framerate", str(framerate),
+            "-fflags", "+genpts",
+            "-use_wallclock_as_timestamps", "1",
+            "-thread_queue_size", "512",
+            "-i", device
+        ]
+
+    def list_devices(self) -> List[str]:
+        if self.sources:
+            return list(self.sources)
+        devices = glob.glob("/dev/video*")
+        return sorted(devices, key=lambda path: int(re.sub(r"\D", "", path) or 0))
+
+    def list_capabilities_command(self, ffmpeg_path: str, device: str) -> Optional[List[str]]:
+        return [ffmpeg_path, "-hide_banner", "-f", "v4l2", "-list_formats", "all", "-i", device]
+
+    def parse_capabilities(self, output: str) -> List[Dict[str, Any]]:
+        # V4L2 lists sizes per format but not frame rates
+        modes: List[Dict[str, Any]] = []
+        for kind, fmt, sizes in self._FORMAT_PATTERN.findall(output):
+            for width, height in self._SIZE_PATTERN.findall(sizes):
+                modes.append({
+                    "codec": fmt if kind == "Compressed" else None,
+                    "pixel_format": fmt if kind == "Raw" else None,
+                    "width": int(width), "height": int(height),
+                    "min_fps": None, "max_fps": None,
+                })
+        return modes
+
+
+class RTSPBackend(CaptureBackend):
+    """Network cameras; devices are rtsp:// URLs given in `sources`."""
+
+    name = "rtsp"
+    fixed_resolution = True
+
+    def input_args(self, device: str, resolution: str, framerate: int,
+                   input_format: Optional[str] = None) -> List[str]:
+        # Resolution and frame rate are decided by the camera, the encoder rescales
+        return [
+            "-rtsp_transport", "tcp",
+            "-fflags", "+genpts",
+            "-use_wallclock_as_timestamps", "1",
+            "-thread_queue_size", "512",
+            "-i", device
+        ]
+
+    def list_capabilities_command(self, ffmpeg_path: str, device: str) -> Optional[List[str]]:
+        # Opening the stream without an output prints its codec/size/fps and exits
+        return [ffmpeg_path, "-hide_banner", "-rtsp_transport", "tcp", "-i", device]
+
+
+class FileBackend(CaptureBackend):
+    """Video files played in a loop at native speed, as if they were cameras."""
+
+    name = "file"
+    is_live = False
+
+    def input_args(self, device: str, resolution: str, framerate: int,
+                   input_format: Optional[str] = None) -> List[str]:
+        return ["-re", "-stream_loop", "-1", "-i", device]
+
+
+class LavfiBackend(CaptureBackend):
+    """
+    FFmpeg synthetic test sources (testsrc2, smptebars, ...).
+
+    A device is either a full lavfi graph ("testsrc2=size=640x480:rate=15") or a
+    bare source name that gets the recorder's resolution and frame rate. A "#N"
+    suffix is ignored so several identical synthetic cameras get distinct names.
+    """
+
+    name = "lavfi"
+    is_live = False
+
+    def __init__(self, sources: Optional[List[str]] = None, count: int = 0, source: str = "testsrc2"):
+        """
+        Args:
+            sources (Optional[List[str]]): Explicit lavfi sources
+            count (int): Number of extra synthetic cameras named "<source>#i"
+            source (str): lavfi source used for the generated cameras
+        """
+        super().__init__(sources)
+        self.sources += [f"{source}#{i}" for i in range(count)]
+
+    def input_args(self, device: str, resolution: str, framerate: int,
+                   input_format: Optional[str] = None) -> List[str]:
+        graph = device.split("#", 1)[0]
+        if "=" not in graph:
+            graph = f"{graph}=size={resolution}:rate={framerate}"
+        return ["-re", "-f", "lavfi", "-i", graph]
@@ -0,0 +1,176 @@
+import json
+import math
+import os
+import shutil
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, Final, List, Optional
+
+try:
+    from utils.KeyframeIndex import KeyframeIndex
+    from utils.VideoDeviceDetection import VideoDeviceDetection
+    from utils.system_log import SystemLog
+except ModuleNotFoundError:
+    from KeyframeIndex import KeyframeIndex
+    from VideoDeviceDetection import VideoDeviceDetection
+    from system_log import SystemLog
+
+
+class ContactSheet:
+    """
+    Thumbnails and a tiled contact sheet of a recording, for quick review.
+
+    Only keyframes are decoded (`-skip_frame nokey`): one thumbnail is taken
+    from the first keyframe of every `interval` seconds, and the same pass
+    tiles a (possibly sparser) selection into one image. Results are cached
+    next to the recording:
+
+        video.mp4.thumbs/
+            thumb_0001.jpg ...  one per interval
+            sheet.jpg           contact sheet
+            index.json          source path/mtime/size, settings, thumbnail timestamps
+
+    and reused while the recording and the settings do not change.
+    """
+
+    CACHE_SUFFIX: Final[str] = ".thumbs"
+    INDEX_FILE: Final[str] = "index.json"
+    SHEET_FILE: Final[str] = "sheet.jpg"
+    # A taller sheet would exceed what image viewers (and JPEG) handle
+    MAX_SHEET_TILES: Final[int] = 100
+
+    log: Final[SystemLog] = SystemLog(__name__)
+
+    @classmethod
+    def cache_dir(cls, path: str) -> str:
+        return os.path.abspath(path) + cls.CACHE_SUFFIX
+
+    @classmethod
+    def remove_sidecars(cls, path: str) -> None:
+        """Delete the thumbnails and keyframe index of a recording (once it is deleted or moved)."""
+        shutil.rmtree(cls.cache_dir(path), ignore_errors=True)
+        try:
+            os.remove(KeyframeIndex.sidecar_path(os.path.abspath(path)))
+        except OSError:
+            pass
+
+    @staticmethod
+    def select_times(keyframes: List[float], interval: float) -> List[float]:
+        """
+        Keyframes FFmpeg's select filter keeps with
+        `isnan(prev_selected_t)+gte(t-prev_selected_t,interval)`.
+        """
+        selected: List[float] = []
+        for keyframe in keyframes:
+            if not selected or keyframe - selected[-1] >= interval:
+                selected.append(keyframe)
+        return selected
+
+    @classmethod
+    def load(cls, path: str, interval: float = 10.0, width: int = 320,
+             columns: int = 5) -> Optional[Dict[str, Any]]:
+        """Cached result for `path` with these settings, or None."""
+        try:
+            with open(os.path.join(cls.cache_dir(path), cls.INDEX_FILE), encoding="utf-8") as f:
+                data = json.load(f)
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if (data.get("mtime") != stat.st_mtime or data.get("size") != stat.st_size
+                or data.get("settings") != {"interval": interval, "width": width, "columns": columns}):
+            return None
+        return data
+
+    @classmethod
+    def generate(
+        cls,
+        path: str,
+        interval: float = 10.0,
+        width: int = 320,
+        columns: int = 5,
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH
+    ) -> Dict[str, Any]:
+        """
+        Thumbnails every `interval` seconds plus the contact sheet, from cache when possible.
+
+        Args:
+            path: Recording (any file FFmpeg reads)
+            interval: Seconds between thumbnails (at least the keyframe interval)
+            width: Thumbnail width in pixels (height keeps the aspect ratio)
+            columns: Tiles per row of the contact sheet
+
+        Returns:
+            Dict[str, Any]: Contents of index.json: sheet, thumbnails [{file, time}], settings, ...
+
+        Raises:
+            RuntimeError: If FFmpeg fails
+        """
+        cached = cls.load(path, interval, width, columns)
+        if cached:
+            return cached
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        index = KeyframeIndex.load(path, ffmpeg_path)
+        times = cls.select_times(index.keyframes, interval)
+        if not times:
+            raise RuntimeError(f"No keyframes found in {path}")
+
+        # The sheet gets at most MAX_SHEET_TILES tiles: sparser selection for long recordings
+        sheet_interval = interval
+        if len(times) > cls.MAX_SHEET_TILES:
+            sheet_interval = max(interval, (times[-1] - times[0]) / cls.MAX_SHEET_TILES)
+            while len(cls.select_times(index.keyframes, sheet_interval)) > cls.MAX_SHEET_TILES:
+                sheet_interval *= 1.1
+        sheet_tiles = len(cls.select_times(index.keyframes, sheet_interval))
+        rows = max(1, math.ceil(sheet_tiles / columns))
+
+        cache_dir = cls.cache_dir(path)
+        work_dir = cache_dir + ".tmp"
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir)
+
+        select = "select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{})'"
+        graph = ";".join([
+            f"[0:v]scale={width}:-2,split=2[all][forsheet]",
+            f"[all]{select.format(interval)}[thumbs]",
+            f"[forsheet]{select.format(sheet_interval)},tile={columns}x{rows}[sheet]"
+        ])
+        cmd = [
+            ffmpeg_path,
+            "-hide_banner", "-loglevel", "error",
+            "-skip_frame", "nokey",  # Decoder drops everything but keyframes
+            "-i", path,
+            "-filter_complex", graph,
+            "-map", "[thumbs]", "-fps_mode", "vfr", "-q:v", "4",
+            os.path.join(work_dir, "thumb_%04d.jpg"),
+            "-map", "[sheet]", "-frames:v", "1", "-q:v", "4",
+            os.path.join(work_dir, cls.SHEET_FILE)
+        ]
+        started = datetime.now()
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise RuntimeError(f"Could not create thumbnails of {path}: {result.stderr.strip()}")
+
+        thumbnails = sorted(name for name in os.listdir(work_dir) if name.startswith("thumb_"))
+        data = {
+            "path": path,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "settings": {"interval": interval, "width": width, "columns": columns},
+            "sheet": os.path.join(cache_dir, cls.SHEET_FILE),
+            "sheet_interval": sheet_interval,
+            "thumbnails": [{"file": os.path.join(cache_dir, name), "time": time}
+                           for name, time in zip(thumbnails, times)],
+            "generated": datetime.now().isoformat(),
+            "seconds": (datetime.now() - started).total_seconds()
+        }
+        with open(os.path.join(work_dir, cls.INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        # Swap in the new cache only once it is complete
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(work_dir, cache_dir)
+        cls.log.info(f"Thumbnails of {path}: {len(thumbnails)} in {data['seconds']:.2f}s")
+        return data
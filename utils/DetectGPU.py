@@ -1,7 +1,16 @@
-import winreg
-from typing import Optional, Final, Dict
+try:
+    import winreg
+except ImportError:
+    # Not on Windows: no registry, detection falls back to CPU
+    winreg = None
+from typing import Optional, Final
 from functools import lru_cache
 
+try:
+    from utils.EncoderProfiles import EncoderProfiles
+except ModuleNotFoundError:
+    from EncoderProfiles import EncoderProfiles
+
 
 class DetectGPU:
     """
@@ -18,12 +27,6 @@ class DetectGPU:
     NVIDIA_REG_PATH: Final[str] = r"SOFTWARE\NVIDIA Corporation\Global\NvControlPanel2"
     AMD_REG_PATH: Final[str] = r"SOFTWARE\AMD"
     
-    _CODEC_MAP: Final[Dict[str, str]] = {
-        "nvidia": "hevc_nvenc",    # H.265 NVIDIA NVENC encoder
-        "amd": "hevc_amf",         # H.265 AMD AMF encoder  
-        "cpu": "libx265"           # H.265 software encoder
-    }
-    
     @staticmethod
     @lru_cache(maxsize=1)
     def detect_gpu_vendor() -> str:
@@ -53,6 +56,8 @@ class DetectGPU:
         Returns:
             bool: True if registry key exists, False otherwise
         """
+        if winreg is None:
+            return False
         try:
             with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, registry_path):
                 return True
@@ -60,12 +65,13 @@ class DetectGPU:
             return False
     
     @staticmethod
-    def get_optimal_codec(vendor: Optional[str] = None) -> str:
+    def get_optimal_codec(vendor: Optional[str] = None, use_case: str = "archive") -> str:
         """
         Get optimal FFmpeg codec based on hardware capabilities.
         
         Args:
             vendor (Optional[str]): GPU vendor override. Auto-detects if None
+            use_case (str): 'live', 'clip' or 'archive' (see EncoderProfiles)
             
         Returns:
             str: Optimal FFmpeg codec string for the detected/specified hardware
@@ -77,4 +83,4 @@ class DetectGPU:
         if vendor is None:
             vendor = DetectGPU.detect_gpu_vendor()
         
-        return DetectGPU._CODEC_MAP.get(vendor, "libx265")
+        return EncoderProfiles.codec_for(vendor, use_case)
@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import subprocess
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Final, List, Optional
+
+try:
+    import psutil  # Optional: CPU time of the encoder on Windows
+except ImportError:
+    psutil = None
+
+try:
+    from utils.EncoderProfiles import EncoderProfiles
+    from utils.FFmpegProgress import FFmpegProgress
+    from utils.VideoDeviceDetection import VideoDeviceDetection
+    from utils.system_log import SystemLog
+except ModuleNotFoundError:
+    from EncoderProfiles import EncoderProfiles
+    from FFmpegProgress import FFmpegProgress
+    from VideoDeviceDetection import VideoDeviceDetection
+    from system_log import SystemLog
+
+
+class EncoderBenchmark:
+    """
+    Optional startup calibration that picks encoders by measured throughput.
+
+    For every encoder FFmpeg reports that has a profile in EncoderProfiles, a
+    short `lavfi testsrc2` clip is encoded to the null muxer at the target
+    resolution/fps. Realtime factor and CPU cost are measured and a ranking
+    per use case is stored on disk. Recorders read the cached choice through
+    cached_codec(), so normal startup never runs the benchmark.
+
+    Ranking: encoders that keep up with realtime come first, cheapest in CPU
+    first; if none keeps up, the fastest one wins.
+    """
+
+    CACHE_FILE: Final[str] = os.path.join("cache", "encoder_benchmark.json")
+    _ENCODER_PATTERN: Final[re.Pattern] = re.compile(r"^\s*V[\w.]{5}\s+(\S+)", re.MULTILINE)
+
+    log: Final[SystemLog] = SystemLog(__name__)
+
+    @staticmethod
+    def list_available_encoders(ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH) -> List[str]:
+        """
+        Video encoders compiled into FFmpeg that also have a profile.
+
+        Returns:
+            List[str]: Encoder names, e.g. ['libx264', 'h264_nvenc', ...]
+        """
+        try:
+            result = subprocess.run(
+                [ffmpeg_path, "-hide_banner", "-encoders"],
+                capture_output=True, text=True, timeout=10, check=False
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            EncoderBenchmark.log.error(f"Could not list FFmpeg encoders: {e}")
+            return []
+        reported = set(EncoderBenchmark._ENCODER_PATTERN.findall(result.stdout))
+        return [codec for codec in EncoderProfiles.codecs() if codec in reported]
+
+    @staticmethod
+    def benchmark_encoder(
+        codec: str,
+        use_case: str = "live",
+        resolution: str = "1280x720",
+        framerate: int = 30,
+        seconds: int = 5,
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH
+    ) -> Dict[str, Any]:
+        """
+        Encode `seconds` of a synthetic source as fast as possible with one encoder.
+
+        Returns:
+            Dict[str, Any]: codec, ok, realtime_factor (media seconds per wall second),
+            cpu_per_second (CPU seconds per media second, None if unmeasurable), error
+        """
+        width, height = resolution.lower().split("x")
+        cmd = [
+            ffmpeg_path, "-hide_banner", "-nostats", "-progress", "pipe:1",
+            *EncoderProfiles.global_args(codec, use_case),
+            "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={framerate}",
+            "-t", str(seconds),
+            "-vf", ",".join(EncoderProfiles.output_filters(codec, use_case)),
+            *EncoderProfiles.encoder_args(codec, use_case, framerate),
+            "-an", "-f", "null", "-"
+        ]
+        result: Dict[str, Any] = {"codec": codec, "ok": False, "realtime_factor": 0.0,
+                                  "cpu_per_second": None, "error": None}
+
+        children_before = os.times()
+        started = time.perf_counter()
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       stdin=subprocess.DEVNULL, text=True)
+        except OSError as e:
+            result["error"] = str(e)
+            return result
+
+        progress = FFmpegProgress(process.stdout, process.stderr)
+        progress.start()
+        cpu_seconds = EncoderBenchmark._wait_and_measure_cpu(process, timeout=seconds * 20 + 10)
+        wall = time.perf_counter() - started
+        progress.join()
+
+        if cpu_seconds is None and os.name != "nt":
+            children_after = os.times()
+            cpu_seconds = ((children_after.children_user - children_before.children_user)
+                           + (children_after.children_system - children_before.children_system))
+
+        frames = progress.snapshot()["frame"]
+        if process.returncode != 0 or frames == 0:
+            result["error"] = progress.stderr_tail()[-500:] or f"exit code {process.returncode}"
+            return result
+
+        media_seconds = frames / framerate
+        result["ok"] = True
+        result["realtime_factor"] = media_seconds / wall if wall > 0 else 0.0
+        if cpu_seconds is not None:
+            result["cpu_per_second"] = cpu_seconds / media_seconds
+        return result
+
+    @staticmethod
+    def _wait_and_measure_cpu(process: subprocess.Popen, timeout: float) -> Optional[float]:
+        """Wait for the process; return its CPU seconds when psutil can sample them."""
+        cpu_seconds: Optional[float] = None
+        handle = None
+        if psutil is not None:
+            try:
+                handle = psutil.Process(process.pid)
+            except psutil.Error:
+                handle = None
+
+        deadline = time.monotonic() + timeout
+        while process.poll() is None:
+            if time.monotonic() > deadline:
+                process.kill()
+                process.wait()
+                break
+            if handle is not None:
+                try:
+                    times = handle.cpu_times()
+                    cpu_seconds = times.user + times.system
+                except psutil.Error:
+                    pass
+            time.sleep(0.05)
+        return cpu_seconds
+
+    @staticmethod
+    def rank(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Order benchmark results best first (see class docstring)."""
+        usable = [r for r in results if r["ok"]]
+        realtime = [r for r in usable if r["realtime_factor"] >= 1.0]
+        if realtime:
+            realtime.sort(key=lambda r: (r["cpu_per_second"] if r["cpu_per_second"] is not None
+                                         else float("inf"), -r["realtime_factor"]))
+            slow = sorted((r for r in usable if r not in realtime), key=lambda r: -r["realtime_factor"])
+            ranked = realtime + slow
+        else:
+            ranked = sorted(usable, key=lambda r: -r["realtime_factor"])
+        return ranked + [r for r in results if not r["ok"]]
+
+    @staticmethod
+    def calibrate(
+        resolution: str = "1280x720",
+        framerate: int = 30,
+        seconds: int = 5,
+        use_cases: tuple[str, ...] = EncoderProfiles.USE_CASES,
+        ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH,
+        cache_file: str = CACHE_FILE
+    ) -> Dict[str, Any]:
+        """
+        Benchmark every available encoder for each use case and persist the ranking.
+
+        Only encoders of the codec family used by that use case are compared
+        (H.264 for live, HEVC for clip/archive).
+
+        Returns:
+            Dict[str, Any]: The data written to `cache_file`
+        """
+        available = EncoderBenchmark.list_available_encoders(ffmpeg_path)
+        EncoderBenchmark.log.info(f"Benchmarking encoders: {', '.join(available) or 'none'}")
+
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        selection: Dict[str, str] = {}
+        for use_case in use_cases:
+            candidates = set(EncoderProfiles.vendor_codecs(use_case).values())
+            measured = [
+                EncoderBenchmark.benchmark_encoder(codec, use_case, resolution, framerate, seconds, ffmpeg_path)
+                for codec in available if codec in candidates
+            ]
+            ranked = EncoderBenchmark.rank(measured)
+            results[use_case] = ranked
+            if ranked and ranked[0]["ok"]:
+                selection[use_case] = ranked[0]["codec"]
+                EncoderBenchmark.log.info(
+                    f"[{use_case}] selected {ranked[0]['codec']} "
+                    f"({ranked[0]['realtime_factor']:.2f}x realtime)")
+
+        data = {
+            "created": datetime.now().isoformat(),
+            "ffmpeg_path": ffmpeg_path,
+            "ffmpeg_mtime": EncoderBenchmark._mtime(ffmpeg_path),
+            "resolution": resolution,
+            "framerate": framerate,
+            "selection": selection,
+            "results": results
+        }
+        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+        EncoderBenchmark.cached_codec.cache_clear()
+        return data
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def cached_codec(use_case: str, cache_file: str = CACHE_FILE) -> Optional[str]:
+        """
+        Codec selected by the last calibration for a use case, or None if there is
+        no valid cache (never calibrated, or FFmpeg changed since).
+        """
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        ffmpeg_path = data.get("ffmpeg_path")
+        if ffmpeg_path != VideoDeviceDetection.FFMPEG_PATH or data.get("ffmpeg_mtime") != EncoderBenchmark._mtime(ffmpeg_path):
+            EncoderBenchmark.log.warning("Encoder benchmark cache is stale, run EncoderBenchmark.calibrate()")
+            return None
+        return data.get("selection", {}).get(use_case)
+
+
+if __name__ == "__main__":
+    log = SystemLog("EncoderBenchmarkTest")
+    log.info("=== Encoder calibration ===")
+    calibration = EncoderBenchmark.calibrate()
+    for case, ranking in calibration["results"].items():
+        log.info(f"Use case: {case}")
+        for entry in ranking:
+            if entry["ok"]:
+                cpu = f"{entry['cpu_per_second']:.2f}" if entry["cpu_per_second"] is not None else "N/A"
+                log.info(f"  {entry['codec']}: {entry['realtime_factor']:.2f}x realtime, cpu/s={cpu}")
+            else:
+                log.info(f"  {entry['codec']}: FAILED")
@@ -0,0 +1,252 @@
+from typing import Any, Dict, Final, List, Optional
+
+
+class EncoderProfiles:
+    """
+    Single registry of encoder settings shared by every recorder.
+
+    Maps a hardware vendor to the codec used for each use case, and each
+    (codec, use case) pair to its tuned FFmpeg parameters: preset, rate
+    control, GOP, threads and low-latency flags.
+
+    Use cases:
+        live:    camera recording, lowest latency, keyframe every second
+        clip:    clips cut from files, high quality, throughput over latency
+        archive: long-term storage, smaller files, slower presets allowed
+
+    Profile fields:
+        args:        encoder options; "{gop}" is replaced by the GOP in frames
+        gop_seconds: keyframe interval in seconds (None = encoder default)
+        pix_fmt:     pixel format fed to the encoder
+        hw:          "vaapi" when frames must be uploaded to the GPU
+                     (adds -vaapi_device and the hwupload filter)
+    """
+
+    USE_CASES: Final[tuple[str, ...]] = ("live", "clip", "archive")
+
+    # vendor -> use case -> codec
+    VENDOR_CODECS: Final[Dict[str, Dict[str, str]]] = {
+        "nvidia": {"live": "h264_nvenc", "clip": "hevc_nvenc", "archive": "hevc_nvenc"},
+        "amd": {"live": "h264_amf", "clip": "hevc_amf", "archive": "hevc_amf"},
+        "intel": {"live": "h264_qsv", "clip": "hevc_qsv", "archive": "hevc_qsv"},
+        "vaapi": {"live": "h264_vaapi", "clip": "hevc_vaapi", "archive": "hevc_vaapi"},
+        "cpu": {"live": "libx264", "clip": "libx265", "archive": "libx265"},
+    }
+
+    VAAPI_DEVICE: Final[str] = "/dev/dri/renderD128"
+
+    # Cheapest settings per codec, applied on top of any profile with fast=True
+    # (used when a recorder falls behind realtime)
+    FAST_OVERRIDES: Final[Dict[str, List[str]]] = {
+        "h264_nvenc": ["-preset", "p1"],
+        "hevc_nvenc": ["-preset", "p1"],
+        "h264_amf": ["-quality", "speed"],
+        "hevc_amf": ["-quality", "speed"],
+        "h264_qsv": ["-preset", "veryfast"],
+        "hevc_qsv": ["-preset", "veryfast"],
+        "libx264": ["-preset", "ultrafast"],
+        "libx265": ["-preset", "ultrafast"],
+    }
+
+    _PROFILES: Final[Dict[str, Dict[str, Dict[str, Any]]]] = {
+        # ---------------- NVIDIA NVENC ----------------
+        "h264_nvenc": {
+            "live": {"args": ["-preset", "p2", "-tune", "ll", "-rc", "vbr", "-cq", "23",
+                              "-bf", "0", "-g", "{gop}", "-zerolatency", "1", "-delay", "0",
+                              "-no-scenecut", "1"],
+                     "gop_seconds": 1},
+            "clip": {"args": ["-preset", "p5", "-tune", "hq", "-rc", "vbr", "-cq", "19"]},
+            "archive": {"args": ["-preset", "p6", "-tune", "hq", "-rc", "vbr", "-cq", "26",
+                                 "-g", "{gop}"],
+                        "gop_seconds": 2},
+        },
+        "hevc_nvenc": {
+            "live": {"args": ["-preset", "p2", "-tune", "ll", "-rc", "vbr", "-cq", "25",
+                              "-bf", "0", "-g", "{gop}", "-zerolatency", "1", "-delay", "0",
+                              "-no-scenecut", "1"],
+                     "gop_seconds": 1},
+            "clip": {"args": ["-preset", "p5", "-rc", "constqp", "-qp", "0"]},
+            "archive": {"args": ["-preset", "p6", "-tune", "hq", "-rc", "vbr", "-cq", "28",
+                                 "-g", "{gop}"],
+                        "gop_seconds": 2},
+        },
+        # ---------------- AMD AMF ----------------
+        "h264_amf": {
+            "live": {"args": ["-usage", "ultralowlatency", "-quality", "speed", "-rc", "vbr_peak",
+                              "-preanalysis", "0", "-vbaq", "0", "-enforce_hrd", "0",
+                              "-filler_data", "0", "-bf", "0", "-g", "{gop}"],
+                     "gop_seconds": 1},
+            "clip": {"args": ["-usage", "transcoding", "-quality", "quality"]},
+            "archive": {"args": ["-usage", "transcoding", "-quality", "balanced", "-g", "{gop}"],
+                        "gop_seconds": 2},
+        },
+        "hevc_amf": {
+            "live": {"args": ["-usage", "ultralowlatency", "-quality", "speed", "-rc", "vbr_peak",
+                              "-preanalysis", "0", "-vbaq", "0", "-enforce_hrd", "0",
+                              "-filler_data", "0", "-g", "{gop}"],
+                     "gop_seconds": 1},
+            "clip": {"args": ["-quality", "quality", "-usage", "transcoding"]},
+            "archive": {"args": ["-usage", "transcoding", "-quality", "balanced", "-g", "{gop}"],
+                        "gop_seconds": 2},
+        },
+        # ---------------- Intel Quick Sync ----------------
+        "h264_qsv": {
+            "live": {"args": ["-preset", "veryfast", "-look_ahead", "0", "-async_depth", "1",
+                              "-global_quality", "25", "-bf", "0", "-g", "{gop}"],
+                     "gop_seconds": 1, "pix_fmt": "nv12"},
+            "clip": {"args": ["-preset", "slow", "-global_quality", "20"], "pix_fmt": "nv12"},
+            "archive": {"args": ["-preset", "medium", "-global_quality", "27", "-g", "{gop}"],
+                        "gop_seconds": 2, "pix_fmt": "nv12"},
+        },
+        "hevc_qsv": {
+            "live": {"args": ["-preset", "veryfast", "-look_ahead", "0", "-async_depth", "1",
+                              "-global_quality", "27", "-g", "{gop}"],
+                     "gop_seconds": 1, "pix_fmt": "nv12"},
+            "clip": {"args": ["-preset", "slow", "-global_quality", "20"], "pix_fmt": "nv12"},
+            "archive": {"args": ["-preset", "medium", "-global_quality", "28", "-g", "{gop}"],
+                        "gop_seconds": 2, "pix_fmt": "nv12"},
+        },
+        # ---------------- VAAPI (Linux) ----------------
+        "h264_vaapi": {
+            "live": {"args": ["-rc_mode", "CQP", "-qp", "24", "-bf", "0", "-g", "{gop}"],
+                     "gop_seconds": 1, "hw": "vaapi"},
+            "clip": {"args": ["-rc_mode", "CQP", "-qp", "19"], "hw": "vaapi"},
+            "archive": {"args": ["-rc_mode", "CQP", "-qp", "27", "-g", "{gop}"],
+                        "gop_seconds": 2, "hw": "vaapi"},
+        },
+        "hevc_vaapi": {
+            "live": {"args": ["-rc_mode", "CQP", "-qp", "26", "-g", "{gop}"],
+                     "gop_seconds": 1, "hw": "vaapi"},
+            "clip": {"args": ["-rc_mode", "CQP", "-qp", "20"], "hw": "vaapi"},
+            "archive": {"args": ["-rc_mode", "CQP", "-qp", "28", "-g", "{gop}"],
+                        "gop_seconds": 2, "hw": "vaapi"},
+        },
+        # ---------------- CPU ----------------
+        "libx264": {
+            "live": {"args": ["-preset", "veryfast", "-tune", "zerolatency", "-crf", "23",
+                              "-g", "{gop}", "-sc_threshold", "0", "-threads", "0"],
+                     "gop_seconds": 1},
+            "clip": {"args": ["-preset", "fast", "-crf", "18", "-threads", "0"]},
+            "archive": {"args": ["-preset", "medium", "-crf", "26", "-g", "{gop}", "-threads", "0"],
+                        "gop_seconds": 2},
+        },
+        "libx265": {
+            "live": {"args": ["-preset", "ultrafast", "-tune", "zerolatency", "-crf", "26",
+                              "-x265-params", "keyint={gop}:min-keyint={gop}:no-scenecut=1"],
+                     "gop_seconds": 1},
+            "clip": {"args": ["-preset", "veryfast", "-crf", "18"]},
+            "archive": {"args": ["-preset", "medium", "-crf", "28",
+                                 "-x265-params", "keyint={gop}:min-keyint={gop}"],
+                        "gop_seconds": 2},
+        },
+    }
+
+    @staticmethod
+    def codecs() -> List[str]:
+        """All codecs that have a profile."""
+        return list(EncoderProfiles._PROFILES)
+
+    @staticmethod
+    def vendor_codecs(use_case: str) -> Dict[str, str]:
+        """
+        Vendor -> codec map for one use case.
+
+        Example:
+            >>> EncoderProfiles.vendor_codecs("live")["nvidia"]
+            'h264_nvenc'
+        """
+        EncoderProfiles._check_use_case(use_case)
+        return {vendor: codecs[use_case] for vendor, codecs in EncoderProfiles.VENDOR_CODECS.items()}
+
+    @staticmethod
+    def codec_for(vendor: str, use_case: str) -> str:
+        """Codec for a vendor and use case, falling back to the CPU encoder."""
+        EncoderProfiles._check_use_case(use_case)
+        codecs = EncoderProfiles.VENDOR_CODECS.get(vendor, EncoderProfiles.VENDOR_CODECS["cpu"])
+        return codecs[use_case]
+
+    @staticmethod
+    def vendor_of(codec: str) -> str:
+        """
+        Vendor (hardware encoder family) of a codec; "cpu" for software and unknown codecs.
+
+        Example:
+            >>> EncoderProfiles.vendor_of("hevc_nvenc")
+            'nvidia'
+        """
+        for vendor, codecs in EncoderProfiles.VENDOR_CODECS.items():
+            if codec in codecs.values():
+                return vendor
+        return "cpu"
+
+    @staticmethod
+    def get(codec: str, use_case: str) -> Dict[str, Any]:
+        """
+        Raw profile for a codec and use case.
+
+        Raises:
+            ValueError: If the codec or use case has no profile
+        """
+        EncoderProfiles._check_use_case(use_case)
+        profiles = EncoderProfiles._PROFILES.get(codec)
+        if profiles is None:
+            raise ValueError(f"No encoder profile for codec: {codec}")
+        return profiles[use_case]
+
+    @staticmethod
+    def encoder_args(codec: str, use_case: str, framerate: float = 30, fast: bool = False) -> List[str]:
+        """
+        FFmpeg output options for a codec/use case, starting with `-c:v`.
+
+        Args:
+            codec (str): FFmpeg encoder name
+            use_case (str): 'live', 'clip' or 'archive'
+            framerate (float): Output frame rate, used to express the GOP in frames
+            fast (bool): Apply FAST_OVERRIDES (cheapest preset for the codec)
+
+        Returns:
+            List[str]: Arguments ready to append to an FFmpeg command
+        """
+        profile = EncoderProfiles.get(codec, use_case)
+        gop_seconds: Optional[float] = profile.get("gop_seconds")
+        gop = str(max(1, int(round(framerate * gop_seconds)))) if gop_seconds else ""
+        args = [arg.replace("{gop}", gop) for arg in profile["args"]]
+        if fast:
+            args = EncoderProfiles._override(args, EncoderProfiles.FAST_OVERRIDES.get(codec, []))
+        return ["-c:v", codec] + args
+
+    @staticmethod
+    def _override(args: List[str], overrides: List[str]) -> List[str]:
+        """Replace (or append) option/value pairs of `args` with those in `overrides`."""
+        options: Dict[str, str] = dict(zip(args[::2], args[1::2]))
+        options.update(zip(overrides[::2], overrides[1::2]))
+        return [item for pair in options.items() for item in pair]
+
+    @staticmethod
+    def global_args(codec: str, use_case: str) -> List[str]:
+        """Options that must precede every `-i` (hardware device setup)."""
+        if EncoderProfiles.get(codec, use_case).get("hw") == "vaapi":
+            return ["-vaapi_device", EncoderProfiles.VAAPI_DEVICE]
+        return []
+
+    @staticmethod
+    def output_filters(codec: str, use_case: str, resolution: Optional[str] = None) -> List[str]:
+        """
+        Filter chain (list of filters, join with ',') that scales and converts
+        frames to what the encoder expects.
+        """
+        profile = EncoderProfiles.get(codec, use_case)
+        filters: List[str] = []
+        if resolution:
+            width, height = resolution.lower().split("x")
+            filters.append(f"scale={width}:{height}")
+        if profile.get("hw") == "vaapi":
+            filters += ["format=nv12", "hwupload"]
+        else:
+            filters.append(f"format={profile.get('pix_fmt', 'yuv420p')}")
+        return filters
+
+    @staticmethod
+    def _check_use_case(use_case: str) -> None:
+        if use_case not in EncoderProfiles.USE_CASES:
+            raise ValueError(f"Unknown use case: {use_case}")
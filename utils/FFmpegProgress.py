@@ -0,0 +1,155 @@
+import re
+import time
+from collections import deque
+from threading import Lock, Thread
+from typing import IO, Any, Deque, Dict, Final, List, Optional
+
+
+class FFmpegProgress:
+    """
+    Background reader for the output of a running FFmpeg process.
+
+    Parses the key=value blocks that FFmpeg writes with `-progress pipe:1` into
+    a live stats snapshot, and drains stderr into a bounded tail buffer so the
+    pipe can never fill up and stall the encoder.
+
+    Usage:
+        progress = FFmpegProgress(process.stdout, process.stderr)
+        progress.start()
+        progress.snapshot()  # {'fps': 29.97, 'speed': 1.0, ...}
+
+    Callers that read the pipes themselves (e.g. asyncio) create it without
+    streams and push lines with feed_line()/feed_stderr_line().
+    """
+
+    STDERR_TAIL_LINES: Final[int] = 200
+
+    _NUMBER_PATTERN: Final[re.Pattern] = re.compile(r"[-+]?\d*\.?\d+")
+
+    def __init__(self, progress_stream: Optional[IO[str]], stderr_stream: Optional[IO[str]] = None):
+        self._progress_stream = progress_stream
+        self._stderr_stream = stderr_stream
+        self._lock = Lock()
+        self._pending: Dict[str, str] = {}
+        self._snapshot: Dict[str, Any] = self.empty_snapshot()
+        self._stderr_tail: Deque[str] = deque(maxlen=self.STDERR_TAIL_LINES)
+        self._threads: List[Thread] = []
+
+    @staticmethod
+    def empty_snapshot() -> Dict[str, Any]:
+        """Stats for a process that has not reported progress yet."""
+        return {
+            "frame": 0,
+            "fps": 0.0,
+            "bitrate_kbps": None,
+            "total_size": 0,
+            "out_time_seconds": 0.0,
+            "speed": None,
+            "dup_frames": 0,
+            "drop_frames": 0,
+            "state": "starting",
+            "updated_at": None
+        }
+
+    def start(self) -> None:
+        """Start the reader threads (one per stream)."""
+        if self._progress_stream is not None:
+            self._threads.append(Thread(target=self._read_progress, daemon=True))
+        if self._stderr_stream is not None:
+            self._threads.append(Thread(target=self._read_stderr, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def join(self, timeout: float = 2.0) -> None:
+        """Wait for the reader threads to reach EOF (the process has exited)."""
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def _read_progress(self) -> None:
+        try:
+            for line in self._progress_stream:
+                self.feed_line(line)
+        except (ValueError, OSError):
+            # Stream closed under us
+            pass
+        self.mark_exited()
+
+    def _read_stderr(self) -> None:
+        try:
+            for line in self._stderr_stream:
+                self.feed_stderr_line(line)
+        except (ValueError, OSError):
+            pass
+
+    def mark_exited(self) -> None:
+        """Flag the process as gone (progress stream reached EOF)."""
+        with self._lock:
+            if self._snapshot["state"] != "end":
+                self._snapshot["state"] = "exited"
+
+    def feed_stderr_line(self, line: str) -> None:
+        """Append one stderr line to the tail buffer."""
+        self._stderr_tail.append(line.rstrip())
+
+    def feed_line(self, line: str) -> None:
+        """
+        Parse one line of `-progress` output.
+        A block is published when its closing `progress=` line arrives.
+        """
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return
+        if key != "progress":
+            self._pending[key] = value.strip()
+            return
+
+        block, self._pending = self._pending, {}
+        parsed = self._parse_block(block)
+        parsed["state"] = "end" if value.strip() == "end" else "running"
+        parsed["updated_at"] = time.time()
+        with self._lock:
+            self._snapshot.update(parsed)
+
+    @classmethod
+    def _parse_block(cls, block: Dict[str, str]) -> Dict[str, Any]:
+        parsed: Dict[str, Any] = {}
+        for key in ("frame", "total_size", "dup_frames", "drop_frames"):
+            number = cls._to_number(block.get(key))
+            if number is not None:
+                parsed[key] = int(number)
+
+        fps = cls._to_number(block.get("fps"))
+        if fps is not None:
+            parsed["fps"] = fps
+
+        # "1234.5kbits/s" or "N/A"
+        bitrate = cls._to_number(block.get("bitrate"))
+        if bitrate is not None:
+            parsed["bitrate_kbps"] = bitrate
+
+        # "1.02x" or "N/A"
+        speed = cls._to_number(block.get("speed"))
+        if speed is not None:
+            parsed["speed"] = speed
+
+        out_time_us = cls._to_number(block.get("out_time_us") or block.get("out_time_ms"))
+        if out_time_us is not None:
+            parsed["out_time_seconds"] = out_time_us / 1_000_000
+
+        return parsed
+
+    @classmethod
+    def _to_number(cls, value: Optional[str]) -> Optional[float]:
+        if not value or value == "N/A":
+            return None
+        match = cls._NUMBER_PATTERN.search(value)
+        return float(match.group(0)) if match else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the latest parsed stats."""
+        with self._lock:
+            return dict(self._snapshot)
+
+    def stderr_tail(self) -> str:
+        """Return the last lines FFmpeg wrote to stderr."""
+        return "\n".join(self._stderr_tail)
@@ -0,0 +1,218 @@
+import re
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Final, Optional, Tuple
+import numpy as np
+
+
+class FrameBus:
+    """
+    Shared-memory ring of decoded frames, written by one capture process and
+    read by any number of local processes (analytics) without copies.
+
+    Layout of the shared memory block:
+        header (64 bytes): magic, width, height, channels, slots, fps, last_seq
+        slots:             [seq, timestamp, frame bytes] * slots
+
+    A slot's seq is set to 0 while it is being written and to the frame's
+    sequence number (1, 2, ...) once the frame is complete.
+    """
+
+    MAGIC: Final[bytes] = b"FRAMEBUS"
+    HEADER_FORMAT: Final[str] = "<8sIIIIf"
+    HEADER_SIZE: Final[int] = 64
+    LAST_SEQ_OFFSET: Final[int] = 32
+    SLOT_HEADER_FORMAT: Final[str] = "<Qd"
+    SLOT_HEADER_SIZE: Final[int] = 16
+
+    # FFmpeg pixel format -> channels
+    PIXEL_FORMATS: Final[dict[str, int]] = {"gray": 1, "bgr24": 3}
+
+    @staticmethod
+    def name_for(video_device: str) -> str:
+        """Default shared memory name for a device."""
+        return "framebus_" + re.sub(r'[^a-zA-Z0-9_]', '_', video_device.strip().lower())
+
+    @staticmethod
+    def slot_stride(frame_size: int) -> int:
+        """Bytes per slot, rounded up to 64 so every frame starts cache-line aligned."""
+        return (FrameBus.SLOT_HEADER_SIZE + frame_size + 63) // 64 * 64
+
+
+class FrameBusPublisher:
+    """
+    Producer side: owns the shared memory. A recorder built with
+    frame_bus=FrameBusPublisher(...) adds a downscaled raw branch to its
+    filter graph and reads frames from FFmpeg straight into the ring.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        resolution: str = "320x180",
+        fps: float = 5,
+        pixel_format: str = "gray",
+        slots: int = 16
+    ):
+        if pixel_format not in FrameBus.PIXEL_FORMATS:
+            raise ValueError(f"Unsupported frame bus pixel format: {pixel_format}")
+        if slots < 2:
+            raise ValueError("A frame bus needs at least 2 slots")
+
+        self.name = name
+        self.resolution = resolution
+        self.width, self.height = (int(v) for v in resolution.lower().split("x"))
+        self.fps = fps
+        self.pixel_format = pixel_format
+        self.channels = FrameBus.PIXEL_FORMATS[pixel_format]
+        self.slots = slots
+        self.frame_size = self.width * self.height * self.channels
+        self._stride = FrameBus.slot_stride(self.frame_size)
+        self._seq = 0
+        self._shm: Optional[shared_memory.SharedMemory] = None
+
+    def open(self) -> None:
+        """Create (or re-create) the shared memory block."""
+        if self._shm is not None:
+            return
+        size = FrameBus.HEADER_SIZE + self._stride * self.slots
+        try:
+            self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # Left over by a capture that crashed
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self._shm.buf[:FrameBus.HEADER_SIZE] = bytes(FrameBus.HEADER_SIZE)
+        struct.pack_into(FrameBus.HEADER_FORMAT, self._shm.buf, 0, FrameBus.MAGIC,
+                         self.width, self.height, self.channels, self.slots, self.fps)
+        self._seq = 0
+
+    def filter_chain(self) -> str:
+        """Filters for the bus branch of a filter graph."""
+        return f"fps={self.fps},scale={self.width}:{self.height},format={self.pixel_format}"
+
+    def publish_from(self, stream) -> bool:
+        """
+        Read the next frame from a binary stream directly into the ring.
+        Returns False at end of stream.
+        """
+        seq = self._seq + 1
+        offset = FrameBus.HEADER_SIZE + (seq % self.slots) * self._stride
+        buf = self._shm.buf
+        struct.pack_into(FrameBus.SLOT_HEADER_FORMAT, buf, offset, 0, 0.0)
+        data_offset = offset + FrameBus.SLOT_HEADER_SIZE
+        view = buf[data_offset:data_offset + self.frame_size]
+        try:
+            read = stream.readinto(view)
+        finally:
+            view.release()
+        if read != self.frame_size:
+            return False
+
+        struct.pack_into(FrameBus.SLOT_HEADER_FORMAT, buf, offset, seq, time.time())
+        struct.pack_into("<Q", buf, FrameBus.LAST_SEQ_OFFSET, seq)
+        self._seq = seq
+        return True
+
+    def close(self) -> None:
+        """Remove the shared memory block (subscribers keep their mapping until they close)."""
+        shm, self._shm = self._shm, None
+        if shm is None:
+            return
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class FrameBusSubscriber:
+    """
+    Consumer side, usable from any local process.
+
+    Frames are NumPy views on the shared memory (no copy): shape (height, width)
+    for gray, (height, width, 3) for bgr24. A view stays valid until the ring
+    wraps around (`slots` frames later); check is_current(seq) after processing
+    if the result must not mix two frames, or copy() the view.
+
+    Example:
+        bus = FrameBusSubscriber(FrameBus.name_for("GENERAL WEBCAM"))
+        seq = 0
+        while True:
+            frame = bus.wait_next(seq)
+            if frame:
+                seq, timestamp, image = frame
+    """
+
+    def __init__(self, name: str):
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            self._shm = shared_memory.SharedMemory(name=name)
+            # Do not let this process' resource tracker unlink the publisher's block on exit
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+
+        magic, width, height, channels, slots, fps = struct.unpack_from(
+            FrameBus.HEADER_FORMAT, self._shm.buf, 0)
+        if magic != FrameBus.MAGIC:
+            self._shm.close()
+            raise ValueError(f"Shared memory {name} is not a frame bus")
+        self.name = name
+        self.width, self.height, self.channels = width, height, channels
+        self.slots = slots
+        self.fps = fps
+        self.frame_size = width * height * channels
+        self._stride = FrameBus.slot_stride(self.frame_size)
+        self._shape = (height, width) if channels == 1 else (height, width, channels)
+
+    def last_seq(self) -> int:
+        """Sequence number of the newest complete frame (0 = none yet)."""
+        return struct.unpack_from("<Q", self._shm.buf, FrameBus.LAST_SEQ_OFFSET)[0]
+
+    def _slot_offset(self, seq: int) -> int:
+        return FrameBus.HEADER_SIZE + (seq % self.slots) * self._stride
+
+    def is_current(self, seq: int) -> bool:
+        """True while the slot of `seq` still holds that frame."""
+        return struct.unpack_from("<Q", self._shm.buf, self._slot_offset(seq))[0] == seq
+
+    def read(self, seq: int) -> Optional[Tuple[int, float, np.ndarray]]:
+        """(seq, timestamp, view) of frame `seq`, or None if it is not (or no longer) in the ring."""
+        if seq <= 0:
+            return None
+        offset = self._slot_offset(seq)
+        slot_seq, timestamp = struct.unpack_from(FrameBus.SLOT_HEADER_FORMAT, self._shm.buf, offset)
+        if slot_seq != seq:
+            return None
+        view = np.ndarray(self._shape, dtype=np.uint8, buffer=self._shm.buf,
+                          offset=offset + FrameBus.SLOT_HEADER_SIZE)
+        return seq, timestamp, view
+
+    def latest(self) -> Optional[Tuple[int, float, np.ndarray]]:
+        """Newest complete frame."""
+        return self.read(self.last_seq())
+
+    def wait_next(self, after_seq: int, timeout: float = 1.0) -> Optional[Tuple[int, float, np.ndarray]]:
+        """
+        Block until a frame newer than `after_seq` is available and return it.
+        Frames that were already overwritten are skipped (returns the oldest one still in the ring).
+        """
+        deadline = time.monotonic() + timeout
+        poll = min(0.01, 0.25 / max(self.fps, 1))
+        while True:
+            last = self.last_seq()
+            if last > after_seq:
+                for seq in range(max(after_seq + 1, last - self.slots + 2), last + 1):
+                    frame = self.read(seq)
+                    if frame:
+                        return frame
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def close(self) -> None:
+        """Detach. Views returned earlier must not be used afterwards."""
+        self._shm.close()
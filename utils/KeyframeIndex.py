@@ -0,0 +1,186 @@
+import bisect
+import json
+import os
+import subprocess
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, Final, List, Optional, Tuple
+
+try:
+    from utils.RecordingVerifier import RecordingVerifier
+    from utils.VideoDeviceDetection import VideoDeviceDetection
+    from utils.system_log import SystemLog
+except ModuleNotFoundError:
+    from RecordingVerifier import RecordingVerifier
+    from VideoDeviceDetection import VideoDeviceDetection
+    from system_log import SystemLog
+
+
+class KeyframeIndex:
+    """
+    Keyframe timestamps (and basic stream info) of a video file, in seconds
+    from the start of the file (the timeline used by FFmpeg's -ss).
+
+    Built once with ffprobe from the packet headers (nothing is decoded) and
+    stored next to the file as `<file>.keyframes.json`. The sidecar records the
+    file's path, mtime and size: if any of them changed it is rebuilt.
+
+    Example:
+        index = KeyframeIndex.load("Videos/entrada.mp4")
+        index.keyframe_before(125.3)  # -> 124.0
+    """
+
+    SIDECAR_SUFFIX: Final[str] = ".keyframes.json"
+    VERSION: Final[int] = 1
+
+    log: Final[SystemLog] = SystemLog(__name__)
+
+    # (path, mtime, size) -> index, so the sidecar is read once per process
+    _cache: Dict[Tuple[str, float, int], "KeyframeIndex"] = {}
+    _cache_lock = Lock()
+
+    def __init__(self, path: str, mtime: float, size: int, keyframes: List[float],
+                 packets: int, stream: Dict[str, Any]):
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.keyframes = keyframes
+        self.packets = packets
+        # codec_name, width, height, pix_fmt, time_base, r_frame_rate, start_time, duration
+        self.stream = stream
+
+    @property
+    def duration(self) -> Optional[float]:
+        duration = self.stream.get("duration")
+        return float(duration) if duration not in (None, "N/A") else None
+
+    # ---------------- Lookup ----------------
+
+    def keyframe_before(self, seconds: float) -> float:
+        """Last keyframe at or before `seconds` (the first keyframe if there is none)."""
+        position = bisect.bisect_right(self.keyframes, seconds + 1e-6)
+        return self.keyframes[max(0, position - 1)] if self.keyframes else 0.0
+
+    def keyframe_after(self, seconds: float) -> Optional[float]:
+        """First keyframe at or after `seconds` (None past the last one)."""
+        position = bisect.bisect_left(self.keyframes, seconds - 1e-6)
+        return self.keyframes[position] if position < len(self.keyframes) else None
+
+    def keyframes_between(self, start: float, end: float) -> List[float]:
+        """Keyframes in [start, end)."""
+        low = bisect.bisect_left(self.keyframes, start - 1e-6)
+        high = bisect.bisect_left(self.keyframes, end - 1e-6)
+        return self.keyframes[low:high]
+
+    # ---------------- Load / build ----------------
+
+    @classmethod
+    def sidecar_path(cls, path: str) -> str:
+        return path + cls.SIDECAR_SUFFIX
+
+    @classmethod
+    def load(cls, path: str, ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH) -> "KeyframeIndex":
+        """
+        Index of `path`: from memory, from its sidecar, or built with ffprobe (and saved).
+
+        Raises:
+            FileNotFoundError: If the video does not exist
+            RuntimeError: If ffprobe cannot read it
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        with cls._cache_lock:
+            cached = cls._cache.get(key)
+        if cached:
+            return cached
+
+        index = cls._read_sidecar(path, stat.st_mtime, stat.st_size)
+        if index is None:
+            index = cls.build(path, ffmpeg_path)
+            index.save()
+        with cls._cache_lock:
+            cls._cache[key] = index
+        return index
+
+    @classmethod
+    def _read_sidecar(cls, path: str, mtime: float, size: int) -> Optional["KeyframeIndex"]:
+        try:
+            with open(cls.sidecar_path(path), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (data.get("version") != cls.VERSION or data.get("path") != path
+                or data.get("mtime") != mtime or data.get("size") != size):
+            return None
+        return cls(path, mtime, size, data["keyframes"], data["packets"], data["stream"])
+
+    @classmethod
+    def build(cls, path: str, ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH) -> "KeyframeIndex":
+        """Probe the packets of the first video stream (demux only, no decode)."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        ffprobe_path = RecordingVerifier.ffprobe_for(ffmpeg_path)
+        started = datetime.now()
+
+        stream_cmd = [
+            ffprobe_path, "-v", "error", "-select_streams", "v:0",
+            "-show_entries",
+            "stream=codec_name,profile,width,height,pix_fmt,time_base,r_frame_rate,start_time,duration"
+            ":format=duration,start_time",
+            "-of", "json", path
+        ]
+        packets_cmd = [
+            ffprobe_path, "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "csv=p=0", path
+        ]
+        info = subprocess.run(stream_cmd, capture_output=True, text=True)
+        packets = subprocess.run(packets_cmd, capture_output=True, text=True)
+        if info.returncode != 0 or packets.returncode != 0:
+            raise RuntimeError(f"ffprobe could not index {path}: {(info.stderr or packets.stderr).strip()}")
+
+        data = json.loads(info.stdout or "{}")
+        streams = data.get("streams") or []
+        if not streams:
+            raise RuntimeError(f"No video stream in {path}")
+        stream = streams[0]
+        fmt = data.get("format") or {}
+        if stream.get("duration") in (None, "N/A"):
+            stream["duration"] = fmt.get("duration")
+        # Packet timestamps are absolute (MPEG-TS starts at ~1.4 s): make them relative to the file start
+        offset = float(fmt["start_time"]) if fmt.get("start_time") not in (None, "N/A") else 0.0
+
+        keyframes: List[float] = []
+        count = 0
+        for line in packets.stdout.splitlines():
+            pts_time, _, flags = line.partition(",")
+            if not pts_time or pts_time == "N/A":
+                continue
+            count += 1
+            if "K" in flags:
+                keyframes.append(round(float(pts_time) - offset, 6))
+        keyframes.sort()
+
+        cls.log.info(f"Indexed {path}: {len(keyframes)} keyframes, {count} packets "
+                     f"in {(datetime.now() - started).total_seconds():.2f}s")
+        return cls(path, stat.st_mtime, stat.st_size, keyframes, count, stream)
+
+    def save(self) -> None:
+        """Write the sidecar (kept in memory only if the directory is read-only)."""
+        data = {
+            "version": self.VERSION,
+            "path": self.path,
+            "mtime": self.mtime,
+            "size": self.size,
+            "packets": self.packets,
+            "stream": self.stream,
+            "keyframes": self.keyframes
+        }
+        sidecar = self.sidecar_path(self.path)
+        try:
+            with open(sidecar + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(sidecar + ".tmp", sidecar)
+        except OSError as e:
+            self.log.warning(f"Could not save keyframe index {sidecar}: {e}")
@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, Final, List, Optional
+
+try:
+    from utils.SegmentPlaylist import SegmentPlaylist
+    from utils.VideoLogger import VideoLogger
+    from utils.VideoDeviceDetection import VideoDeviceDetection
+    from utils.system_log import SystemLog
+except ModuleNotFoundError:
+    from SegmentPlaylist import SegmentPlaylist
+    from VideoLogger import VideoLogger
+    from VideoDeviceDetection import VideoDeviceDetection
+    from system_log import SystemLog
+
+
+class RecordingVerifier:
+    """
+    Checks finished recordings in the background and repairs only the broken ones.
+
+    Each file is probed with ffprobe (container parse + packet count, no decoding):
+        container: ffprobe opens it, finds a video stream and a duration
+        duration:  within tolerance of the duration the recorder expects (e.g. FFmpeg's output time)
+        frames:    video packets within tolerance of the frames FFmpeg reported
+
+    A file that fails the container or duration check is remuxed to a
+    temporary file; the original is replaced only if the remuxed copy passes.
+    Healthy files are never rewritten. The verdict is logged as a VERIFY event:
+        VALID     every check passed
+        REPAIRED  failed, remux fixed it
+        INVALID   the remux did not help (original kept), or frames are missing
+    """
+
+    DURATION_TOLERANCE: Final[float] = 2.0  # seconds, or 5% if larger
+    FRAME_TOLERANCE: Final[int] = 5  # frames, or 2% if larger
+
+    log: Final[SystemLog] = SystemLog(__name__)
+
+    _shared: Optional["RecordingVerifier"] = None
+    _shared_lock = Lock()
+
+    def __init__(self, max_workers: int = 2, ffmpeg_path: str = VideoDeviceDetection.FFMPEG_PATH):
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = self.ffprobe_for(ffmpeg_path)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                            thread_name_prefix="verify")
+        self._pending: Dict[str, Future] = {}
+        self._lock = Lock()
+        self._closed = False
+        self.video_logger = VideoLogger()
+
+    @classmethod
+    def shared(cls) -> "RecordingVerifier":
+        """Process-wide verifier used by the recorders."""
+        with cls._shared_lock:
+            if cls._shared is None or cls._shared._closed:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def ffprobe_for(ffmpeg_path: str) -> str:
+        """ffprobe next to the given ffmpeg (bundled build), otherwise from PATH."""
+        directory, name = os.path.split(ffmpeg_path)
+        candidate = os.path.join(directory, name.replace("ffmpeg", "ffprobe"))
+        if directory and os.path.exists(candidate):
+            return candidate
+        return shutil.which("ffprobe") or "ffprobe"
+
+    def submit(
+        self,
+        path: str,
+        source: Optional[str] = None,
+        expected_duration: Optional[float] = None,
+        expected_frames: Optional[int] = None,
+        duration_tolerance: Optional[float] = None
+    ) -> Future:
+        """
+        Queue a finished recording for verification.
+
+        Args:
+            path: Recording to check
+            source: Camera or input the recording came from (for the log)
+            expected_duration: Duration the recorder wrote, in seconds (None = not checked)
+            expected_frames: Frames FFmpeg reported writing (None = not checked)
+            duration_tolerance: Allowed difference in seconds (default DURATION_TOLERANCE or 5%)
+
+        Returns:
+            Future: Resolves to the verdict dict (same content as the VERIFY log event)
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            future = self._executor.submit(self._verify, path, source, expected_duration,
+                                           expected_frames, duration_tolerance)
+            self._pending[path] = future
+        future.add_done_callback(lambda done: self._forget(path, done))
+        return future
+
+    def _forget(self, path: str, future: Future) -> None:
+        with self._lock:
+            if self._pending.get(path) is future:
+                del self._pending[path]
+
+    def pending(self, path: str) -> Optional[Future]:
+        """Future of a verification still queued or running for `path`."""
+        with self._lock:
+            return self._pending.get(os.path.abspath(path))
+
+    # ---------------- Checks ----------------
+
+    def probe(self, path: str) -> Dict[str, Any]:
+        """Container format, duration and video packet count of a file (error set if unreadable)."""
+        cmd = [
+            self.ffprobe_path, "-v", "error",
+            "-count_packets", "-select_streams", "v:0",
+            "-show_entries", "format=format_name,duration:stream=codec_name,nb_read_packets,duration",
+            "-of", "json", path
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+            data = json.loads(result.stdout or "{}")
+        except (OSError, subprocess.TimeoutExpired, ValueError) as e:
+            return {"error": str(e)}
+
+        streams = data.get("streams") or [{}]
+        fmt = data.get("format") or {}
+        duration = fmt.get("duration") or streams[0].get("duration")
+        packets = streams[0].get("nb_read_packets")
+        return {
+            "error": result.stderr.strip() if result.returncode != 0 else None,
+            "format": fmt.get("format_name"),
+            "codec": streams[0].get("codec_name"),
+            "duration": float(duration) if duration not in (None, "N/A") else None,
+            "frames": int(packets) if packets not in (None, "N/A") else None
+        }
+
+    def check(
+        self,
+        probe: Dict[str, Any],
+        expected_duration: Optional[float],
+        expected_frames: Optional[int],
+        duration_tolerance: Optional[float] = None
+    ) -> List[str]:
+        """Problems found in a probe result (empty list = healthy)."""
+        if probe.get("error") or not probe.get("codec"):
+            return [f"container: {probe.get('error') or 'no video stream'}"]
+
+        problems: List[str] = []
+        duration = probe.get("duration")
+        if not duration:
+            problems.append("container: no duration")
+        elif expected_duration:
+            tolerance = duration_tolerance
+            if tolerance is None:
+                tolerance = max(self.DURATION_TOLERANCE, expected_duration * 0.05)
+            if abs(duration - expected_duration) > tolerance:
+                problems.append(f"duration: {duration:.2f}s, expected {expected_duration:.2f}s")
+
+        frames = probe.get("frames")
+        if expected_frames and frames is not None:
+            if abs(frames - expected_frames) > max(self.FRAME_TOLERANCE, expected_frames * 0.02):
+                problems.append(f"frames: {frames}, encoded {expected_frames}")
+        return problems
+
+    # ---------------- Repair ----------------
+
+    def _repair(self, path: str) -> Optional[str]:
+        """Remux to a temporary file next to `path`. Returns its path, or None if FFmpeg failed."""
+        root, ext = os.path.splitext(path)
+        repaired_file = f"{root}_fixed{ext or '.mp4'}"
+        repair_cmd = [
+            self.ffmpeg_path, "-v", "error", "-i", path,
+            "-c", "copy", "-movflags", "+faststart", repaired_file, "-y"
+        ]
+        try:
+            result = subprocess.run(repair_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                    timeout=600)
+        except (OSError, subprocess.TimeoutExpired):
+            result = None
+        if result is None or result.returncode != 0:
+            self._discard(repaired_file)
+            return None
+        return repaired_file
+
+    @staticmethod
+    def _discard(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _verify(
+        self,
+        path: str,
+        source: Optional[str],
+        expected_duration: Optional[float],
+        expected_frames: Optional[int],
+        duration_tolerance: Optional[float]
+    ) -> Dict[str, Any]:
+        probe = self.probe(path)
+        problems = self.check(probe, expected_duration, expected_frames, duration_tolerance)
+        verdict: Dict[str, Any] = {
+            "status": "VALID",
+            "problems": problems,
+            "repaired": False,
+            "probe": probe,
+            "expected": {"duration": expected_duration, "frames": expected_frames}
+        }
+
+        # Frames lost while recording cannot come back: a remux only helps container/duration problems
+        repairable = [problem for problem in problems if not problem.startswith("frames")]
+        if problems:
+            verdict["status"] = "INVALID"
+        # A playlist's segments are never rewritten (remuxing it would rebuild the whole recording)
+        if repairable and not SegmentPlaylist.is_playlist(path):
+            repaired_file = self._repair(path) if os.path.exists(path) else None
+            if repaired_file:
+                repaired_probe = self.probe(repaired_file)
+                remaining = self.check(repaired_probe, expected_duration, None, duration_tolerance)
+                if not remaining:
+                    os.replace(repaired_file, path)
+                    verdict["status"] = "REPAIRED" if len(repairable) == len(problems) else "INVALID"
+                    verdict["repaired"] = True
+                    verdict["probe"] = repaired_probe
+                else:
+                    self._discard(repaired_file)
+                    verdict["remaining_problems"] = remaining
+
+        if verdict["status"] == "VALID":
+            self.log.info(f"Verified {path}")
+        else:
+            self.log.warning(f"{path}: {verdict['status']} ({'; '.join(problems)})")
+        self.video_logger.log_event(
+            source=source or path,
+            output_file=path,
+            codec=probe.get("codec"),
+            event="VERIFY",
+            timestamp=datetime.now(),
+            duration=verdict["probe"].get("duration"),
+            status=verdict["status"],
+            extra={key: value for key, value in verdict.items() if key != "status"}
+        )
+        return verdict
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting files; with wait=True, finish the queued verifications."""
+        self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,391 @@
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Final, List, Optional, Set, Tuple
+
+try:
+    from utils.ContactSheet import ContactSheet
+    from utils.SegmentPlaylist import SegmentPlaylist
+    from utils.VideoLogger import VideoLogger
+    from utils.system_log import SystemLog
+except ModuleNotFoundError:
+    from ContactSheet import ContactSheet
+    from SegmentPlaylist import SegmentPlaylist
+    from VideoLogger import VideoLogger
+    from system_log import SystemLog
+
+
+class RetentionManager:
+    """
+    Keeps recording directories under quota and deletes old recordings.
+
+    Policies (any of them can be disabled with None):
+        max_age_days:         recordings older than this are deleted
+        camera_quota_bytes:   max bytes per camera ({camera: bytes}, plus default_camera_quota_bytes);
+                              the camera is the directory right under a root (see camera_of())
+        volume_quota_bytes:   max bytes of recordings per volume (filesystem)
+        min_free_bytes:       free space kept on every volume, so an active FFmpeg write never fails
+        root_min_free_bytes:  {root: bytes} floor for the volume of that root instead of
+                              min_free_bytes (e.g. a small local staging disk)
+
+    An index of every recording (size, mtime) is persisted in INDEX_FILE.
+    Refreshing it only lists directories whose mtime changed since the last
+    pass, and re-stats only "hot" files (modified recently, i.e. still being
+    written), so the full tree is never walked again after the first scan.
+
+    Eviction always removes the oldest recordings first and never touches
+    protected files: those registered with protect() and those modified in the
+    last `active_grace_seconds` (in-progress recordings).
+
+    A playlist recording (SegmentPlaylist: `name.m3u8` + `name.segments/`) is
+    one entry: its size includes the segments and evicting it deletes them.
+    """
+
+    INDEX_FILE: Final[str] = os.path.join("cache", "retention_index.json")
+    EXTENSIONS: Final[tuple[str, ...]] = (".mp4", ".mkv", ".ts", SegmentPlaylist.EXTENSION)
+    # Internal working directories of the recorders (ring buffers), never evicted
+    SKIP_DIRS: Final[tuple[str, ...]] = ("preroll", "standby")
+    # Files directly in a root: "<camera>_<YYYYmmdd_HHMMSS|YYYY-mm-dd_HH-MM-SS>..." -> camera
+    _CAMERA_PATTERN: Final[re.Pattern] = re.compile(r"^(.+?)_\d{4}-?\d{2}-?\d{2}_")
+
+    log: Final[SystemLog] = SystemLog(__name__)
+
+    def __init__(
+        self,
+        roots: List[str],
+        max_age_days: Optional[float] = None,
+        camera_quota_bytes: Optional[Dict[str, int]] = None,
+        default_camera_quota_bytes: Optional[int] = None,
+        volume_quota_bytes: Optional[int] = None,
+        min_free_bytes: Optional[int] = 5 * 1024 ** 3,
+        root_min_free_bytes: Optional[Dict[str, int]] = None,
+        check_interval: float = 30.0,
+        active_grace_seconds: float = 120.0,
+        index_file: str = INDEX_FILE
+    ):
+        if not roots:
+            raise ValueError("At least one root directory is required")
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.max_age_days = max_age_days
+        self.camera_quota_bytes = camera_quota_bytes or {}
+        self.default_camera_quota_bytes = default_camera_quota_bytes
+        self.volume_quota_bytes = volume_quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.root_min_free_bytes = {os.path.abspath(root): floor
+                                    for root, floor in (root_min_free_bytes or {}).items()}
+        self.check_interval = check_interval
+        self.active_grace_seconds = active_grace_seconds
+        self.index_file = index_file
+
+        # path -> [size, mtime]; dir -> {"mtime_ns": int, "subdirs": [...]}
+        self._files: Dict[str, List[float]] = {}
+        self._dirs: Dict[str, Dict[str, Any]] = {}
+        self._protected: Set[str] = set()
+        self._dirty = False
+        self._lock = Lock()
+        self._stop_event = Event()
+        self._thread: Optional[Thread] = None
+        self.video_logger = VideoLogger()
+
+        self._load_index()
+
+    # ---------------- Index ----------------
+
+    def _load_index(self) -> None:
+        try:
+            with open(self.index_file, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._files = {path: entry for path, entry in data.get("files", {}).items()
+                       if self._is_managed(path)}
+        self._dirs = {path: entry for path, entry in data.get("dirs", {}).items()
+                      if self._is_managed(path)}
+
+    def _save_index(self) -> None:
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.index_file) or ".", exist_ok=True)
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"updated": datetime.now().isoformat(), "files": self._files, "dirs": self._dirs}, f)
+        os.replace(tmp_file, self.index_file)
+        self._dirty = False
+
+    def _is_managed(self, path: str) -> bool:
+        return any(path == root or path.startswith(root + os.sep) for root in self.roots)
+
+    @staticmethod
+    def _stat(path: str) -> List[float]:
+        """[size, mtime] of a recording; a playlist counts its segments too."""
+        stat = os.stat(path)
+        size = SegmentPlaylist.size(path) if SegmentPlaylist.is_playlist(path) else stat.st_size
+        return [size, stat.st_mtime]
+
+    def refresh(self) -> None:
+        """Bring the index up to date (incremental, see class docstring)."""
+        with self._lock:
+            for root in self.roots:
+                self._refresh_tree(root)
+            self._refresh_hot_files()
+            self._save_index()
+
+    def _refresh_tree(self, root: str) -> None:
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._forget_dir(directory)
+                continue
+
+            known = self._dirs.get(directory)
+            if known and known["mtime_ns"] == mtime_ns:
+                pending.extend(known["subdirs"])
+                continue
+
+            subdirs: List[str] = []
+            present: Set[str] = set()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            # A playlist's segments are indexed with the playlist
+                            if entry.name not in self.SKIP_DIRS and not SegmentPlaylist.is_segment_dir(entry.path):
+                                subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(self.EXTENSIONS):
+                            present.add(entry.path)
+                            self._files[entry.path] = self._stat(entry.path)
+            except OSError as e:
+                self.log.warning(f"Could not list {directory}: {e}")
+                continue
+
+            # Files of this directory that disappeared since the last listing
+            for path in [p for p in self._files if os.path.dirname(p) == directory and p not in present]:
+                del self._files[path]
+            for subdir in known["subdirs"] if known else []:
+                if subdir not in subdirs:
+                    self._forget_dir(subdir)
+
+            self._dirs[directory] = {"mtime_ns": mtime_ns, "subdirs": subdirs}
+            self._dirty = True
+            pending.extend(subdirs)
+
+    def _forget_dir(self, directory: str) -> None:
+        prefix = directory + os.sep
+        for path in [p for p in self._dirs if p == directory or p.startswith(prefix)]:
+            del self._dirs[path]
+        for path in [p for p in self._files if p.startswith(prefix)]:
+            del self._files[path]
+        self._dirty = True
+
+    def _refresh_hot_files(self) -> None:
+        """Re-stat files that are probably still growing (writes do not change the directory mtime)."""
+        hot_since = time.time() - self.active_grace_seconds
+        for path, (size, mtime) in list(self._files.items()):
+            if mtime < hot_since and path not in self._protected:
+                continue
+            try:
+                current = self._stat(path)
+            except OSError:
+                del self._files[path]
+                self._dirty = True
+                continue
+            if current != [size, mtime]:
+                self._files[path] = current
+                self._dirty = True
+
+    def add_file(self, path: str) -> None:
+        """Index (or update) one recording right away, e.g. when a recorder starts writing it."""
+        path = os.path.abspath(path)
+        if not self._is_managed(path):
+            return
+        try:
+            current = self._stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._files[path] = current
+            self._dirty = True
+
+    # ---------------- Protection ----------------
+
+    def protect(self, path: str) -> None:
+        """Never evict `path` until unprotect() (e.g. a recording in progress or under review)."""
+        with self._lock:
+            self._protected.add(os.path.abspath(path))
+
+    def unprotect(self, path: str) -> None:
+        with self._lock:
+            self._protected.discard(os.path.abspath(path))
+
+    def _is_protected(self, path: str, mtime: float, now: float) -> bool:
+        return path in self._protected or mtime >= now - self.active_grace_seconds
+
+    # ---------------- Eviction ----------------
+
+    def camera_of(self, path: str) -> str:
+        """
+        Camera a recording belongs to: the directory right under its root
+        (`Videos/camara0/entrada_2025-...mp4` -> `camara0`), so every sensor of
+        a camera shares its quota. Files directly in a root fall back to their
+        name prefix (`general_webcam_20250914_...mp4` -> `general_webcam`).
+        """
+        path = os.path.abspath(path)
+        root = next((r for r in self.roots if path.startswith(r + os.sep)), None)
+        if root is not None:
+            parts = os.path.relpath(path, root).split(os.sep)
+            if len(parts) > 1:
+                return parts[0]
+        name = os.path.basename(path)
+        match = RetentionManager._CAMERA_PATTERN.match(name)
+        return match.group(1) if match else os.path.splitext(name)[0]
+
+    def _root_of(self, path: str) -> str:
+        return next(r for r in self.roots if path == r or path.startswith(r + os.sep))
+
+    def enforce(self) -> List[Tuple[str, str]]:
+        """
+        Refresh the index and delete what the policies require.
+
+        Returns:
+            List[Tuple[str, str]]: (path, reason) of every deleted recording
+        """
+        self.refresh()
+        evicted: List[Tuple[str, str]] = []
+        with self._lock:
+            now = time.time()
+            # Oldest first
+            candidates = sorted(
+                ((path, size, mtime) for path, (size, mtime) in self._files.items()
+                 if not self._is_protected(path, mtime, now)),
+                key=lambda item: item[2]
+            )
+
+            if self.max_age_days is not None:
+                limit = now - self.max_age_days * 86400
+                for path, _, mtime in candidates:
+                    if mtime < limit and self._evict(path, "AGE"):
+                        evicted.append((path, "AGE"))
+
+            if self.camera_quota_bytes or self.default_camera_quota_bytes is not None:
+                usage: Dict[str, int] = {}
+                for path, (size, _) in self._files.items():
+                    usage[self.camera_of(path)] = usage.get(self.camera_of(path), 0) + size
+                for path, size, _ in candidates:
+                    camera = self.camera_of(path)
+                    quota = self.camera_quota_bytes.get(camera, self.default_camera_quota_bytes)
+                    if path in self._files and quota is not None and usage[camera] > quota:
+                        if self._evict(path, "CAMERA_QUOTA"):
+                            usage[camera] -= size
+                            evicted.append((path, "CAMERA_QUOTA"))
+
+            evicted += self._enforce_volumes(candidates)
+            self._save_index()
+        return evicted
+
+    def _enforce_volumes(self, candidates: List[Tuple[str, int, float]]) -> List[Tuple[str, str]]:
+        """Volume quota and free-space headroom, per filesystem."""
+        evicted: List[Tuple[str, str]] = []
+        devices: Dict[str, int] = {}
+        for root in self.roots:
+            try:
+                devices[root] = os.stat(root).st_dev
+            except OSError:
+                continue
+        volumes: Dict[int, str] = {}
+        for root, device in devices.items():
+            volumes.setdefault(device, root)
+
+        for volume, root in volumes.items():
+            on_volume = {path for path in self._files if devices.get(self._root_of(path)) == volume}
+            used = sum(self._files[path][0] for path in on_volume)
+            over_quota = used - self.volume_quota_bytes if self.volume_quota_bytes is not None else 0
+            # Roots sharing a volume: the highest floor wins
+            floors = [self.root_min_free_bytes.get(r, self.min_free_bytes)
+                      for r, device in devices.items() if device == volume]
+            floors = [floor for floor in floors if floor is not None]
+            missing_free = 0
+            if floors:
+                missing_free = max(floors) - shutil.disk_usage(root).free
+            to_free = max(over_quota, missing_free)
+            if to_free <= 0:
+                continue
+
+            reason = "VOLUME_QUOTA" if over_quota >= missing_free else "LOW_DISK"
+            for path, size, _ in candidates:
+                if to_free <= 0:
+                    break
+                if path in on_volume and path in self._files and self._evict(path, reason):
+                    to_free -= size
+                    evicted.append((path, reason))
+            if to_free > 0:
+                self.log.warning(f"Could not free enough space on {root}: "
+                                 f"{to_free / 1_048_576:.1f} MB still over the limit")
+        return evicted
+
+    def _evict(self, path: str, reason: str) -> bool:
+        """Delete one recording and drop it from the index. Caller holds the lock."""
+        size, mtime = self._files[path]
+        try:
+            if SegmentPlaylist.is_playlist(path):
+                SegmentPlaylist.remove(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.log.error(f"Could not delete {path}: {e}")
+            return False
+        ContactSheet.remove_sidecars(path)
+        del self._files[path]
+        self._dirty = True
+
+        self.log.info(f"Evicted {path} ({size / 1_048_576:.1f} MB, {reason})")
+        self.video_logger.log_event(
+            source=self.camera_of(path),
+            output_file=path,
+            codec=None,
+            event="EVICT",
+            status=reason,
+            extra={"size": size, "modified": datetime.fromtimestamp(mtime).isoformat()}
+        )
+        return True
+
+    # ---------------- Background service ----------------
+
+    def start(self) -> None:
+        """Run enforce() every `check_interval` seconds in a background thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.enforce()
+            except Exception as e:
+                self.log.error(f"Retention pass failed: {e}")
+            if self._stop_event.wait(self.check_interval):
+                break
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def usage(self) -> Dict[str, int]:
+        """Indexed bytes per camera."""
+        with self._lock:
+            usage: Dict[str, int] = {}
+            for path, (size, _) in self._files.items():
+                camera = self.camera_of(path)
+                usage[camera] = usage.get(camera, 0) + size
+            return usage
@@ -0,0 +1,146 @@
+import math
+import os
+import shutil
+from threading import Lock
+from typing import Final, List
+
+try:
+    from utils.system_log import SystemLog
+except ModuleNotFoundError:
+    from system_log import SystemLog
+
+
+class SegmentPlaylist:
+    """
+    A recording stored as MPEG-TS segments plus an HLS playlist that lists them:
+
+        entrada_2025-09-14_17-25-19.m3u8
+        entrada_2025-09-14_17-25-19.segments/seg_00001.ts ...
+
+    Segments are hard links to the files the capture already wrote (a copy
+    only if the link fails, e.g. another volume), so building the recording
+    never rewrites video data. The playlist is appended segment by segment:
+    it is playable (and valid after a crash) while the recording grows, and
+    close() only appends #EXT-X-ENDLIST. FFmpeg, ffprobe and VLC read it as
+    a single video.
+
+    The class methods let storage services (retention, archive) treat the
+    playlist and its segment directory as one recording.
+    """
+
+    EXTENSION: Final[str] = ".m3u8"
+    SEGMENT_DIR_SUFFIX: Final[str] = ".segments"
+    SEGMENT_PATTERN: Final[str] = "seg_{:05d}.ts"
+
+    log: Final[SystemLog] = SystemLog(__name__)
+
+    # ---------------- Recordings on disk ----------------
+
+    @classmethod
+    def is_playlist(cls, path: str) -> bool:
+        return path.lower().endswith(cls.EXTENSION)
+
+    @classmethod
+    def segment_dir(cls, playlist: str) -> str:
+        return os.path.splitext(playlist)[0] + cls.SEGMENT_DIR_SUFFIX
+
+    @classmethod
+    def is_segment_dir(cls, directory: str) -> bool:
+        """True for the segment directory of a playlist (part of that recording, not a folder of recordings)."""
+        return (directory.endswith(cls.SEGMENT_DIR_SUFFIX)
+                and os.path.exists(directory[:-len(cls.SEGMENT_DIR_SUFFIX)] + cls.EXTENSION))
+
+    @classmethod
+    def files(cls, playlist: str) -> List[str]:
+        """Segments of a playlist (sorted) followed by the playlist itself."""
+        directory = cls.segment_dir(playlist)
+        try:
+            segments = sorted(os.path.join(directory, name) for name in os.listdir(directory))
+        except OSError:
+            segments = []
+        return segments + [playlist]
+
+    @classmethod
+    def size(cls, playlist: str) -> int:
+        """Bytes of the playlist and all its segments."""
+        total = 0
+        for path in cls.files(playlist):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    @classmethod
+    def remove(cls, playlist: str) -> None:
+        """Delete the playlist and its segments."""
+        shutil.rmtree(cls.segment_dir(playlist), ignore_errors=True)
+        os.remove(playlist)
+
+    # ---------------- Writer ----------------
+
+    def __init__(self, path: str, target_duration: float):
+        """
+        Args:
+            path: Playlist file (`.m3u8`); segments go to segment_dir(path)
+            target_duration: Longest expected segment, in seconds
+        """
+        self.path = path
+        self.directory = self.segment_dir(path)
+        self.target_duration = target_duration
+        self.segments = 0
+        self.duration = 0.0
+        self.closed = False
+        self._copied = False
+        self._lock = Lock()
+
+    def open(self) -> None:
+        """Create the segment directory and write the playlist header."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("#EXTM3U\n"
+                    "#EXT-X-VERSION:3\n"
+                    f"#EXT-X-TARGETDURATION:{max(1, math.ceil(self.target_duration))}\n"
+                    "#EXT-X-MEDIA-SEQUENCE:0\n"
+                    "#EXT-X-PLAYLIST-TYPE:EVENT\n")
+
+    def add(self, segment: str, duration: float, discontinuity: bool = False) -> bool:
+        """
+        Link `segment` into the recording and list it. `discontinuity` marks a
+        segment whose timestamps do not follow the previous one (capture restarted).
+        Returns False if the segment could not be linked nor copied.
+        """
+        with self._lock:
+            if self.closed:
+                return False
+            name = self.SEGMENT_PATTERN.format(self.segments + 1)
+            destination = os.path.join(self.directory, name)
+            try:
+                os.link(segment, destination)
+            except OSError:
+                try:
+                    shutil.copyfile(segment, destination)
+                except OSError as e:
+                    self.log.error(f"Could not add {segment} to {self.path}: {e}")
+                    return False
+                if not self._copied:
+                    self._copied = True
+                    self.log.warning(f"{self.path}: segments are copied, not linked "
+                                     f"(keep the capture ring on the same volume)")
+
+            relative = f"{os.path.basename(self.directory)}/{name}"
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(("#EXT-X-DISCONTINUITY\n" if discontinuity else "")
+                        + f"#EXTINF:{duration:.3f},\n{relative}\n")
+            self.segments += 1
+            self.duration += duration
+            return True
+
+    def close(self) -> None:
+        """Mark the recording as complete."""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("#EXT-X-ENDLIST\n")
@@ -1,14 +1,18 @@
 import subprocess
-import re
 import os
+import shutil
 import cv2
-from typing import List, Tuple, Final
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple, Final
 from functools import lru_cache
 
 try:
     from utils.system_log import SystemLog
+    from utils.CaptureBackend import CaptureBackend
 except ModuleNotFoundError:
     from system_log import SystemLog
+    from CaptureBackend import CaptureBackend
 
 class VideoDeviceDetection:
     """
@@ -18,18 +22,18 @@ class VideoDeviceDetection:
 
     DIR: Final[str] = os.path.dirname(os.path.abspath(__file__))
     ROOT_ROOT: Final[str] = os.path.dirname(DIR) 
-    FFMPEG_PATH: Final[str] = os.path.join(ROOT_ROOT, "FFMPEG", "ffmpeg.exe")
+    _BUNDLED_FFMPEG: Final[str] = os.path.join(ROOT_ROOT, "FFMPEG", "ffmpeg.exe")
+    # Bundled Windows build if present, otherwise FFmpeg from PATH (Linux/macOS)
+    FFMPEG_PATH: Final[str] = (
+        _BUNDLED_FFMPEG if os.path.exists(_BUNDLED_FFMPEG) else (shutil.which("ffmpeg") or "ffmpeg")
+    )
 
-    # Regex pattern for extracting device names from FFmpeg output
-    _DEVICE_PATTERN: Final[re.Pattern] = re.compile(r'\"(.+?)\".*\(video\)')
+    # Source of devices: dshow on Windows, v4l2 elsewhere (see set_backend)
+    _backend: CaptureBackend = CaptureBackend.default()
 
-    # Command template to list video devices with FFmpeg
-    _DEVICE_CMD_TEMPLATE: Final[List[str]] = [
-        FFMPEG_PATH,
-        "-list_devices", "true",
-        "-f", "dshow",
-        "-i", "dummy"
-    ]
+    # (backend, device) -> capture modes; only successful, non-empty probes are kept
+    _capabilities: Dict[Tuple[CaptureBackend, str], List[Dict[str, Any]]] = {}
+    _capabilities_lock: Final[Lock] = Lock()
 
     # Logger de clase
     log: Final[SystemLog] = SystemLog(__name__)
@@ -38,19 +42,26 @@ class VideoDeviceDetection:
     @lru_cache(maxsize=1)
     def get_devices(cls) -> List[str]:
         """
-        Get the list of video device names detected by FFmpeg.
-        Returns a cached result to avoid repeated subprocess calls.
+        Get the list of video device names reported by the capture backend.
+        The capture modes of every device are probed in the same scan (see
+        get_capabilities()). Returns a cached result to avoid repeated subprocess calls.
         """
         try:
-            result = subprocess.run(
-                cls._DEVICE_CMD_TEMPLATE,
-                capture_output=True,
-                text=True,
-                timeout=10,
-                check=False
-            )
-            cls.log.debug("FFmpeg device detection subprocess executed successfully")
-            return cls._parse_output(result.stderr)
+            cmd = cls._backend.list_devices_command(cls.FFMPEG_PATH)
+            if cmd is None:
+                devices = cls._backend.list_devices()
+            else:
+                result = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=10,
+                    check=False
+                )
+                cls.log.debug("FFmpeg device detection subprocess executed successfully")
+                devices = cls._backend.parse_device_list(result.stderr)
+            cls._probe_all(devices)
+            return devices
 
         except subprocess.TimeoutExpired:
             cls.log.error("Timeout: FFmpeg device detection exceeded 10 seconds")
@@ -65,18 +76,21 @@ class VideoDeviceDetection:
             cls.log.error(f"Unexpected error during device detection: {e}")
             return []
 
-    @staticmethod
-    def _parse_output(output: str) -> List[str]:
+    @classmethod
+    def get_backend(cls) -> CaptureBackend:
         """
-        Parse FFmpeg stderr output to extract device names.
+        Return the capture backend used for detection and, by default, for recording.
         """
-        if not output:
-            return []
-        try:
-            return VideoDeviceDetection._DEVICE_PATTERN.findall(output)
-        except re.error as e:
-            VideoDeviceDetection.log.error(f"Regex pattern matching failed: {e}")
-            return []
+        return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend: CaptureBackend) -> None:
+        """
+        Switch the capture backend (e.g. CaptureBackend.get("lavfi") for synthetic cameras).
+        Clears the cached device lists.
+        """
+        cls._backend = backend
+        cls.clear_cache()
 
     @classmethod
     @lru_cache(maxsize=1)
@@ -92,6 +106,10 @@ class VideoDeviceDetection:
             cls.log.warning("No video devices detected. Skipping OpenCV test loop.")
             return []
 
+        # Synthetic, file and network sources cannot be opened by OpenCV index
+        if not cls._backend.supports_opencv_probe:
+            return list(enumerate(device_names))
+
         cls.log.info(f"Testing {len(device_names)} device indices with OpenCV...")
 
         for opencv_idx, device_name in enumerate(device_names):
@@ -113,6 +131,90 @@ class VideoDeviceDetection:
 
         return device_map
 
+    @classmethod
+    def _probe_all(cls, devices: List[str]) -> None:
+        """Probe the capture modes of every device in parallel (part of the device scan)."""
+        if not devices or cls._backend.list_capabilities_command(cls.FFMPEG_PATH, devices[0]) is None:
+            return
+        with ThreadPoolExecutor(max_workers=min(8, len(devices))) as pool:
+            list(pool.map(cls.get_capabilities, devices))
+
+    @classmethod
+    def get_capabilities(cls, device: str, backend: Optional[CaptureBackend] = None) -> List[Dict[str, Any]]:
+        """
+        Formats, resolutions and frame rates a device can deliver (see CaptureBackend).
+        Probed once per device; empty if the device cannot be probed (synthetic
+        sources, or a camera already opened by another process). Empty or failed
+        probes are not cached: the next call (or device scan) probes again.
+        """
+        backend = backend or cls._backend
+        with cls._capabilities_lock:
+            cached = cls._capabilities.get((backend, device))
+        if cached is not None:
+            return cached
+
+        cmd = backend.list_capabilities_command(cls.FFMPEG_PATH, device)
+        if cmd is None:
+            return []
+        try:
+            # FFmpeg exits with an error after listing (no output given): only stderr matters
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=15, check=False)
+        except (OSError, subprocess.SubprocessError) as e:
+            cls.log.error(f"Could not probe capabilities of '{device}': {e}")
+            return []
+        modes = backend.parse_capabilities(result.stderr)
+        cls.log.info(f"'{device}': {len(modes)} capture mode(s) detected")
+        if modes:
+            with cls._capabilities_lock:
+                cls._capabilities[(backend, device)] = modes
+        return modes
+
+    @classmethod
+    def cached_capabilities(cls, device: str, backend: Optional[CaptureBackend] = None) -> List[Dict[str, Any]]:
+        """
+        Capture modes found by the device scan, without starting a probe for the
+        default backend (a device that could not be probed is retried on the next
+        scan, see clear_cache()). Other backends are probed on first use.
+        """
+        backend = backend or cls._backend
+        if backend is not cls._backend:
+            return cls.get_capabilities(device, backend)
+        cls.get_devices()  # Runs the scan (and the probes) once
+        with cls._capabilities_lock:
+            return cls._capabilities.get((backend, device), [])
+
+    @classmethod
+    def select_input_format(
+        cls,
+        device: str,
+        resolution: str,
+        framerate: int,
+        backend: Optional[CaptureBackend] = None,
+        allow_passthrough: bool = True
+    ) -> Optional[str]:
+        """
+        Cheapest input format for a capture mode:
+        "h264" (stream copy, no decode/encode) > "mjpeg" (cheap decode, less USB bandwidth)
+        > None (device default, usually raw).
+        """
+        backend = backend or cls._backend
+        width, height = (int(v) for v in resolution.lower().split("x"))
+        available = set()
+        for mode in cls.cached_capabilities(device, backend):
+            if not backend.fixed_resolution and (mode["width"], mode["height"]) != (width, height):
+                continue
+            if mode["max_fps"] is not None and not backend.fixed_resolution \
+                    and not mode["min_fps"] <= framerate <= mode["max_fps"]:
+                continue
+            if mode["codec"]:
+                available.add(mode["codec"])
+
+        if allow_passthrough and "h264" in available:
+            return "h264"
+        if "mjpeg" in available:
+            return "mjpeg"
+        return None
+
     @classmethod
     def has_devices(cls) -> Tuple[bool, str]:
         """
@@ -132,6 +234,9 @@ class VideoDeviceDetection:
         Clear the cached device list so the next call rescans hardware.
         """
         cls.get_devices.cache_clear()
+        cls.get_device_map.cache_clear()
+        with cls._capabilities_lock:
+            cls._capabilities.clear()
         cls.log.info("Video device cache cleared - next detection will rescan hardware")
 
 